@@ -0,0 +1,306 @@
+"""
+File: benchmark.py
+Description: Throughput benchmarks for cell generation and reconstruction
+
+Generation with Blender:
+    blender -b -P benchmarks/benchmark.py -- --suite generation
+Stack planning, generation without Blender, projections and reconstruction (plain Python, tifffile/tomopy if installed):
+    python benchmarks/benchmark.py --suite planning generation_numpy projections reconstruction
+
+Every run is appended to benchmarks/history.json (ignored by git, --history for another file) and compared to the
+last run with the same workload.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO, "src"))
+sys.path.insert(0, os.path.join(REPO, "reconstruction"))
+
+HISTORY = os.path.join(REPO, "benchmarks", "history.json")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Best time of repeat runs (the minimum is the least disturbed by other load)
+def best_time(func, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+# Synthetic projection stack (angles, rows, cols) with the value range of the simulated scans
+def synthetic_projections(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(2000, 62000, size=shape, dtype=np.uint16)
+
+
+def parse_shape(text):
+    return tuple(int(n) for n in text.split("x"))
+
+
+######################################## WORKLOADS ########################################
+
+def bench_generation(args, suite="generation"):
+    from batteryct import DEFAULT_PARAMS
+    if suite == "generation":
+        from ui import Modeling
+    else:
+        from batteryct import MeshModeling as Modeling
+
+    results = []
+    for bending in [True, False]:
+        for num_anodes in args.anodes:
+            with tempfile.TemporaryDirectory() as tmp:
+                params = dict(DEFAULT_PARAMS, num_export=args.cells, num_anodes=num_anodes, bending=bending, cache=False, seed=0, profile=True)
+
+                def run():
+                    modeler = Modeling()
+                    modeler.update_parameters_from_ui(dict(params, path=tempfile.mkdtemp(dir=tmp)))
+                    modeler.generate_cells()
+                    return modeler
+
+                seconds, modeler = best_time(run, args.repeat)
+                stl_files = [os.path.join(modeler.export_path, f) for f in os.listdir(modeler.export_path) if f.endswith(".stl")]
+                stl_bytes = sum(os.path.getsize(f) for f in stl_files)
+                stl_seconds = sum(e["duration"] for e in modeler.profiler.events if e["name"] == "stl_export")
+
+            results.append({
+                "suite": suite,
+                "name": f"num_anodes={num_anodes},bending={bending}",
+                "seconds": seconds,
+                "cells_per_s": args.cells / seconds,
+                "stl_bytes_per_cell": stl_bytes / args.cells,
+                "stl_mb_per_s": stl_bytes / stl_seconds / 1e6 if stl_seconds > 0 else None,
+            })
+    return results
+
+
+def bench_generation_numpy(args):
+    return bench_generation(args, suite="generation_numpy")
+
+
+# Sampling and stack planning only, for single cells and for a batch of cells in one call
+def bench_planning(args):
+    from batteryct import DEFAULT_PARAMS, MeshModeling
+
+    results = []
+    for num_anodes in args.anodes:
+        modeler = MeshModeling()
+        modeler.update_parameters_from_ui(dict(DEFAULT_PARAMS, num_anodes=num_anodes, seed=0))
+
+        def run_cells():
+            for j in range(args.batch):
+                rng = modeler.cell_rng(j)
+                plates = modeler.plan_stack(modeler.generate_deviations(rng))
+            return plates
+
+        def run_batch():
+            return modeler.plan_stack(modeler.generate_deviations(modeler.cell_rng(0), num_cells=args.batch))
+
+        for name, func in [("cells", run_cells), ("batch", run_batch)]:
+            seconds, plates = best_time(func, args.repeat)
+            results.append({
+                "suite": "planning",
+                "name": f"{name},num_anodes={num_anodes}",
+                "seconds": seconds,
+                "cells_per_s": args.batch / seconds,
+                "plates_per_s": args.batch * plates.shape[-1] / seconds,
+            })
+    return results
+
+
+def bench_projections(args):
+    import tifffile as tiff
+    from reconstructions import read_projections
+    from sinogram_cache import build_sinogram_cache, open_sinograms
+
+    results = []
+    folders = [("scan1", args.data)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for shape in args.synthetic:
+            folder = os.path.join(tmp, "x".join(str(n) for n in shape))
+            os.makedirs(folder)
+            for i, projection in enumerate(synthetic_projections(shape)):
+                tiff.imwrite(os.path.join(folder, f"sim-result-8_{i:04d}.tif"), projection)
+            folders.append((f"synthetic_{os.path.basename(folder)}", folder))
+
+        for name, folder in folders:
+            if not os.path.isdir(folder):
+                print(f"Skipping {name}: {folder} not found")
+                continue
+            file_bytes = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder) if f.endswith(".tif"))
+            seconds, projections = best_time(lambda: read_projections(folder), args.repeat)
+            results.append({
+                "suite": "projections",
+                "name": f"read_projections[{name}]",
+                "shape": list(projections.shape),
+                "seconds": seconds,
+                "file_mb_per_s": file_bytes / seconds / 1e6,
+                "array_mb_per_s": projections.nbytes / seconds / 1e6,
+            })
+
+            # one-time conversion into the sinogram cache, then slabs of 16 rows as the reconstruction reads them
+            cache_dir = os.path.join(tmp, f"cache_{name}")
+            seconds, _ = best_time(lambda: build_sinogram_cache(folder, cache_dir), 1)
+            results.append({
+                "suite": "projections",
+                "name": f"build_sinogram_cache[{name}]",
+                "shape": list(projections.shape),
+                "seconds": seconds,
+                "file_mb_per_s": file_bytes / seconds / 1e6,
+            })
+            sinograms = open_sinograms(folder, cache_dir)
+            read_slabs = lambda: [np.array(sinograms[start:start + 16]) for start in range(0, sinograms.shape[0], 16)]
+            seconds, _ = best_time(read_slabs, args.repeat)
+            results.append({
+                "suite": "projections",
+                "name": f"sinogram_slabs[{name}]",
+                "shape": list(sinograms.shape),
+                "seconds": seconds,
+                "array_mb_per_s": sinograms.nbytes / seconds / 1e6,
+            })
+    return results
+
+
+def bench_reconstruction(args):
+    from fbp import clear_table_cache, ramp_filter
+    from reconstructions import read_projections, reconstruct, resolve_algorithm
+
+    stacks = []
+    if os.path.isdir(args.data):
+        stacks.append(("scan1", read_projections(args.data)))
+    for shape in args.synthetic:
+        stacks.append((f"synthetic_{'x'.join(str(n) for n in shape)}", synthetic_projections(shape).astype(np.float32)))
+
+    results = []
+    for name, projections in stacks:
+        # gridrec only with tomopy; fbp first with an empty cache (filter and lookup table), then warm
+        runs = [("fbp_cold", "fbp", 1), ("fbp", "fbp", args.repeat)]
+        if resolve_algorithm("auto") == "gridrec":
+            runs.insert(0, ("reconstruct", "gridrec", args.repeat))
+        for label, algorithm, repeat in runs:
+            if label == "fbp_cold":
+                ramp_filter.cache_clear()
+                clear_table_cache()
+            seconds, reconstruction = best_time(lambda: reconstruct(projections, algorithm), repeat)
+            results.append({
+                "suite": "reconstruction",
+                "name": f"{label}[{name}]",
+                "shape": list(projections.shape),
+                "seconds": seconds,
+                "slices_per_s": reconstruction.shape[0] / seconds,
+            })
+    return results
+
+
+SUITES = {
+    "generation": bench_generation,
+    "generation_numpy": bench_generation_numpy,
+    "planning": bench_planning,
+    "projections": bench_projections,
+    "reconstruction": bench_reconstruction,
+}
+
+######################################## HISTORY ########################################
+
+def load_history(file_path):
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+def write_history(file_path, history):
+    # Write to a temporary file first, so that an interrupted run cannot destroy the history
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(history, file, indent=4)
+    os.replace(tmp_path, file_path)
+
+
+# Prints every result together with the change to the last run of the same workload
+def print_results(results, history):
+    last = {}
+    for run in history:
+        for result in run["results"]:
+            last[(result["suite"], result["name"])] = result
+    metrics = ["cells_per_s", "plates_per_s", "stl_mb_per_s", "file_mb_per_s", "array_mb_per_s", "slices_per_s"]
+
+    for result in results:
+        line = f"{result['suite']:<18}{result['name']:<45}{result['seconds']:>10.3f} s"
+        previous = last.get((result["suite"], result["name"]))
+        for metric in metrics:
+            if result.get(metric) is None:
+                continue
+            line += f"  {metric}={result[metric]:.3f}"
+            if previous is not None and previous.get(metric):
+                line += f" ({(result[metric] / previous[metric] - 1) * 100:+.1f}%)"
+        print(line)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="BatteryCT throughput benchmarks")
+    parser.add_argument("--suite", nargs="+", choices=list(SUITES) + ["all"], default=["all"])
+    parser.add_argument("--anodes", nargs="+", type=int, default=[2, 10, 50, 100], help="num_anodes of the generation workloads")
+    parser.add_argument("--cells", type=int, default=3, help="cells per generation workload")
+    parser.add_argument("--batch", type=int, default=1000, help="cells per stack planning workload")
+    parser.add_argument("--data", default=os.path.join(REPO, "data", "scan1"), help="folder with simulated projections")
+    parser.add_argument("--synthetic", nargs="*", type=parse_shape, default=[(360, 256, 512)], help="synthetic stacks as ANGLESxROWSxCOLS")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--history", default=HISTORY, help="history file of the results (default: benchmarks/history.json, not versioned)")
+    parser.add_argument("--no-history", action="store_true", help="do not append the results to the history file")
+    args = parser.parse_args(argv)
+
+    suites = list(SUITES) if "all" in args.suite else args.suite
+    results = []
+    skipped = {}
+    for suite in suites:
+        try:
+            results += SUITES[suite](args)
+        except ImportError as error:
+            # e.g. generation outside of Blender or reconstruction without tomopy
+            print(f"Skipping {suite}: {error}")
+            skipped[suite] = str(error)
+
+    history = load_history(args.history)
+    print_results(results, history)
+
+    if not args.no_history and results:
+        history.append({
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("history", "no_history")},
+            "skipped": skipped,
+            "results": results,
+        })
+        write_history(args.history, history)
+        print("Results appended to: " + args.history)
+
+
+if __name__ == "__main__":
+    # Blender passes its own arguments, the benchmark arguments follow after "--"
+    main(sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:])
@@ -0,0 +1,168 @@
+"""
+File: augment.py
+Description: Variants of a simulated projection stack (noise, detector blur, beam hardening, rings, fewer views)
+
+Every variant draws one value per augmentation from the given levels and applies them to the whole stack
+(angles, rows, cols) of grey values at once, in the order of the acquisition:
+  - subsample: about every k-th projection, first and last included and spread evenly over the scan
+    (fewer views, the projections are numbered again from 0, their angles are recorded)
+  - beam_hardening: the line integrals p = -log(I / I0) become p / (1 + b p) (thick paths attenuate less)
+  - blur: Gaussian detector blur, sigma in pixels
+  - rings: gain of every detector pixel 1 + N(0, rings), the same for all projections
+  - dose: Poisson noise with dose photons per unattenuated pixel (0: no quantum noise)
+  - noise: Gaussian electronic noise, standard deviation as fraction of I0
+The random numbers of variant j come from SeedSequence(seed, spawn_key=(j,)) as for the cells, so every
+variant can be made again on its own. The variants are written on worker processes into <out>/<j>/ with
+augmentation.json (levels, seed, kept projections and their angles theta), the list of all of them into
+<out>/augmentations.json. reconstructions.py reconstructs a variant with the recorded angles.
+
+    python augment.py data/scan1 --out data/scan1_augmented --variants 20 --dose 0 1e4 1e5 --blur 0 0.7 --rings 0 0.002
+"""
+
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from reconstructions import read_projections
+from sinogram_cache import projection_files
+
+AUGMENTATIONS = ["subsample", "beam_hardening", "blur", "rings", "dose", "noise"]
+# levels without the option: the augmentation is off
+OFF = {"subsample": [1], "beam_hardening": [0.0], "blur": [0.0], "rings": [0.0], "dose": [0.0], "noise": [0.0]}
+AUGMENTATION_NAME = "augmentation.json"
+
+
+# One level per augmentation for variant j, drawn with its own generator (first draws of the variant)
+def draw_levels(levels, rng):
+    drawn = {name: rng.choice(levels.get(name, OFF[name])) for name in AUGMENTATIONS}
+    return {name: int(value) if name == "subsample" else float(value) for name, value in drawn.items()}
+
+
+# Indices of the projections kept by subsample k: (n - 1) // k + 1 views from the first to the last projection.
+# If k divides n - 1 these are every k-th projection, otherwise the steps are k or k + 1.
+def subsample_indices(n, k):
+    return np.unique(np.round(np.linspace(0, n - 1, (n - 1) // k + 1)).astype(int))
+
+
+# Angles of the projections of a scan, as reconstructions.reconstruct (uniformly spaced over 2 pi)
+def scan_angles(n):
+    return np.linspace(0, 2*np.pi, n)
+
+
+# Recorded angles of an augmented variant folder, None for other folders
+def read_angles(folder_path):
+    file_path = os.path.join(folder_path, AUGMENTATION_NAME)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        theta = json.load(file).get("theta")
+    return None if theta is None else np.array(theta)
+
+
+# Applies the levels to a stack of grey values (angles, rows, cols), white is the unattenuated intensity I0.
+# Returns the float32 stack and the indices of the kept projections.
+def augment(projections, levels, rng, white):
+    kept = subsample_indices(len(projections), int(levels["subsample"]))
+    stack = np.asarray(projections[kept], dtype=np.float32) / np.float32(white)
+
+    if levels["beam_hardening"] > 0:
+        p = -np.log(np.clip(stack, 1e-6, None))
+        stack = np.exp(-p / (1 + levels["beam_hardening"] * p))
+    if levels["blur"] > 0:
+        from scipy import ndimage
+        stack = ndimage.gaussian_filter(stack, sigma=(0, levels["blur"], levels["blur"]))
+    if levels["rings"] > 0:
+        stack *= (1 + rng.normal(0.0, levels["rings"], size=stack.shape[1:])).astype(np.float32)
+    if levels["dose"] > 0:
+        stack = rng.poisson(np.clip(stack, 0, None) * levels["dose"]).astype(np.float32) / np.float32(levels["dose"])
+    if levels["noise"] > 0:
+        stack += rng.normal(0.0, levels["noise"], size=stack.shape).astype(np.float32)
+    return stack * np.float32(white), kept
+
+
+# Grey values back into the type of the source (integer types are rounded and clipped)
+def to_dtype(stack, dtype):
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        return np.clip(np.round(stack), info.min, info.max).astype(dtype)
+    return stack.astype(dtype)
+
+
+# Worker state: the source stack is read once per process
+SOURCE = {}
+
+
+def init_worker(folder_path, white):
+    projections = read_projections(folder_path, dtype=None)
+    SOURCE.update(
+        projections=projections,
+        files=projection_files(folder_path),
+        # without a given I0 the brightest pixel of the first projection (air), as the sinogram cache
+        white=float(projections[0].max()) if white is None else float(white),
+    )
+
+
+def make_variant(j, levels, seed, out):
+    import tifffile as tiff
+
+    projections, files, white = SOURCE["projections"], SOURCE["files"], SOURCE["white"]
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(j,)))
+    drawn = draw_levels(levels, rng)
+    stack, kept = augment(projections, drawn, rng, white)
+    stack = to_dtype(stack, projections.dtype)
+
+    variant_dir = os.path.join(out, str(j))
+    os.makedirs(variant_dir, exist_ok=True)
+    for i, image in enumerate(stack):
+        # same names as the source, numbered again (the reconstruction takes the projections in order)
+        name = re.sub(r"\d+(\.tiff?)$", lambda match: f"{i:0{len(match.group(0)) - len(match.group(1))}d}{match.group(1)}", files[kept[i]])
+        tiff.imwrite(os.path.join(variant_dir, name), image)
+    record = {"variant": j, "seed": seed, "spawn_key": [j], "levels": drawn, "white": white, "kept": kept.tolist(),
+              "theta": scan_angles(len(projections))[kept].tolist()}
+    with open(os.path.join(variant_dir, AUGMENTATION_NAME), 'w') as file:
+        json.dump(record, file, indent=4)
+    return record
+
+
+# Writes num_variants variants of the stack in folder_path on workers processes, returns their records
+def augment_folder(folder_path, out, num_variants, levels, seed=0, white=None, workers=None):
+    os.makedirs(out, exist_ok=True)
+    workers = min(workers or os.cpu_count() or 1, num_variants)
+    records = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(folder_path, white)) as executor:
+        futures = [executor.submit(make_variant, j, levels, seed, out) for j in range(num_variants)]
+        for future in as_completed(futures):
+            records.append(future.result())
+    records.sort(key=lambda record: record["variant"])
+    with open(os.path.join(out, "augmentations.json"), 'w') as file:
+        json.dump({"source": os.path.abspath(folder_path), "seed": seed, "levels": levels, "variants": records}, file, indent=4)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Augmented variants of a simulated projection stack")
+    parser.add_argument("input", help="folder with the projections (.tif)")
+    parser.add_argument("--out", required=True, help="folder of the variants (<out>/<variant>/)")
+    parser.add_argument("--variants", type=int, default=10, help="number of variants")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--white", type=float, help="unattenuated intensity I0 (default: maximum of the first projection)")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: all cores)")
+    # levels of every augmentation, each variant draws one of them
+    parser.add_argument("--subsample", type=int, nargs="+", default=OFF["subsample"], help="keep about every k-th projection (first and last included)")
+    parser.add_argument("--beam-hardening", type=float, nargs="+", default=OFF["beam_hardening"], help="b of p / (1 + b p)")
+    parser.add_argument("--blur", type=float, nargs="+", default=OFF["blur"], help="sigma of the detector blur in pixels")
+    parser.add_argument("--rings", type=float, nargs="+", default=OFF["rings"], help="standard deviation of the pixel gains")
+    parser.add_argument("--dose", type=float, nargs="+", default=OFF["dose"], help="photons per unattenuated pixel (0: no Poisson noise)")
+    parser.add_argument("--noise", type=float, nargs="+", default=OFF["noise"], help="electronic noise as fraction of I0")
+    args = parser.parse_args(argv)
+    levels = {name: getattr(args, name) for name in AUGMENTATIONS}
+    records = augment_folder(args.input, args.out, args.variants, levels, args.seed, args.white, args.workers)
+    print(f"{len(records)} variants written to: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
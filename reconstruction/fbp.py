@@ -0,0 +1,134 @@
+"""
+File: fbp.py
+Description: Filtered back projection (parallel beam) with NumPy/scipy.fft, the FFTs of the filter in worker threads
+
+The setup of a geometry is computed once and cached: the ramp filter per detector width and filter,
+and per angle the detector columns and interpolation weights of every pixel of the slice (lookup
+table, stored as sparse matrix). All scans with the same geometry (angles, detector columns, slice
+size, center) share them, the back projection of a block of slices is one sparse matrix product.
+The tables are kept up to TABLE_CACHE_BYTES in total (least recently used first out), a larger
+table is built for every call. With a region only the pixels of that crop of the slice are in the
+table (region of interest), the time of the back projection scales with the region.
+"""
+
+import os
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+FILTERS = ["ramp", "shepp-logan", "cosine", "hann"]
+# memory of all cached lookup tables (about 16 bytes per angle and pixel, 0.4 GB for 180 x 385^2)
+TABLE_CACHE_BYTES = 1 << 30
+
+
+# Frequency response of the filter for rfft of length n (ramp built in the spatial domain, no DC offset)
+@lru_cache(maxsize=16)
+def ramp_filter(n, filter_name="ramp"):
+    from scipy import fft
+
+    # distance of the odd samples to 0 (periodic)
+    k = np.concatenate([np.arange(1, n // 2 + 1, 2), np.arange(n // 2 - 1, 0, -2)])
+    h = np.zeros(n)
+    h[0] = 0.25
+    h[1::2] = -1.0 / (np.pi * k) ** 2
+    response = 2 * np.real(fft.rfft(h))
+    omega = np.pi * fft.rfftfreq(n)[1:]
+    if filter_name == "shepp-logan":
+        response[1:] *= np.sin(omega) / omega
+    elif filter_name == "cosine":
+        response[1:] *= np.cos(omega)
+    elif filter_name == "hann":
+        response[1:] *= (1 + np.cos(2 * omega)) / 2
+    response.setflags(write=False)
+    return response
+
+
+# Lookup table of a geometry as sparse matrix (pixels x angles * cols): per angle every pixel gets the
+# two detector columns next to its ray with the weights of the linear interpolation. Rays that miss
+# the detector have no entries. Size: about 16 bytes * angles * pixels (0.4 GB for 180 x 385^2).
+# region (first row, first column, rows, columns) is the crop of the size x size slice.
+def build_table(theta, cols, size, center, region):
+    from scipy import sparse
+
+    row0, col0, num_rows, num_cols = region
+    x = np.arange(col0, col0 + num_cols) - size // 2
+    y = np.arange(row0, row0 + num_rows) - size // 2
+    # (pixels, angles): detector position of the ray through every pixel
+    t = (x[None, :, None] * np.cos(theta) - y[:, None, None] * np.sin(theta) + center).reshape(-1, len(theta))
+    left = np.floor(t)
+    weight = (t - left).astype(np.float32)
+    valid = (left >= 0) & (left <= cols - 2)
+    column = left.astype(np.int32) + (np.arange(len(theta), dtype=np.int32) * cols)
+
+    # pixel by pixel: left and right column of every angle
+    indices = np.stack([column, column + 1], axis=-1)[valid]
+    data = np.stack([1 - weight, weight], axis=-1)[valid]
+    indptr = np.concatenate([[0], np.cumsum(2 * valid.sum(axis=1))])
+    return sparse.csr_matrix((data.ravel(), indices.ravel(), indptr), shape=(num_rows * num_cols, len(theta) * cols))
+
+
+# Cached tables per geometry (the angles as bytes, so that they can be part of the key)
+table_cache = OrderedDict()
+
+
+def table_bytes(table):
+    return table.data.nbytes + table.indices.nbytes + table.indptr.nbytes
+
+
+def clear_table_cache():
+    table_cache.clear()
+
+
+# Table of a whole scan from the cache, tables that do not fit into TABLE_CACHE_BYTES are not cached
+def geometry_table(theta, cols, size, center, region=None):
+    region = (0, 0, size, size) if region is None else tuple(int(n) for n in region)
+    theta = np.ascontiguousarray(theta, dtype=np.float64)
+    key = (theta.tobytes(), int(cols), int(size), float(center), region)
+    if key in table_cache:
+        table_cache.move_to_end(key)
+        return table_cache[key]
+    table = build_table(theta, int(cols), int(size), float(center), region)
+    size_bytes = table_bytes(table)
+    if size_bytes <= TABLE_CACHE_BYTES:
+        while table_cache and sum(table_bytes(cached) for cached in table_cache.values()) + size_bytes > TABLE_CACHE_BYTES:
+            table_cache.popitem(last=False)
+        table_cache[key] = table
+    return table
+
+
+# Filtered sinograms (slices, angles, cols) with the cached filter response
+def filter_sinograms(sinograms, filter_name, threads):
+    from scipy import fft
+
+    cols = sinograms.shape[-1]
+    n = max(64, int(2 ** np.ceil(np.log2(2 * cols))))
+    response = ramp_filter(n, filter_name)
+    filtered = fft.irfft(fft.rfft(sinograms, n=n, axis=-1, workers=threads) * response, n=n, axis=-1, workers=threads)
+    return filtered[..., :cols].astype(np.float32)
+
+
+# projections (angles, rows, cols) as read_projections, returns (rows, size, size) like tomopy.recon
+# or (rows, region rows, region columns) with a region (first row, first column, rows, columns).
+# theta defaults to the angles of reconstructions.reconstruct, center to the middle column of the detector
+# (cols // 2, the pixel size // 2 of the slice is on the rotation axis, same as skimage.transform.iradon).
+# The slices are back projected in blocks of slice_block with one sparse product each, threads run the FFTs.
+def fbp(projections, theta=None, center=None, size=None, filter_name="ramp", threads=None, slice_block=32, region=None):
+    num_angles, rows, cols = projections.shape
+    theta = np.linspace(0, 2*np.pi, num_angles) if theta is None else np.asarray(theta, dtype=np.float64)
+    center = cols // 2 if center is None else center
+    size = cols if size is None else size
+    threads = threads or os.cpu_count() or 1
+
+    region = (0, 0, size, size) if region is None else region
+    table = geometry_table(theta, cols, size, center, region)
+    sinograms = np.ascontiguousarray(np.moveaxis(projections, 1, 0), dtype=np.float32)
+    filtered = filter_sinograms(sinograms, filter_name, threads)
+
+    # integral over pi: (pi / span) * (span / angles) for uniformly spaced angles, the filter response is doubled
+    scale = np.float32(np.pi / (2 * num_angles))
+    reconstruction = np.empty((rows, region[2] * region[3]), dtype=np.float32)
+    for start in range(0, rows, slice_block):
+        block = filtered[start:start + slice_block].reshape(-1, num_angles * cols)
+        reconstruction[start:start + slice_block] = (table @ block.T).T * scale
+    return reconstruction.reshape(rows, region[2], region[3])
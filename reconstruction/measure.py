@@ -0,0 +1,315 @@
+"""
+File: measure.py
+Description: Overhang and plate offsets measured in reconstructed volumes, scored against the labels of the cells
+
+For every labeled anode and cathode the slice at its z is taken from the volume and reduced to two profiles:
+along x (mean over the middle half of its width) and along y (mean over its length). The ends of the plate
+are the crossings of the profiles with half the way between background and plate, searched from the labeled
+centre outwards with sub-voxel interpolation, for all plates of a volume at once. Centre, length and width
+of every plate follow from its ends, the overhang of every anode end from the end of the nearest cathode.
+The same quantities computed from the labels are the reference. Ends outside of a volume (e.g. the other
+end in an ROI of reconstructions.py --roi-labels) are not measured.
+
+Layout of the reconstructions as in batteryct.dataset: <reconstructions>/<cell>/slice_*.tiff or the ROI
+folders of the cell in it, <cell> the number of the cell in the export folder. The cells are measured on
+worker processes; the errors and the cost of the reconstruction (reconstruction.json) of every cell are
+written to measurements.jsonl, the errors of all cells together to measurements_summary.json. The errors of
+single plates are listed by their layer in the stack (<name>_layer of the labels), so plates removed by a
+defect do not shift the numbering.
+
+    python measure.py <export folder> --reconstructions <folder> --pixel-size 0.0002 --workers 8
+"""
+
+import argparse
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from precision import dequantize, read_scale
+from reconstructions import read_run
+from roi import plate_layers, read_roi, world_to_voxel
+
+ELECTRODES = ["anode", "cathode"]
+ENDS = ["x-", "x+", "y-", "y+"]
+QUANTITIES = ["x_position", "y_position", "length", "width", "overhang"]
+EDGE_VOXELS = 3
+
+
+# Anodes and cathodes of a labeling file: kind (0 anode, 1 cathode), layer in the stack, centre and size in m
+def label_plates(data):
+    kind, layer, center, size = [], [], [], []
+    for k, name in enumerate(ELECTRODES):
+        position = data[name][f"{name}_position"]
+        dimensions = data[name][f"{name}_dimensions"]
+        kind += [k] * len(position["x"])
+        layer += plate_layers(data, name).tolist()
+        center += list(zip(position["x"], position["y"], position["z"]))
+        size += list(zip(dimensions["length"], dimensions["width"], dimensions["height"]))
+    return {"kind": np.array(kind, dtype=int), "layer": np.array(layer, dtype=int),
+            "center": np.array(center, dtype=np.float64).reshape(-1, 3), "size": np.array(size, dtype=np.float64).reshape(-1, 3)}
+
+
+# None for ends that were not measured (NaN is not valid JSON)
+def finite(value):
+    return float(value) if np.isfinite(value) else None
+
+
+# Errors of every plate by its layer: [{"plate": "anode", "layer": 3, "length": ..., "overhang": [x-, x+]}, ...]
+def plate_errors(errors, plates):
+    anodes = np.flatnonzero(plates["kind"] == 0)
+    result = []
+    for n in range(len(plates["kind"])):
+        entry = {"plate": ELECTRODES[plates["kind"][n]], "layer": int(plates["layer"][n])}
+        entry.update({quantity: finite(errors[quantity][n]) for quantity in QUANTITIES if quantity != "overhang"})
+        if plates["kind"][n] == 0:
+            a = int(np.searchsorted(anodes, n))
+            entry["overhang"] = [finite(errors["overhang"][a]), finite(errors["overhang"][len(anodes) + a])]
+        result.append(entry)
+    return result
+
+
+# Ends of the plates from the labels (reference of the measured ends)
+def label_ends(plates):
+    center, size = plates["center"], plates["size"]
+    return {
+        "x-": center[:, 0] - size[:, 0] / 2.0, "x+": center[:, 0] + size[:, 0] / 2.0,
+        "y-": center[:, 1] - size[:, 1] / 2.0, "y+": center[:, 1] + size[:, 1] / 2.0,
+    }
+
+
+# Folders with slices of a cell: the cell folder itself or its ROI folders
+def volume_folders(cell_dir):
+    if any(f.endswith((".tif", ".tiff")) for f in os.listdir(cell_dir)):
+        return [cell_dir]
+    return sorted(os.path.join(cell_dir, f) for f in os.listdir(cell_dir)
+                  if os.path.isdir(os.path.join(cell_dir, f)) and any(s.endswith((".tif", ".tiff")) for s in os.listdir(os.path.join(cell_dir, f))))
+
+
+# Slices of a folder as float32 volume (uint16 slices of reduced precision are dequantized)
+def read_volume(folder):
+    import tifffile as tiff
+
+    files = sorted(f for f in os.listdir(folder) if f.endswith((".tif", ".tiff")))
+    volume = np.stack([tiff.imread(os.path.join(folder, f)) for f in files])
+    scale = read_scale(folder)
+    return dequantize(volume, scale) if scale is not None else volume.astype(np.float32)
+
+
+# Rows, crop and geometry of a volume: roi.json, reconstruction.json or the full field of view; missing
+# values of the geometry come from the volume, pixel_size and the labels
+def volume_mapping(folder, shape, pixel_size, data):
+    roi = read_roi(folder) or read_run(folder) or {"rows": [0, shape[0]], "region": [0, 0, shape[1], shape[2]]}
+    geometry = dict(roi.get("geometry") or {})
+    geometry.setdefault("detector_rows", roi["rows"][1])
+    geometry.setdefault("slice_size", shape[2])
+    geometry.setdefault("z_center", float(data["housing"]["housing_dimensions"]["outer_height"][0]) / 2.0)
+    if pixel_size is not None:
+        geometry.setdefault("pixel_size", pixel_size)
+    if "pixel_size" not in geometry:
+        raise ValueError(f"Pixel size of {folder} unknown, use --pixel-size")
+    return {"rows": roi["rows"], "region": roi["region"], "geometry": geometry}
+
+
+# First crossing of every profile (plates, n) with its threshold, from start in direction (+1/-1).
+# Returns the fractional index of the crossing, NaN if the profile is below the threshold at start
+# or does not fall below it inside the volume.
+def profile_edges(profiles, start, direction, threshold):
+    n = profiles.shape[1]
+    steps = np.arange(n)
+    index = start[:, None] + direction * steps[None, :]
+    inside = (index >= 0) & (index < n)
+    values = np.take_along_axis(profiles, np.clip(index, 0, n - 1), axis=1)
+    below = inside & ~(values >= threshold[:, None])
+    first = np.argmax(below, axis=1)
+    found = below.any(axis=1) & (first > 0)
+    rows = np.arange(len(profiles))
+    previous = values[rows, np.maximum(first - 1, 0)]
+    current = values[rows, first]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fraction = np.clip((previous - threshold) / (previous - current), 0.0, 1.0)
+    return np.where(found, start + direction * (first - 1 + fraction), np.nan)
+
+
+# Ends of the plates (m) measured in one volume, NaN for ends outside of it
+def measure_volume(volume, mapping, plates):
+    rows, height, width = volume.shape
+    pixel_size = mapping["geometry"]["pixel_size"]
+    index = world_to_voxel(plates["center"], mapping)
+    row = np.round(index[:, 0]).astype(int)
+    in_volume = (row >= 0) & (row < rows)
+    slices = volume[np.clip(row, 0, rows - 1)]
+
+    # coordinates of the rows and columns of the slices relative to the centre of every plate
+    dy = (index[:, 1:2] - np.arange(height)[None, :]) * pixel_size
+    dx = (np.arange(width)[None, :] - index[:, 2:3]) * pixel_size
+    half_length, half_width = plates["size"][:, 0:1] / 2.0, plates["size"][:, 1:2] / 2.0
+
+    ends = {}
+    # x profile: mean over the rows of the middle half of the width, y profile: mean over the columns of the
+    # plate without the last EDGE_VOXELS at its ends (the corners are blurred by the reconstruction)
+    band = (np.abs(dy) <= half_width / 2.0).astype(np.float32)
+    mask = (np.abs(dx) <= half_length - EDGE_VOXELS * pixel_size).astype(np.float32)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        profiles_x = np.einsum("nhw,nh->nw", slices, band) / band.sum(axis=1, keepdims=True)
+        profiles_y = np.einsum("nhw,nw->nh", slices, mask) / mask.sum(axis=1, keepdims=True)
+
+    for axis, profiles, offset, half, centre in [("x", profiles_x, dx, half_length, index[:, 2]), ("y", profiles_y, -dy, half_width, index[:, 1])]:
+        valid = in_volume & np.isfinite(profiles).all(axis=1)
+        profiles = np.where(valid[:, None], profiles, np.nan)
+        # grey value of the plate (inside its labeled ends) and of the background (from 2 voxels beyond them,
+        # an ROI needs at least this margin)
+        inside = np.abs(offset) <= half - EDGE_VOXELS * pixel_size
+        outside = (np.abs(offset) >= half + 2 * pixel_size) & (np.abs(offset) <= half + 3 * EDGE_VOXELS * pixel_size)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            hi = np.nanmedian(np.where(inside, profiles, np.nan), axis=1)
+            lo = np.nanmedian(np.where(outside, profiles, np.nan), axis=1)
+        threshold = np.where(valid & (hi > lo), (lo + hi) / 2.0, np.inf)
+        profiles = np.nan_to_num(profiles)
+        start = np.clip(np.round(centre).astype(int), 0, profiles.shape[1] - 1)
+        lower = profile_edges(profiles, start, -1, threshold)
+        upper = profile_edges(profiles, start, 1, threshold)
+        if axis == "x":
+            ends["x-"] = plates["center"][:, 0] + (lower - index[:, 2]) * pixel_size
+            ends["x+"] = plates["center"][:, 0] + (upper - index[:, 2]) * pixel_size
+        else:
+            # the slice rows run against y
+            ends["y-"] = plates["center"][:, 1] - (upper - index[:, 1]) * pixel_size
+            ends["y+"] = plates["center"][:, 1] - (lower - index[:, 1]) * pixel_size
+    return ends
+
+
+# Centre, size and overhang from the ends. Overhang: per anode and side, how far its end lies beyond
+# the end of the nearest cathode (in z), both sides one after the other
+def plate_quantities(ends, plates):
+    anodes, cathodes = np.flatnonzero(plates["kind"] == 0), np.flatnonzero(plates["kind"] == 1)
+    quantities = {
+        "x_position": (ends["x-"] + ends["x+"]) / 2.0,
+        "y_position": (ends["y-"] + ends["y+"]) / 2.0,
+        "length": ends["x+"] - ends["x-"],
+        "width": ends["y+"] - ends["y-"],
+        "overhang": np.full(2 * len(anodes), np.nan),
+    }
+    if len(cathodes):
+        nearest = cathodes[np.argmin(np.abs(plates["center"][anodes, None, 2] - plates["center"][None, cathodes, 2]), axis=1)]
+        quantities["overhang"] = np.concatenate([ends["x-"][nearest] - ends["x-"][anodes], ends["x+"][anodes] - ends["x+"][nearest]])
+    return quantities
+
+
+# Number, mean (bias), mean absolute, root mean square and largest absolute error
+def error_statistics(errors):
+    errors = np.asarray(errors, dtype=np.float64)
+    errors = errors[np.isfinite(errors)]
+    if len(errors) == 0:
+        return {"n": 0}
+    return {
+        "n": int(len(errors)),
+        "bias": float(errors.mean()),
+        "mae": float(np.abs(errors).mean()),
+        "rmse": float(np.sqrt((errors ** 2).mean())),
+        "max": float(np.abs(errors).max()),
+    }
+
+
+# Measures one cell (task: cell, labeling file, reconstruction folder, pixel size). Returns the record of
+# the cell and its errors per quantity (for the summary of the dataset)
+def measure_cell(task):
+    cell, label_path, cell_dir, pixel_size = task
+    start_time = time.perf_counter()
+    with open(label_path, 'r') as file:
+        data = json.load(file)
+    plates = label_plates(data)
+
+    ends = {end: np.full(len(plates["kind"]), np.nan) for end in ENDS}
+    folders, runs = volume_folders(cell_dir), []
+    for folder in folders:
+        volume = read_volume(folder)
+        measured = measure_volume(volume, volume_mapping(folder, volume.shape, pixel_size, data), plates)
+        # every end from the first volume that contains it
+        for end in ENDS:
+            ends[end] = np.where(np.isnan(ends[end]), measured[end], ends[end])
+        runs.append(read_run(folder) or {})
+
+    measured = plate_quantities(ends, plates)
+    reference = plate_quantities(label_ends(plates), plates)
+    errors = {quantity: (measured[quantity] - reference[quantity]).tolist() for quantity in QUANTITIES}
+    record = {
+        "cell": cell,
+        "volumes": [os.path.relpath(folder, cell_dir) for folder in folders],
+        "errors": {quantity: error_statistics(errors[quantity]) for quantity in QUANTITIES},
+        "plates": plate_errors(errors, plates),
+        "cost": {
+            "reconstruction_seconds": sum(run.get("seconds", 0.0) for run in runs),
+            "bytes": sum(run.get("bytes", 0) for run in runs),
+            "measure_seconds": time.perf_counter() - start_time,
+        },
+        "settings": {key: runs[0][key] for key in ["algorithm", "filter", "preprocess", "precision"] if key in runs[0]} if runs else {},
+    }
+    return record, errors
+
+
+# Labeling files of an export folder by cell number (<cell>_<time>_labeling.json)
+def labeling_files(export_path):
+    files = {}
+    for name in sorted(os.listdir(export_path)):
+        if name.endswith("_labeling.json") and name.split("_")[0].isdigit():
+            files[int(name.split("_")[0])] = os.path.join(export_path, name)
+    return files
+
+
+# Measures all cells of an export folder that have a reconstruction, writes measurements.jsonl and
+# measurements_summary.json into out and returns the summary
+def measure_dataset(export_path, reconstructions, pixel_size=None, workers=None, out=None):
+    out = out or reconstructions
+    tasks = [(cell, label_path, os.path.join(reconstructions, str(cell)), pixel_size)
+             for cell, label_path in labeling_files(export_path).items() if os.path.isdir(os.path.join(reconstructions, str(cell)))]
+    if not tasks:
+        raise ValueError(f"No reconstructions of the cells of {export_path} found in {reconstructions}")
+
+    records, pooled = [], {quantity: [] for quantity in QUANTITIES}
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(measure_cell, task) for task in tasks]
+        for future in as_completed(futures):
+            record, errors = future.result()
+            records.append(record)
+            for quantity in QUANTITIES:
+                pooled[quantity] += errors[quantity]
+    records.sort(key=lambda record: record["cell"])
+
+    os.makedirs(out, exist_ok=True)
+    with open(os.path.join(out, "measurements.jsonl"), 'w') as file:
+        for record in records:
+            file.write(json.dumps(record) + "\n")
+    summary = {
+        "cells": len(records),
+        "errors": {quantity: error_statistics(pooled[quantity]) for quantity in QUANTITIES},
+        "cost": {key: sum(record["cost"][key] for record in records) for key in ["reconstruction_seconds", "bytes", "measure_seconds"]},
+        "settings": records[0]["settings"],
+    }
+    with open(os.path.join(out, "measurements_summary.json"), 'w') as file:
+        json.dump(summary, file, indent=4)
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measures overhang and plate offsets in reconstructions and scores them against the labels")
+    parser.add_argument("export_path", help="export folder with the labeling files of the cells")
+    parser.add_argument("--reconstructions", required=True, help="folder with one reconstruction folder per cell (<cell>/slice_*.tiff)")
+    parser.add_argument("--pixel-size", type=float, help="edge length of a voxel in m (if not in roi.json/reconstruction.json)")
+    parser.add_argument("--workers", type=int, help="number of worker processes (default: all cores)")
+    parser.add_argument("--out", help="folder of measurements.jsonl and measurements_summary.json (default: --reconstructions)")
+    args = parser.parse_args(argv)
+    summary = measure_dataset(args.export_path, args.reconstructions, args.pixel_size, args.workers, args.out)
+    print(f"{summary['cells']} cells, reconstruction {summary['cost']['reconstruction_seconds']:.1f} s, {summary['cost']['bytes'] / 1e6:.1f} MB")
+    for quantity, stats in summary["errors"].items():
+        if stats["n"]:
+            print(f"{quantity:<12} n={stats['n']:<5} bias={stats['bias']:+.2e} m  mae={stats['mae']:.2e} m  max={stats['max']:.2e} m")
+
+
+if __name__ == "__main__":
+    main()
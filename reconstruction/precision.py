@@ -0,0 +1,75 @@
+"""
+File: precision.py
+Description: Reduced precision of projections (uint16/float16) and reconstructed volumes (uint16)
+
+Projections are kept as uint16 (simulated grey values, lossless) or float16 (preprocessed, relative
+error <= 2^-11) in memory and in the sinogram cache, the reconstruction converts them to float32 per
+slab. Volumes are quantized to uint16 with one scale for all slices: value = offset + q * step.
+"""
+
+import json
+import os
+
+import numpy as np
+
+PRECISIONS = ["float32", "reduced"]
+SCALE_NAME = "scale.json"
+UINT16_MAX = 65535
+
+
+# Storage type of projections: integer grey values stay uint16, everything else is float16 in reduced precision
+def storage_dtype(precision, source_dtype, method="none"):
+    if precision == "float32":
+        return np.dtype(np.float32)
+    source_dtype = np.dtype(source_dtype)
+    if method == "none" and np.issubdtype(source_dtype, np.integer) and np.iinfo(source_dtype).max <= UINT16_MAX:
+        return np.dtype(np.uint16)
+    return np.dtype(np.float16)
+
+
+# Block in the storage type and the largest absolute error of the conversion
+def to_storage(block, dtype):
+    stored = block.astype(dtype)
+    if stored.dtype == block.dtype:
+        return stored, 0.0
+    error = np.abs(stored.astype(np.float32) - block.astype(np.float32))
+    return stored, float(error.max()) if error.size else 0.0
+
+
+# Global uint16 scale of a volume with the value range lo to hi, the rounding error is at most step / 2
+def volume_scale(lo, hi):
+    step = (hi - lo) / UINT16_MAX if hi > lo else 1.0
+    return {"offset": float(lo), "step": float(step), "max_abs_error": float(step) / 2.0}
+
+
+def quantize(slices, scale):
+    return np.clip(np.round((slices - scale["offset"]) / scale["step"]), 0, UINT16_MAX).astype(np.uint16)
+
+
+def dequantize(values, scale):
+    return (scale["offset"] + values.astype(np.float32) * scale["step"]).astype(np.float32)
+
+
+def write_scale(output_dir, scale):
+    with open(os.path.join(output_dir, SCALE_NAME), 'w') as file:
+        json.dump(scale, file, indent=4)
+
+
+# Scale of a slice folder, None if the slices are float32
+def read_scale(output_dir):
+    file_path = os.path.join(output_dir, SCALE_NAME)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+# Error bounds of a reduced precision run: storage of the projections and quantization of the volume
+def error_report(projection_error, projection_range, scale):
+    value_range = scale["step"] * UINT16_MAX
+    return {
+        "projection_max_abs_error": projection_error,
+        "projection_max_rel_error": projection_error / projection_range if projection_range > 0 else 0.0,
+        "volume_max_abs_error": scale["max_abs_error"],
+        "volume_max_rel_error": scale["max_abs_error"] / value_range if value_range > 0 else 0.0,
+    }
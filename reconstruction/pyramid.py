@@ -0,0 +1,110 @@
+"""
+File: pyramid.py
+Description: Downsampled levels of a reconstructed volume (mean over f x f x f voxels), written while the slabs arrive
+
+Every level is binned directly from the full resolution slabs: the slices of a slab are collected until f of them
+are there (a slab boundary can lie inside a bin), then averaged and binned in the plane. Bins at the edges of the
+volume are averaged over the voxels they cover. The levels are .npy files in <output>/pyramid/ (level_<f>.npy,
+float32, opened as memory map), pyramid.json lists them with the shape of the full volume. The full resolution
+stays in the slices, read_block reads only the slices and the crop of the region that is inspected.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from precision import dequantize, read_scale
+
+PYRAMID_DIR = "pyramid"
+PYRAMID_LEVELS = [2, 4, 8]
+
+
+# Mean over factor x factor pixels of every slice (slices, rows, cols), partial bins at the edges included
+def bin_slices(slices, factor):
+    rows, cols = slices.shape[1:]
+    row_starts, col_starts = np.arange(0, rows, factor), np.arange(0, cols, factor)
+    sums = np.add.reduceat(np.add.reduceat(slices, row_starts, axis=1), col_starts, axis=2)
+    counts = np.outer(np.diff(np.append(row_starts, rows)), np.diff(np.append(col_starts, cols)))
+    return (sums / counts).astype(np.float32)
+
+
+class PyramidWriter:
+    # Levels of a volume with num_rows slices of shape slice_shape, slabs are added in order
+
+    def __init__(self, output_dir, num_rows, slice_shape, levels=PYRAMID_LEVELS, start=0):
+        self.path = os.path.join(output_dir, PYRAMID_DIR)
+        os.makedirs(self.path, exist_ok=True)
+        self.num_rows, self.slice_shape, self.levels, self.start = num_rows, tuple(slice_shape), list(levels), start
+        self.volumes, self.pending, self.written = {}, {}, {}
+        for factor in self.levels:
+            shape = (-(-num_rows // factor),) + tuple(-(-n // factor) for n in self.slice_shape)
+            self.volumes[factor] = np.lib.format.open_memmap(self.level_path(factor) + ".tmp", mode="w+", dtype=np.float32, shape=shape)
+            self.pending[factor] = []
+            self.written[factor] = 0
+
+    def level_path(self, factor):
+        return os.path.join(self.path, f"level_{factor}.npy")
+
+    # slab: the next slices of the volume
+    def add(self, slab):
+        slab = np.asarray(slab, dtype=np.float32)
+        for factor in self.levels:
+            pending = self.pending[factor]
+            pending.append(slab)
+            count = sum(len(block) for block in pending)
+            full = count // factor * factor
+            if full == 0:
+                continue
+            block = np.concatenate(pending)
+            self.flush(factor, block[:full])
+            self.pending[factor] = [block[full:]] if full < count else []
+
+    def flush(self, factor, block):
+        binned = bin_slices(block, factor)
+        # mean over groups of factor slices
+        binned = binned.reshape(-1, factor, *binned.shape[1:]).mean(axis=1) if len(block) % factor == 0 else binned.mean(axis=0, keepdims=True)
+        self.volumes[factor][self.written[factor]:self.written[factor] + len(binned)] = binned
+        self.written[factor] += len(binned)
+
+    # Last partial bins, renames the levels and writes pyramid.json
+    def close(self):
+        for factor in self.levels:
+            if self.pending[factor]:
+                self.flush(factor, np.concatenate(self.pending[factor]))
+            self.volumes[factor].flush()
+            shape = self.volumes[factor].shape
+            del self.volumes[factor]
+            os.replace(self.level_path(factor) + ".tmp", self.level_path(factor))
+            self.volumes[factor] = shape
+        meta = {
+            "shape": [self.num_rows, *self.slice_shape],
+            "start": self.start,
+            "levels": {str(factor): list(self.volumes[factor]) for factor in self.levels},
+        }
+        with open(os.path.join(self.path, "pyramid.json"), 'w') as file:
+            json.dump(meta, file, indent=4)
+        return meta
+
+
+def read_pyramid_meta(output_dir):
+    file_path = os.path.join(output_dir, PYRAMID_DIR, "pyramid.json")
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+# Level factor of a reconstruction as read-only memory map (slices, rows, cols)
+def read_level(output_dir, factor):
+    return np.load(os.path.join(output_dir, PYRAMID_DIR, f"level_{factor}.npy"), mmap_mode="r")
+
+
+# Full resolution block [z0, z1) x [y0, y1) x [x0, x1) (slice numbers of the volume from 0), only these slices are read
+def read_block(output_dir, z0, z1, y0, y1, x0, x1):
+    import tifffile as tiff
+
+    files = sorted(f for f in os.listdir(output_dir) if f.startswith("slice_") and f.endswith((".tif", ".tiff")))
+    block = np.stack([tiff.imread(os.path.join(output_dir, f))[y0:y1, x0:x1] for f in files[z0:z1]])
+    scale = read_scale(output_dir)
+    return dequantize(block, scale) if scale is not None else block.astype(np.float32)
@@ -1,13 +1,40 @@
+"""
+Reconstruction of the simulated projections
+
+    python reconstructions.py --input data/scan1 --output reconstruction_output_1 [--plot] [--view3d]
+    python reconstructions.py --input data/scan1 --cache --slab 32 --preprocess minus_log
+
+With --cache the projections are read from the sinogram cache of the scan (sinogram_cache.py),
+with --slab the rows are reconstructed and saved in slabs, so the volume is never held at once.
+With --precision reduced projections stay uint16/float16 until a slab is reconstructed and the
+slices are saved as uint16 with one scale for the volume (precision.py), the error bounds are reported.
+--algorithm fbp uses the filtered back projection of fbp.py (NumPy/scipy, FFTs in worker threads) instead of
+tomopy gridrec, auto (default) takes gridrec if tomopy is installed.
+With --roi-labels only the edge zones of the plates given by the labels of the cell are reconstructed
+(roi.py, one folder per ROI with roi.json), --rows and --region select an ROI by hand.
+While the slabs are saved, the 2x, 4x and 8x binned levels of the saved slices (the values of the TIFF files)
+are written to <output>/pyramid (pyramid.py), --view-level shows one of them instead of the full volume.
+
+Only numpy is imported at startup, tomopy, scipy, tifffile, skimage, matplotlib and mayavi
+are imported by the step that needs them (mayavi/VTK alone takes seconds to load).
+"""
+
+import argparse
+import json
 import os
+import time
 import numpy as np
-import tomopy
-import matplotlib.pyplot as plt
-from skimage import io
-from skimage import exposure
-import tifffile as tiff
-from mayavi import mlab
-
-def read_projections(folder_path):
+
+from fbp import FILTERS, TABLE_CACHE_BYTES
+from precision import PRECISIONS, dequantize, error_report, quantize, storage_dtype, to_storage, volume_scale, write_scale
+from pyramid import PYRAMID_LEVELS, PyramidWriter, read_level
+from roi import ROI_MODES, label_rois, load_labels, parse_roi, roi_fraction, scan_geometry, write_roi
+from sinogram_cache import PREPROCESSING, open_sinograms, preprocess_projections, read_cache_meta
+
+# dtype None keeps the type of the files (e.g. uint16)
+def read_projections(folder_path, dtype=np.float32):
+    import tifffile as tiff
+
     # List all TIFF files in the folder
     files = sorted([f for f in os.listdir(folder_path) if f.endswith('.tif')])
     if not files:
@@ -19,7 +46,7 @@ def read_projections(folder_path):
     image_shape = first_image.shape
 
     # Initialize an array to hold all projections
-    projections = np.zeros((num_projections, *image_shape), dtype=np.float32)
+    projections = np.zeros((num_projections, *image_shape), dtype=dtype or first_image.dtype)
 
     # Read each image
     for i, file in enumerate(files):
@@ -28,28 +55,115 @@ def read_projections(folder_path):
 
     return projections
 
-# Step 1: Read projection images from a folder
-input_folder = 'D:\BatteryCT\data\scan1'
-projections = read_projections(input_folder)
+ALGORITHMS = ["auto", "gridrec", "fbp"]
+RUN_NAME = "reconstruction.json"
+
+# "auto": tomopy gridrec if tomopy can be imported, otherwise fbp.py
+def resolve_algorithm(algorithm):
+    if algorithm != "auto":
+        return algorithm
+    try:
+        import tomopy  # noqa: F401
+        return "gridrec"
+    except ImportError:
+        return "fbp"
+
+# threads and filter_name are only used by fbp (gridrec always uses the ramp filter). region (first row,
+# first column, rows, columns) crops the slices, fbp only back projects the region, gridrec crops afterwards.
+# theta are the angles of the projections (e.g. recorded by augment.py for a subsampled scan).
+def reconstruct(projections, algorithm="auto", threads=None, filter_name="ramp", region=None, theta=None):
+    # Generate angles for projections (assuming uniformly spaced angles)
+    num_projections = projections.shape[0]
+    theta = np.linspace(0, 2*np.pi, num_projections) if theta is None else np.asarray(theta, dtype=np.float64)
+
+    if resolve_algorithm(algorithm) == "fbp":
+        from fbp import fbp
+        return fbp(projections, theta, filter_name=filter_name, threads=threads, region=region)
+
+    import tomopy
+
+    # Reconstruct the image using Filtered Back Projection (FBP)
+    reconstruction = tomopy.recon(projections, theta, algorithm='gridrec')
+    if region is not None:
+        reconstruction = reconstruction[:, region[0]:region[0] + region[2], region[1]:region[1] + region[3]]
+    return reconstruction
 
-# Step 2: Generate angles for projections (assuming uniformly spaced angles)
-num_projections = projections.shape[0]
-theta = np.linspace(0, 2*np.pi, num_projections)
+# Reconstructs slab_rows detector rows at a time (all rows if slab_rows <= 0), yields the first row and the slices.
+# rows [start, stop) restricts the reconstruction to these detector rows (region of interest).
+def reconstruct_slabs(projections, slab_rows=0, rows=None, **options):
+    first, last = rows if rows is not None else (0, projections.shape[1])
+    slab_rows = slab_rows if slab_rows > 0 else last - first
+    for start in range(first, last, slab_rows):
+        # contiguous read of the rows if projections is the view of a sinogram cache, float32 only for this slab
+        stop = min(start + slab_rows, last)
+        yield start, reconstruct(np.ascontiguousarray(projections[:, start:stop, :], dtype=np.float32), **options)
 
-# Step 3: Reconstruct the image using Filtered Back Projection (FBP)
-reconstruction = tomopy.recon(projections, theta, algorithm='gridrec')
+# Reduced precision: the slabs are collected in a float32 scratch file in the output folder, then all slices
+# are saved as uint16 with the scale of the whole volume (in slabs, the pyramid gets the saved values).
+# Returns the scale and, with keep, the uint16 volume.
+def reconstruct_reduced(projections, output_dir, slab_rows=0, keep=False, rows=None, pyramid=None, **options):
+    os.makedirs(output_dir, exist_ok=True)
+    first, last = rows if rows is not None else (0, projections.shape[1])
+    scratch_path = os.path.join(output_dir, "volume.tmp.npy")
+    volume = None
+    lo, hi = np.inf, -np.inf
+    for start, slab in reconstruct_slabs(projections, slab_rows, rows, **options):
+        if volume is None:
+            volume = np.lib.format.open_memmap(scratch_path, mode="w+", dtype=np.float32, shape=(last - first, *slab.shape[1:]))
+        volume[start - first:start - first + len(slab)] = slab
+        lo, hi = min(lo, float(slab.min())), max(hi, float(slab.max()))
 
-# Step 4: Save the reconstructed slices as a TIFF image stack
-output_dir = 'reconstruction_output_1'
-os.makedirs(output_dir, exist_ok=True)
+    scale = volume_scale(lo, hi)
+    quantized = np.empty(volume.shape, dtype=np.uint16) if keep else None
+    slab_rows = slab_rows if slab_rows > 0 else len(volume)
+    for start in range(0, len(volume), slab_rows):
+        saved = save_reconstruction(volume[start:start + slab_rows], output_dir, first + start, scale)
+        if pyramid is not None:
+            pyramid.add(saved)
+        if keep:
+            quantized[start:start + slab_rows] = quantize(volume[start:start + slab_rows], scale)
+    del volume
+    os.remove(scratch_path)
+    return scale, quantized
 
-for i in range(reconstruction.shape[0]):
-    # Normalize the image for better visualization and save
-    slice_img = exposure.rescale_intensity(reconstruction[i], out_range=(0, 1))
-    tiff.imsave(f"{output_dir}/slice_{i:04d}.tiff", slice_img.astype(np.float32))
+# With a scale the slices are saved as uint16 (precision.quantize) instead of float32 rescaled per slice.
+# Returns the saved values as float32 (the uint16 slices dequantized), the pyramid is built from them.
+def save_reconstruction(reconstruction, output_dir, start=0, scale=None):
+    import tifffile as tiff
+    from skimage import exposure
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    saved = np.empty(reconstruction.shape, dtype=np.float32)
+    for i in range(reconstruction.shape[0]):
+        if scale is not None:
+            values = quantize(reconstruction[i], scale)
+            tiff.imwrite(f"{output_dir}/slice_{start + i:04d}.tiff", values)
+            saved[i] = dequantize(values, scale)
+            continue
+        # Normalize the image for better visualization and save
+        slice_img = exposure.rescale_intensity(reconstruction[i], out_range=(0, 1))
+        tiff.imwrite(f"{output_dir}/slice_{start + i:04d}.tiff", slice_img.astype(np.float32))
+        saved[i] = slice_img
+    return saved
+
+# Settings, rows, crop and time of a reconstruction, next to its slices (measure.py compares settings by it)
+def write_run(output_dir, record):
+    record["bytes"] = sum(os.path.getsize(os.path.join(output_dir, f)) for f in os.listdir(output_dir) if f.endswith(".tiff"))
+    with open(os.path.join(output_dir, RUN_NAME), 'w') as file:
+        json.dump(record, file, indent=4)
+
+def read_run(output_dir):
+    file_path = os.path.join(output_dir, RUN_NAME)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
 
 # Step 5: Visualize the reconstruction results
 def plot_reconstruction(projections, reconstruction):
+    import matplotlib.pyplot as plt
+
     fig, axes = plt.subplots(1, 3, figsize=(15, 5))
     axes[0].imshow(projections[:, int(projections.shape[1] / 2)], cmap='gray')
     axes[0].set_title('Projections')
@@ -62,11 +176,11 @@ def plot_reconstruction(projections, reconstruction):
     plt.tight_layout()
     plt.show()
 
-plot_reconstruction(projections, reconstruction)
-
 
 # Step 6: 3D Visualization with threshold and slicing options
 def visualize_3d(volume, threshold=None, z_slice=None):
+    from mayavi import mlab
+
     mlab.figure(size=(800, 800), bgcolor=(1, 1, 1))
     
     # Apply threshold if provided
@@ -84,11 +198,127 @@ def visualize_3d(volume, threshold=None, z_slice=None):
     mlab.axes()
     mlab.show()
 
-# Example usage:
-# Set a threshold for grey values
-threshold_value = 0.1
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstruction of simulated CT projections")
+    parser.add_argument("--input", default='D:\\BatteryCT\\data\\scan1', help="folder with the projections (.tif)")
+    parser.add_argument("--output", default='reconstruction_output_1', help="folder for the reconstructed slices")
+    parser.add_argument("--plot", action="store_true", help="show projections and a reconstructed slice (matplotlib)")
+    parser.add_argument("--view3d", action="store_true", help="show the volume in 3D (mayavi)")
+    parser.add_argument("--cache", action="store_true", help="read the projections from the sinogram cache of the input (built on first use)")
+    parser.add_argument("--cache-dir", help="folder of the sinogram cache (default: <input>/sinogram_cache)")
+    parser.add_argument("--preprocess", choices=PREPROCESSING, default="none", help="preprocessing of the projections")
+    parser.add_argument("--precision", choices=PRECISIONS, default="float32", help="reduced: uint16/float16 projections and uint16 slices")
+    parser.add_argument("--slab", type=int, default=0, help="detector rows per reconstructed slab (0: all rows at once)")
+    parser.add_argument("--algorithm", choices=ALGORITHMS, default="auto", help="gridrec (tomopy) or fbp (fbp.py), auto: gridrec if tomopy is installed")
+    parser.add_argument("--threads", type=int, help="worker threads of the fbp filter FFTs (default: all CPUs)")
+    parser.add_argument("--table-cache", type=float, default=TABLE_CACHE_BYTES / 2**20, help="memory of the cached fbp lookup tables in MB")
+    parser.add_argument("--filter", choices=FILTERS, default="ramp", help="filter of fbp")
+    parser.add_argument("--roi-labels", help="labeling file of the cell, only its edge zones are reconstructed (roi.py)")
+    parser.add_argument("--roi-mode", choices=ROI_MODES, default="edges", help="edges: one ROI per plate end, stack: one ROI of all plates")
+    parser.add_argument("--roi-margin", type=float, default=0.001, help="margin around the ROI in m")
+    parser.add_argument("--pixel-size", type=float, help="edge length of a voxel in m (needed by --roi-labels)")
+    parser.add_argument("--pyramid", type=int, nargs="*", default=PYRAMID_LEVELS, help="factors of the downsampled levels (none: no pyramid)")
+    parser.add_argument("--view-level", type=int, default=0, help="pyramid level shown by --plot/--view3d (0: full resolution in memory)")
+    parser.add_argument("--rows", help="ROI by hand: detector rows start:stop")
+    parser.add_argument("--region", help="ROI by hand: crop of the slices row0:row1,col0:col1")
+    # Set a threshold for grey values
+    parser.add_argument("--threshold", type=float, default=0.1, help="grey value threshold of the 3D view")
+    # Slice index in the z-direction (negative for no slicing)
+    parser.add_argument("--z-slice", type=int, default=50, help="slice index of the 3D view (-1: volume rendering)")
+    args = parser.parse_args(argv)
+    # the level is read after the reconstruction, so it has to be one of the levels that are written
+    if args.view_level and args.view_level not in (args.pyramid or []):
+        parser.error(f"--view-level {args.view_level} is not a level of --pyramid ({', '.join(map(str, args.pyramid or [])) or 'none'})")
+
+    # Step 1: Read projection images from a folder (or the sinogram cache)
+    if args.cache:
+        projections = np.moveaxis(open_sinograms(args.input, args.cache_dir, args.preprocess, precision=args.precision), 1, 0)
+        meta = read_cache_meta(args.input, args.cache_dir, args.preprocess, args.precision)
+        projection_error, projection_range = meta["max_abs_error"], meta["range"][1] - meta["range"][0]
+    else:
+        projections = read_projections(args.input, dtype=None if args.precision == "reduced" else np.float32)
+        if args.preprocess != "none":
+            projections = preprocess_projections(projections.astype(np.float32), args.preprocess, float(projections[0].max()))
+        projection_range = float(projections.max()) - float(projections.min())
+        projections, projection_error = to_storage(projections, storage_dtype(args.precision, projections.dtype, args.preprocess))
+
+    # Regions of interest: from the labels (one folder per ROI) or given by hand, None is the full volume
+    rois, geometry = [None], {"detector_rows": projections.shape[1], "slice_size": projections.shape[2]}
+    if args.pixel_size is not None:
+        geometry["pixel_size"] = args.pixel_size
+    if args.roi_labels:
+        if args.pixel_size is None:
+            parser.error("--roi-labels needs --pixel-size")
+        labels = load_labels(args.roi_labels)
+        geometry = scan_geometry(projections.shape, args.pixel_size, labels)
+        rois = label_rois(labels, projections.shape, args.pixel_size, args.roi_margin, args.roi_mode)
+    elif args.rows or args.region:
+        rois = [parse_roi(args.rows, args.region, projections.shape)]
+
+    # Step 2 + 3 + 4: Generate angles, reconstruct and save the slices as a TIFF image stack
+    # (the whole volume is only kept for the visualization)
+    keep = (args.plot or args.view3d) and not args.view_level
+    options = {"algorithm": args.algorithm, "threads": args.threads, "filter_name": args.filter}
+    # a variant of augment.py records the angles of its (subsampled) projections
+    from augment import read_angles
+    theta = read_angles(args.input)
+    if theta is not None:
+        if len(theta) != projections.shape[0]:
+            parser.error(f"{args.input}: {len(theta)} recorded angles for {projections.shape[0]} projections")
+        options["theta"] = theta
+    import fbp
+    fbp.TABLE_CACHE_BYTES = int(args.table_cache * 2**20)
+    for roi in rois:
+        output_dir = args.output
+        start_time = time.perf_counter()
+        if roi is not None:
+            output_dir = os.path.join(args.output, roi["name"]) if args.roi_labels else args.output
+            options.update(rows=roi["rows"], region=roi["region"])
+            write_roi(output_dir, roi, geometry)
+            print(f"ROI {roi['name']}: rows {roi['rows']}, region {roi['region']} ({100 * roi_fraction(roi, projections.shape):.1f} % of the volume)")
+        first, last = roi["rows"] if roi else (0, projections.shape[1])
+        slice_shape = tuple(roi["region"][2:]) if roi else (projections.shape[2], projections.shape[2])
+        pyramid = PyramidWriter(output_dir, last - first, slice_shape, args.pyramid, first) if args.pyramid else None
+        if args.precision == "reduced":
+            scale, quantized = reconstruct_reduced(projections, output_dir, args.slab, keep, pyramid=pyramid, **options)
+            report = error_report(projection_error, projection_range, scale)
+            write_scale(output_dir, dict(scale, **report))
+            print("Error bounds: " + ", ".join(f"{key}={value:.3g}" for key, value in report.items()))
+            reconstruction = dequantize(quantized, scale) if keep else None
+        else:
+            slabs = []
+            for start, slab in reconstruct_slabs(projections, args.slab, **options):
+                # the levels and the view are the saved (rescaled) values, so that every level matches the slices
+                saved = save_reconstruction(slab, output_dir, start)
+                if pyramid is not None:
+                    pyramid.add(saved)
+                if keep:
+                    slabs.append(saved)
+            reconstruction = np.concatenate(slabs) if slabs else None
+        if pyramid is not None:
+            pyramid.close()
+        if args.view_level:
+            # coarse level from the file instead of the full volume in memory
+            reconstruction = np.asarray(read_level(output_dir, args.view_level))
+        write_run(output_dir, {
+            "algorithm": resolve_algorithm(args.algorithm),
+            "filter": args.filter,
+            "preprocess": args.preprocess,
+            "precision": args.precision,
+            "slab": args.slab,
+            "rows": roi["rows"] if roi else [0, projections.shape[1]],
+            "region": roi["region"] if roi else [0, 0, projections.shape[2], projections.shape[2]],
+            "geometry": geometry,
+            "seconds": time.perf_counter() - start_time,
+        })
+
+    # Step 5: Visualize the reconstruction results
+    if args.plot:
+        plot_reconstruction(projections, reconstruction)
 
-# Slice index in the z-direction (None for no slicing)
-z_slice_index = 50
+    # Step 6: 3D view
+    if args.view3d:
+        visualize_3d(reconstruction, threshold=args.threshold, z_slice=args.z_slice if args.z_slice >= 0 else None)
 
-visualize_3d(reconstruction, threshold=threshold_value, z_slice=z_slice_index)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+File: roi.py
+Description: Regions of interest of a reconstruction (detector rows and a crop of the slices) from the labels of a cell
+
+Overhang and bending sit in narrow bands at the ends of the plates, an ROI reconstructs only these bands:
+the detector rows of the stack and per end a crop of the slices. The labels (<cell>_labeling.json) are in m,
+the mapping to the scan assumes parallel beam with
+  - the z axis of the cell as rotation axis on the middle column of the detector (cols // 2),
+  - the detector rows along z, row 0 at the top and the middle row at half the housing height,
+  - x along the columns and y upwards along the rows of a slice (the slice size is cols, as reconstruct),
+  - pixel_size the edge length of a voxel in m (detector pixel / magnification).
+Wound cells have their edge zones at the top and bottom of the sheets, their ROIs are bands of rows.
+
+    python roi.py data/1_labeling.json --shape 180 245 385 --pixel-size 0.0002
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+ROI_NAME = "roi.json"
+ROI_MODES = ["edges", "stack"]
+PLATE_NAMES = ["anode", "cathode", "upper_anode_coating", "lower_anode_coating", "upper_cathode_coating", "lower_cathode_coating"]
+
+
+def load_labels(file_path):
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+# Number of every labeled plate of a type in the stack (label entry n is not plate n if a defect removed a plate).
+# Labels without the entry (older cells) have all plates.
+def plate_layers(data, name):
+    return np.array(data[name].get(f"{name}_layer", range(len(data[name][f"{name}_position"]["x"]))), dtype=int)
+
+
+# Bounding boxes (lower, upper) of all labeled plates in m
+def plate_boxes(data):
+    lower, upper = [], []
+    for name in PLATE_NAMES:
+        position = data[name][f"{name}_position"]
+        dimensions = data[name][f"{name}_dimensions"]
+        center = np.array([position["x"], position["y"], position["z"]], dtype=np.float64).T.reshape(-1, 3)
+        size = np.array([dimensions["length"], dimensions["width"], dimensions["height"]], dtype=np.float64).T.reshape(-1, 3)
+        lower.append(center - size / 2.0)
+        upper.append(center + size / 2.0)
+    return np.concatenate(lower), np.concatenate(upper)
+
+
+# Mapping of the scan: shape of the projections (angles, rows, cols), pixel size and the z of the middle row
+def scan_geometry(shape, pixel_size, data):
+    return {
+        "detector_rows": int(shape[1]),
+        "slice_size": int(shape[2]),
+        "pixel_size": float(pixel_size),
+        "z_center": float(data["housing"]["housing_dimensions"]["outer_height"][0]) / 2.0,
+    }
+
+
+# Detector rows [start, stop) of the heights z_lo to z_hi (row 0 at the top)
+def z_to_rows(z_lo, z_hi, geometry):
+    middle = geometry["detector_rows"] / 2.0
+    start = int(np.floor(middle - (z_hi - geometry["z_center"]) / geometry["pixel_size"]))
+    stop = int(np.ceil(middle - (z_lo - geometry["z_center"]) / geometry["pixel_size"]))
+    return [max(start, 0), min(stop, geometry["detector_rows"])]
+
+
+# Crop (first row, first column, rows, columns) of the slice that covers x_lo..x_hi, y_lo..y_hi
+def xy_to_region(x_lo, x_hi, y_lo, y_hi, geometry):
+    size, pixel_size = geometry["slice_size"], geometry["pixel_size"]
+    col0 = max(int(np.floor(size // 2 + x_lo / pixel_size)), 0)
+    col1 = min(int(np.ceil(size // 2 + x_hi / pixel_size)) + 1, size)
+    row0 = max(int(np.floor(size // 2 - y_hi / pixel_size)), 0)
+    row1 = min(int(np.ceil(size // 2 - y_lo / pixel_size)) + 1, size)
+    return [row0, col0, max(row1 - row0, 0), max(col1 - col0, 0)]
+
+
+# ROIs of a cell: "edges" gives one crop per end of the plates (x- and x+, from the innermost to the
+# outermost plate end, e.g. cathode to anode overhang), "stack" one crop of all plates. margin (m) is
+# added on every side and also covers the rise of bent ends.
+def label_rois(data, shape, pixel_size, margin=0.001, mode="edges"):
+    geometry = scan_geometry(shape, pixel_size, data)
+    if "winding" in data:
+        return winding_rois(data, geometry, margin, mode)
+
+    lower, upper = plate_boxes(data)
+    rows = z_to_rows(lower[:, 2].min() - margin, upper[:, 2].max() + margin, geometry)
+    y_lo, y_hi = lower[:, 1].min() - margin, upper[:, 1].max() + margin
+    if mode == "stack":
+        return [{"name": "stack", "rows": rows, "region": xy_to_region(lower[:, 0].min() - margin, upper[:, 0].max() + margin, y_lo, y_hi, geometry)}]
+    return [
+        {"name": "x-", "rows": rows, "region": xy_to_region(lower[:, 0].min() - margin, lower[:, 0].max() + margin, y_lo, y_hi, geometry)},
+        {"name": "x+", "rows": rows, "region": xy_to_region(upper[:, 0].min() - margin, upper[:, 0].max() + margin, y_lo, y_hi, geometry)},
+    ]
+
+
+# Wound cells: the sheets fill the whole cross section, the edge zones are the rows of the upper and lower sheet edges
+def winding_rois(data, geometry, margin, mode):
+    housing = data["housing"]["housing_dimensions"]
+    half_length, half_width = housing["inner_length"][0] / 2.0, housing["inner_width"][0] / 2.0
+    region = xy_to_region(-half_length, half_length, -half_width, half_width, geometry)
+    lower, upper = [], []
+    for name in PLATE_NAMES + ["separator"]:
+        z = np.array(data[name][f"{name}_position"]["z"], dtype=np.float64)
+        width = np.array(data[name][f"{name}_dimensions"]["width"], dtype=np.float64)
+        lower.append(z - width / 2.0)
+        upper.append(z + width / 2.0)
+    lower, upper = np.concatenate(lower), np.concatenate(upper)
+    if mode == "stack":
+        return [{"name": "stack", "rows": z_to_rows(lower.min() - margin, upper.max() + margin, geometry), "region": region}]
+    return [
+        {"name": "z-", "rows": z_to_rows(lower.min() - margin, lower.max() + margin, geometry), "region": region},
+        {"name": "z+", "rows": z_to_rows(upper.min() - margin, upper.max() + margin, geometry), "region": region},
+    ]
+
+
+# ROI given by hand: rows "start:stop", region "row0:row1,col0:col1" (pixels of the slice)
+def parse_roi(rows_text, region_text, shape):
+    rows = [0, shape[1]]
+    if rows_text:
+        start, stop = rows_text.split(":")
+        rows = [int(start or 0), int(stop or shape[1])]
+    region = [0, 0, shape[2], shape[2]]
+    if region_text:
+        (row0, row1), (col0, col1) = [[int(n) for n in part.split(":")] for part in region_text.split(",")]
+        region = [row0, col0, row1 - row0, col1 - col0]
+    return {"name": "roi", "rows": rows, "region": region}
+
+
+# Detector rows, crop and mapping of an ROI next to its slices (slice_<row>.tiff, the row of the detector),
+# so the measurement can convert voxel indices back to m
+def write_roi(output_dir, roi, geometry=None):
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, ROI_NAME), 'w') as file:
+        json.dump(dict(roi, geometry=geometry), file, indent=4)
+
+
+def read_roi(output_dir):
+    file_path = os.path.join(output_dir, ROI_NAME)
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+# Voxel (detector row, slice row, slice column) of an ROI volume to x, y, z in m (centre of the voxel, detector row r
+# covers the heights of [r, r + 1) from the top)
+def voxel_to_world(indices, roi):
+    geometry = roi["geometry"]
+    indices = np.asarray(indices, dtype=np.float64)
+    row = indices[..., 0] + roi["rows"][0]
+    slice_row = indices[..., 1] + roi["region"][0]
+    slice_col = indices[..., 2] + roi["region"][1]
+    pixel_size, size = geometry["pixel_size"], geometry["slice_size"]
+    return np.stack([
+        (slice_col - size // 2) * pixel_size,
+        (size // 2 - slice_row) * pixel_size,
+        geometry["z_center"] - (row + 0.5 - geometry["detector_rows"] / 2.0) * pixel_size,
+    ], axis=-1)
+
+
+# Inverse of voxel_to_world: x, y, z in m to (fractional) voxel indices of an ROI volume
+def world_to_voxel(points, roi):
+    geometry = roi["geometry"]
+    points = np.asarray(points, dtype=np.float64)
+    pixel_size, size = geometry["pixel_size"], geometry["slice_size"]
+    return np.stack([
+        geometry["detector_rows"] / 2.0 - (points[..., 2] - geometry["z_center"]) / pixel_size - 0.5 - roi["rows"][0],
+        size // 2 - points[..., 1] / pixel_size - roi["region"][0],
+        size // 2 + points[..., 0] / pixel_size - roi["region"][1],
+    ], axis=-1)
+
+
+# Fraction of the full reconstruction (rows x slice pixels) that an ROI covers
+def roi_fraction(roi, shape):
+    return (roi["rows"][1] - roi["rows"][0]) * roi["region"][2] * roi["region"][3] / float(shape[1] * shape[2] * shape[2])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Regions of interest of a scan from the labels of its cell")
+    parser.add_argument("labels", help="labeling file of the cell (<cell>_labeling.json)")
+    parser.add_argument("--shape", nargs=3, type=int, required=True, metavar=("ANGLES", "ROWS", "COLS"), help="shape of the projections")
+    parser.add_argument("--pixel-size", type=float, required=True, help="edge length of a voxel in m")
+    parser.add_argument("--margin", type=float, default=0.001, help="margin around the edge zones in m")
+    parser.add_argument("--mode", choices=ROI_MODES, default="edges")
+    args = parser.parse_args(argv)
+    for roi in label_rois(load_labels(args.labels), args.shape, args.pixel_size, args.margin, args.mode):
+        print(f"{roi['name']}: rows {roi['rows']}, region {roi['region']} ({100 * roi_fraction(roi, args.shape):.1f} % of the volume)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+File: sinogram_cache.py
+Description: Sinogram-ordered cache of a projection folder (memory mapped .npy file)
+
+read_projections returns (angles, rows, cols), so a slab of detector rows touches every projection
+file and every projection in memory. The cache stores the projections once as (rows, angles, cols):
+every sinogram and every slab of rows is contiguous in the file and is read without decoding a TIFF.
+It is built on first use (optionally already preprocessed), reused by every later reconstruction of
+the scan whatever the algorithm or its parameters, and built again when the projections change.
+In reduced precision the cache holds uint16 or float16 values (precision.py) and half the bytes.
+
+    python sinogram_cache.py data/scan1 --preprocess minus_log --precision reduced
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from precision import PRECISIONS, storage_dtype, to_storage
+
+CACHE_NAME = "sinogram_cache"
+CACHE_VERSION = 1
+
+# "none": grey values as simulated, "minus_log": line integrals -log(I / I0)
+PREPROCESSING = ["none", "minus_log"]
+
+
+def projection_files(folder_path):
+    files = sorted([f for f in os.listdir(folder_path) if f.endswith('.tif')])
+    if not files:
+        raise ValueError("No TIFF files found in the specified folder.")
+    return files
+
+
+# Names, sizes and modification times of the projections, the cache is invalid if one of them changes
+def source_signature(folder_path, files):
+    digest = hashlib.sha256()
+    for file in files:
+        stat = os.stat(os.path.join(folder_path, file))
+        digest.update(f"{file}|{stat.st_size}|{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+# Preprocessing of a block of projections (any axis order), white is the unattenuated intensity I0
+def preprocess_projections(block, method, white):
+    if method == "minus_log":
+        return -np.log(np.clip(block / white, 1e-6, None))
+    return block
+
+
+# Every preprocessing and precision has its own file in the cache folder
+def cache_paths(folder_path, cache_dir=None, method="none", precision="float32"):
+    cache_dir = cache_dir or os.path.join(folder_path, CACHE_NAME)
+    name = f"sinograms_{method}" if precision == "float32" else f"sinograms_{method}_{precision}"
+    return os.path.join(cache_dir, name + ".npy"), os.path.join(cache_dir, name + ".json")
+
+
+# Converts the projections into the cache, batch projections are decoded and transposed at a time
+def build_sinogram_cache(folder_path, cache_dir=None, method="none", white=None, batch=16, precision="float32"):
+    import tifffile as tiff
+
+    files = projection_files(folder_path)
+    data_path, meta_path = cache_paths(folder_path, cache_dir, method, precision)
+    os.makedirs(os.path.dirname(data_path), exist_ok=True)
+
+    first = tiff.imread(os.path.join(folder_path, files[0]))
+    rows, cols = first.shape
+    # without a given I0 the brightest pixel of the first projection (air) is used
+    white = float(first.max()) if white is None else float(white)
+    dtype = storage_dtype(precision, first.dtype, method)
+
+    # written as temporary file and renamed, the meta data last, so a cache is either complete or rebuilt
+    tmp_path = data_path + ".tmp"
+    sinograms = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(rows, len(files), cols))
+    max_error, lo, hi = 0.0, np.inf, -np.inf
+    for start in range(0, len(files), batch):
+        block = np.stack([tiff.imread(os.path.join(folder_path, f)) for f in files[start:start + batch]]).astype(np.float32)
+        block = preprocess_projections(block, method, white)
+        stored, error = to_storage(block, dtype)
+        sinograms[:, start:start + len(block), :] = stored.transpose(1, 0, 2)
+        max_error, lo, hi = max(max_error, error), min(lo, float(block.min())), max(hi, float(block.max()))
+    sinograms.flush()
+    del sinograms
+    os.replace(tmp_path, data_path)
+
+    meta = {
+        "cache_version": CACHE_VERSION,
+        "source": os.path.abspath(folder_path),
+        "signature": source_signature(folder_path, files),
+        "files": len(files),
+        "shape": [rows, len(files), cols],
+        "dtype": dtype.name,
+        "precision": precision,
+        "preprocess": method,
+        "white": white,
+        "range": [lo, hi],
+        # largest absolute difference of the stored values to float32
+        "max_abs_error": max_error,
+    }
+    with open(meta_path + ".tmp", 'w') as file:
+        json.dump(meta, file, indent=4)
+    os.replace(meta_path + ".tmp", meta_path)
+    return meta
+
+
+# Sinograms (rows, angles, cols) of a projection folder as read-only memmap, the cache is built if
+# it is missing or outdated. np.moveaxis(sinograms, 1, 0) is the (angles, rows, cols) view of read_projections.
+def open_sinograms(folder_path, cache_dir=None, method="none", white=None, precision="float32"):
+    data_path, meta_path = cache_paths(folder_path, cache_dir, method, precision)
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(data_path):
+        with open(meta_path, 'r') as file:
+            meta = json.load(file)
+        valid = (
+            meta.get("cache_version") == CACHE_VERSION
+            and meta.get("signature") == source_signature(folder_path, projection_files(folder_path))
+            and meta.get("preprocess") == method
+            and (white is None or meta.get("white") == float(white))
+        )
+        if not valid:
+            meta = None
+    if meta is None:
+        print(f"Building sinogram cache of {folder_path} ({method})")
+        build_sinogram_cache(folder_path, cache_dir, method, white, precision=precision)
+    return np.load(data_path, mmap_mode="r")
+
+
+# Meta data of an existing cache (dtype, value range and error of the stored values)
+def read_cache_meta(folder_path, cache_dir=None, method="none", precision="float32"):
+    with open(cache_paths(folder_path, cache_dir, method, precision)[1], 'r') as file:
+        return json.load(file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Converts a projection folder into a sinogram-ordered cache")
+    parser.add_argument("input", help="folder with the projections (.tif)")
+    parser.add_argument("--cache-dir", help=f"cache folder (default: <input>/{CACHE_NAME})")
+    parser.add_argument("--preprocess", choices=PREPROCESSING, default="none")
+    parser.add_argument("--precision", choices=PRECISIONS, default="float32", help="reduced: uint16/float16 instead of float32")
+    parser.add_argument("--white", type=float, help="unattenuated intensity I0 of minus_log (default: maximum of the first projection)")
+    args = parser.parse_args(argv)
+    sinograms = open_sinograms(args.input, args.cache_dir, args.preprocess, args.white, args.precision)
+    meta = read_cache_meta(args.input, args.cache_dir, args.preprocess, args.precision)
+    print(f"Sinograms {sinograms.shape} {sinograms.dtype} ({sinograms.nbytes / 1e6:.1f} MB, max. error {meta['max_abs_error']:.3g}): {sinograms.filename}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+File: stream.py
+Description: Incremental filtered back projection of a folder while the simulator is still writing projections
+
+The back projection is a sum over the angles, so every projection is filtered and back projected as soon
+as its file is complete and added to the volume. When the last of the expected projections has arrived,
+only its own back projection and the saving of the slices are left. The angle of a projection is the
+number at the end of its file name (sim-result-8_0042.tif) minus the number of the first file, the angles
+are the same as in reconstructions.reconstruct (num_projections uniformly spaced over 2 pi).
+
+The lookup table of the whole scan is taken from the cache of fbp.py once and stored by columns, every
+batch uses the columns of its angles. The folder is polled (no dependency on a file system watcher). A
+file that cannot be read (still being written or corrupt) is logged and tried again at the next poll,
+up to read_attempts times; writing the file under another name and renaming it when it is complete
+avoids reading partial files.
+
+    python stream.py --input data/scan1 --output reconstruction_output_1 --num-projections 180
+"""
+
+import argparse
+import os
+import re
+import time
+
+import numpy as np
+
+from fbp import FILTERS, filter_sinograms, geometry_table
+from pyramid import PYRAMID_LEVELS, PyramidWriter
+from reconstructions import RUN_NAME, save_reconstruction, write_run
+from sinogram_cache import PREPROCESSING, preprocess_projections
+
+# Number at the end of a file name (angle index of the simulator)
+FILE_NUMBER = re.compile(r"(\d+)\.tiff?$")
+
+
+class StreamingFBP:
+    # Volume of a scan with num_projections angles (rows x cols detector), projections can be added in any order
+
+    def __init__(self, num_projections, rows, cols, filter_name="ramp", threads=None, slice_block=32, region=None):
+        self.num_projections, self.rows, self.cols = num_projections, rows, cols
+        self.theta = np.linspace(0, 2*np.pi, num_projections)
+        self.region = (0, 0, cols, cols) if region is None else tuple(region)
+        self.filter_name = filter_name
+        self.threads = threads or os.cpu_count() or 1
+        self.slice_block = slice_block
+        # (pixels, angles * cols) by columns, so that the columns of a batch of angles are sliced cheaply
+        self.table = geometry_table(self.theta, cols, cols, cols // 2, self.region).tocsc()
+        # (pixels, rows): the sum of the back projections of all added angles
+        self.volume = np.zeros((self.region[2] * self.region[3], rows), dtype=np.float32)
+        self.added = np.zeros(num_projections, dtype=bool)
+
+    # projections (angles, rows, cols) of the angle indices, filtered and back projected in one sparse product
+    def add(self, indices, projections):
+        indices = np.asarray(indices)
+        if self.added[indices].any():
+            raise ValueError(f"Projections {indices[self.added[indices]].tolist()} were already added")
+        table = self.table[:, (indices[:, None] * self.cols + np.arange(self.cols)).ravel()]
+        filtered = filter_sinograms(np.asarray(projections, dtype=np.float32), self.filter_name, self.threads)
+        # (angles * cols, rows), same column order as the table
+        filtered = np.ascontiguousarray(filtered.transpose(0, 2, 1)).reshape(-1, self.rows)
+        for start in range(0, self.rows, self.slice_block):
+            self.volume[:, start:start + self.slice_block] += table @ filtered[:, start:start + self.slice_block]
+        self.added[indices] = True
+
+    def complete(self):
+        return bool(self.added.all())
+
+    # (rows, region rows, region columns) like fbp.fbp, scaled for all num_projections angles
+    def result(self):
+        scale = np.float32(np.pi / (2 * self.num_projections))
+        return (self.volume.T * scale).reshape(self.rows, self.region[2], self.region[3])
+
+
+# Complete projections that are new in the folder since the last call: yields lists of (file name, image).
+# A file that cannot be read is tried again at the next poll, after read_attempts failures the stream stops.
+def watch_folder(folder_path, seen, poll=0.5, timeout=600.0, read_attempts=10):
+    import tifffile as tiff
+
+    last_arrival = time.perf_counter()
+    failures = {}
+    while True:
+        new = []
+        for name in sorted(os.listdir(folder_path)):
+            if name in seen or not FILE_NUMBER.search(name):
+                continue
+            try:
+                new.append((name, tiff.imread(os.path.join(folder_path, name))))
+            except Exception as error:
+                # still being written or corrupt
+                failures[name] = failures.get(name, 0) + 1
+                print(f"Could not read {name} (attempt {failures[name]} of {read_attempts}): {error}")
+                if failures[name] >= read_attempts:
+                    raise IOError(f"{os.path.join(folder_path, name)} could not be read in {read_attempts} attempts") from error
+                continue
+            failures.pop(name, None)
+        if new:
+            last_arrival = time.perf_counter()
+            seen.update(name for name, _ in new)
+            yield new
+        elif time.perf_counter() - last_arrival > timeout:
+            raise TimeoutError(f"No new projection in {folder_path} for {timeout} s ({len(seen)} received)")
+        else:
+            time.sleep(poll)
+
+
+# Reconstructs the folder while the projections arrive, returns the volume and the latency from the arrival
+# of the last projection to the saved slices
+def stream_reconstruction(folder_path, output_dir, num_projections, method="none", white=None, first_index=None,
+                          filter_name="ramp", threads=None, poll=0.5, timeout=600.0, region=None, pyramid=PYRAMID_LEVELS,
+                          read_attempts=10):
+    start_time = time.perf_counter()
+    stream, seen = None, set()
+    for batch in watch_folder(folder_path, seen, poll, timeout, read_attempts):
+        arrival = time.perf_counter()
+        numbers = [int(FILE_NUMBER.search(name).group(1)) for name, _ in batch]
+        if first_index is None:
+            first_index = min(numbers)
+        indices = np.array(numbers) - first_index
+        if (indices < 0).any() or (indices >= num_projections).any():
+            raise ValueError(f"File numbers {numbers} outside of {first_index} to {first_index + num_projections - 1}")
+        projections = np.stack([image for _, image in batch]).astype(np.float32)
+        if stream is None:
+            # without a given I0 the brightest pixel of the first projection (air), as the sinogram cache
+            white = float(projections[0].max()) if white is None else white
+            stream = StreamingFBP(num_projections, projections.shape[1], projections.shape[2], filter_name, threads, region=region)
+        stream.add(indices, preprocess_projections(projections, method, white))
+        print(f"{int(stream.added.sum())}/{num_projections} projections")
+        if stream.complete():
+            break
+
+    reconstruction = stream.result()
+    saved = save_reconstruction(reconstruction, output_dir)
+    if pyramid:
+        writer = PyramidWriter(output_dir, len(reconstruction), reconstruction.shape[1:], pyramid)
+        writer.add(saved)
+        writer.close()
+    latency = time.perf_counter() - arrival
+    write_run(output_dir, {
+        "algorithm": "fbp_stream",
+        "filter": filter_name,
+        "preprocess": method,
+        "precision": "float32",
+        "rows": [0, stream.rows],
+        "region": list(stream.region),
+        "geometry": {"detector_rows": stream.rows, "slice_size": stream.cols},
+        "seconds": time.perf_counter() - start_time,
+        "latency": latency,
+    })
+    return reconstruction, latency
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reconstructs a projection folder while the projections are written")
+    parser.add_argument("--input", required=True, help="folder the simulator writes the projections (.tif) to")
+    parser.add_argument("--output", default='reconstruction_output_1', help="folder for the reconstructed slices")
+    parser.add_argument("--num-projections", type=int, required=True, help="number of projections of the scan")
+    parser.add_argument("--first-index", type=int, help="number of the first projection file (default: lowest number of the first files)")
+    parser.add_argument("--preprocess", choices=PREPROCESSING, default="none", help="preprocessing of the projections")
+    parser.add_argument("--white", type=float, help="unattenuated intensity I0 of minus_log (default: maximum of the first projection)")
+    parser.add_argument("--filter", choices=FILTERS, default="ramp")
+    parser.add_argument("--threads", type=int, help="worker threads of the filter FFTs (default: all CPUs)")
+    parser.add_argument("--poll", type=float, default=0.5, help="seconds between two looks into the folder")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds without a new projection before giving up")
+    parser.add_argument("--read-attempts", type=int, default=10, help="polls a file that cannot be read is tried before giving up")
+    parser.add_argument("--pyramid", type=int, nargs="*", default=PYRAMID_LEVELS, help="factors of the downsampled levels (none: no pyramid)")
+    args = parser.parse_args(argv)
+    _, latency = stream_reconstruction(args.input, args.output, args.num_projections, args.preprocess, args.white, args.first_index,
+                                       args.filter, args.threads, args.poll, args.timeout, pyramid=args.pyramid,
+                                       read_attempts=args.read_attempts)
+    print(f"Volume saved {latency:.2f} s after the last projection ({os.path.join(args.output, RUN_NAME)})")
+
+
+if __name__ == "__main__":
+    main()
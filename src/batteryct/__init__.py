@@ -0,0 +1,14 @@
+"""
+File: __init__.py
+Description: Blender-independent core of the BatteryCT cell generation (NumPy only).
+The Blender panel (ui.py) builds on the same CellModel.
+"""
+
+from .config import (BEND_SCALE, BEND_ZONE, CARRIER_TYPES, CODE_VERSION, DEFAULT_PARAMS, PART_NAMES, PARTICLE_TYPE,
+                     PLATE_DTYPE, PLATE_TYPES, RUN_KEYS, VALIDATION_MODES, ZONE_TURN)
+from .container import read_glb, write_glb
+from .defects import DEFECT_DEFAULTS, DEFECT_INJECTORS
+from .export import MeshModeling, create_modeler, generate_parallel
+from .model import CellModel
+from .profiling import Profiler
+from .winding import WINDING_ORDER, WoundModeling
@@ -0,0 +1,52 @@
+"""
+File: __main__.py
+Description: Cell generation without Blender
+
+    python -m batteryct config.json --workers 8
+    python -m batteryct --resume <export folder>/manifest.jsonl
+"""
+
+import argparse
+import json
+import os
+
+from .config import DEFAULT_PARAMS, VALIDATION_MODES
+from .export import generate_parallel
+from .manifest import read_manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="BatteryCT cell generation without Blender")
+    parser.add_argument("config", nargs="?", help="config file of the Blender panel (Save Config)")
+    parser.add_argument("--path", help="output folder (overrides the config)")
+    parser.add_argument("--num-export", type=int, help="number of cells (overrides the config)")
+    parser.add_argument("--seed", type=int, help="random seed (overrides the config)")
+    parser.add_argument("--format", choices=["stl", "glb"], help="stl: one file per part, glb: one file per cell (overrides the config)")
+    parser.add_argument("--cell-type", choices=["stacked", "cylindrical", "prismatic_wound"], help="stacked pouch cell or wound cell (overrides the config)")
+    parser.add_argument("--validation", choices=VALIDATION_MODES, help="cells with overlapping plates are drawn again, rejected or exported anyway (overrides the config)")
+    parser.add_argument("--shards", help="dataset folder, the cells are packed into shards while they are generated")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--resume", help="manifest of an interrupted run, its missing cells are generated")
+    args = parser.parse_args(argv)
+
+    if args.resume:
+        header, _ = read_manifest(args.resume)
+        params = header["params"]
+        if args.num_export is not None:
+            params["num_export"] = args.num_export
+        generate_parallel(params, args.workers, header["current_datetime"], os.path.dirname(os.path.abspath(args.resume)))
+        return
+
+    params = dict(DEFAULT_PARAMS)
+    if args.config:
+        with open(args.config, 'r') as file:
+            params.update(json.load(file))
+    for key, value in [("path", args.path), ("num_export", args.num_export), ("seed", args.seed), ("export_format", args.format), ("cell_type", args.cell_type), ("validation", args.validation), ("shard_path", args.shards)]:
+        if value is not None:
+            params[key] = value
+
+    generate_parallel(params, args.workers)
+
+
+if __name__ == "__main__":
+    main()
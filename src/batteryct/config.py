@@ -0,0 +1,99 @@
+"""
+File: config.py
+Description: Constants, plate table layout and default configuration of the cell generation
+"""
+
+import numpy as np
+
+# Version of the generation code. It is part of the cache key, so it has to be
+# increased whenever the geometry or the export changes (old cache entries are ignored then)
+CODE_VERSION = "1.3.0"
+
+# Order of the plate types in a cell (also order of the random draws!)
+PLATE_TYPES = ["anode", "lower_anode_coating", "upper_anode_coating", "cathode", "lower_cathode_coating", "upper_cathode_coating"]
+
+# Plate type that carries the coating (position and bending are taken from it)
+CARRIER_TYPES = [0, 0, 0, 3, 3, 3]
+
+# Particles of the defect injection are additional rows of the plate table with this type
+PARTICLE_TYPE = len(PLATE_TYPES)
+
+# Exported parts of a cell (one .stl file or one mesh of the .glb file each), separators only in wound cells
+PART_NAMES = PLATE_TYPES + ["separator", "particle", "housing"]
+
+# Relative length of the bent zone at each end of a plate
+BEND_ZONE = 0.03
+
+# Scaling of the bending angles of the UI (degrees) to the angle of the bend (radians)
+BEND_SCALE = np.pi / 180 * 360 / 45
+
+# Turn of the bent zone at a plate end (degrees) per degree of bending angle: the bend spreads
+# angle * BEND_SCALE over the whole length, the zone is BEND_ZONE of it
+ZONE_TURN = BEND_SCALE * BEND_ZONE * 180 / np.pi
+
+# One row per plate of a cell, single source for geometry, labeling and export
+PLATE_DTYPE = np.dtype([
+    ("type", np.int8),          # index in PLATE_TYPES
+    ("layer", np.int16),        # number of the plate within its type (0 to amount-1)
+    ("carrier", np.int16),      # row of the anode/cathode the plate belongs to
+    ("x", np.float64),
+    ("y", np.float64),
+    ("z", np.float64),
+    ("length", np.float64),
+    ("width", np.float64),
+    ("height", np.float64),
+    ("dev_length", np.float64),
+    ("dev_width", np.float64),
+    ("dev_height", np.float64),
+    ("dev_x", np.float64),
+    ("dev_y", np.float64),
+    ("bend_pos", np.float64),   # bending angle X+ in degrees
+    ("bend_neg", np.float64),   # bending angle X- in degrees
+    ("overhang", np.float64),   # anode overhang (0 for cathodes)
+    ("visible", np.bool_),      # False if the plate was removed by a defect
+])
+
+# Handling of cells with overlapping plates: drawn again, not exported or exported anyway
+VALIDATION_MODES = ["resample", "reject", "off"]
+
+# Config keys of the run (number of cells, output folders), they do not change the files of a single cell
+RUN_KEYS = ["path", "num_export", "cache", "profile", "profile_format", "shard_path", "shard_size", "voxel_size"]
+
+# Default configuration (same keys as the config files of LoadConfig/SaveConfig)
+DEFAULT_PARAMS = {
+    "path": r"C:/",
+    "num_export": 1,
+    "overhang": True,
+    "case": True,
+    "cut_zy": True,
+    "cut_zx": True,
+    "bending": True,
+    "dev_x": 0.001,
+    "dev_y": 0.001,
+    "num_anodes": 10,
+    "size_x": 0.1015,
+    "size_y": 0.050,
+    "size_z": 0.001,
+    "min_overhang": 0.0023,
+    "max_overhang": 0.0068,
+    "separator": 0.001,
+    "max_angle": 15.0,
+    "min_angle": -15.0,
+    "seed": -1,
+    "cache": True,
+    "defect_probability": 0.0,
+    "bend_tolerance": 0.00001,
+    "profile": False,
+    "profile_format": "chrome",  # "chrome" (chrome://tracing, Perfetto) or "csv"
+    "export_format": "stl",  # "stl" (one file per part + labeling.json) or "glb" (one file per cell)
+    "shard_path": "",  # folder of the dataset shards, written while the cells are generated ("" = off)
+    "shard_size": 1024,  # MB per shard
+    "voxel_size": 0.0,  # edge length (m) of the voxel volumes in the shards (0 = no volumes)
+    "validation": "resample",  # cells with overlapping plates: "resample", "reject" (not exported) or "off"
+    "max_attempts": 10,  # draws per cell with "resample", the cell is rejected if all of them are invalid
+    "cell_type": "stacked",  # "stacked" (pouch), "cylindrical" or "prismatic_wound" (jelly roll, only without Blender)
+    "winding_turns": 10,
+    "core_radius": 0.002,  # radius of the winding mandrel
+    "flat_length": 0.02,  # length of the flat sides of a prismatic winding
+    "winding_gap": 0.00002,  # standard deviation of the additional radial gap of every turn
+}
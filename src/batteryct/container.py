@@ -0,0 +1,105 @@
+"""
+File: container.py
+Description: One file per cell: binary glTF (GLB) with a named mesh per part and the labels as scene extras
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from .mesh import STL_DTYPE
+
+GLB_MAGIC = 0x46546C67
+CHUNK_JSON = 0x4E4F534A
+CHUNK_BIN = 0x004E4942
+
+# glTF is y-up, the cells are z-up: the root node rotates by -90 degrees around x
+Z_UP_TO_Y_UP = [-np.sqrt(0.5), 0.0, 0.0, np.sqrt(0.5)]
+
+
+def read_stl(file_path):
+    with open(file_path, 'rb') as file:
+        file.seek(80)
+        count = struct.unpack("<I", file.read(4))[0]
+        records = np.frombuffer(file.read(count * STL_DTYPE.itemsize), dtype=STL_DTYPE, count=count)
+    # STL stores every triangle with its own corners, shared vertices are merged again
+    vertices, faces = np.unique(records["vertices"].reshape(-1, 3), axis=0, return_inverse=True)
+    return vertices, faces.reshape(-1, 3)
+
+
+def pad4(data, fill):
+    return data + fill * (-len(data) % 4)
+
+
+# meshes: {part name: (vertices, faces)}, labels: labeling data of the cell
+def write_glb(file_path, meshes, labels):
+    gltf = {
+        "asset": {"version": "2.0", "generator": "BatteryCT"},
+        "scene": 0,
+        "scenes": [{"nodes": [0], "extras": labels}],
+        "nodes": [{"name": "cell", "rotation": Z_UP_TO_Y_UP, "children": []}],
+        "meshes": [],
+        "accessors": [],
+        "bufferViews": [],
+        "buffers": [],
+    }
+    blob = bytearray()
+
+    def add_view(data, target):
+        gltf["bufferViews"].append({"buffer": 0, "byteOffset": len(blob), "byteLength": len(data), "target": target})
+        blob.extend(pad4(data, b"\0"))
+        return len(gltf["bufferViews"]) - 1
+
+    for name, (vertices, faces) in meshes.items():
+        if len(faces) == 0:
+            continue
+        positions = np.ascontiguousarray(vertices, dtype="<f4")
+        indices = np.ascontiguousarray(faces, dtype="<u4")
+        gltf["accessors"].append({
+            "bufferView": add_view(positions.tobytes(), 34962), "componentType": 5126, "count": len(positions), "type": "VEC3",
+            "min": positions.min(axis=0).tolist(), "max": positions.max(axis=0).tolist(),
+        })
+        gltf["accessors"].append({
+            "bufferView": add_view(indices.tobytes(), 34963), "componentType": 5125, "count": indices.size, "type": "SCALAR",
+        })
+        n = len(gltf["accessors"])
+        gltf["meshes"].append({"name": name, "primitives": [{"attributes": {"POSITION": n - 2}, "indices": n - 1, "mode": 4}]})
+        gltf["nodes"].append({"name": name, "mesh": len(gltf["meshes"]) - 1})
+        gltf["nodes"][0]["children"].append(len(gltf["nodes"]) - 1)
+    gltf["buffers"].append({"byteLength": len(blob)})
+
+    json_chunk = pad4(json.dumps(gltf, separators=(",", ":")).encode("utf-8"), b" ")
+    length = 12 + 8 + len(json_chunk) + 8 + len(blob)
+    with open(file_path, 'wb') as file:
+        file.write(struct.pack("<III", GLB_MAGIC, 2, length))
+        file.write(struct.pack("<II", len(json_chunk), CHUNK_JSON))
+        file.write(json_chunk)
+        file.write(struct.pack("<II", len(blob), CHUNK_BIN))
+        file.write(blob)
+
+
+# Returns the meshes {part name: (vertices, faces)} and the labels of a cell file written by write_glb
+def read_glb(file_path):
+    with open(file_path, 'rb') as file:
+        content = file.read()
+    magic, version, length = struct.unpack_from("<III", content, 0)
+    if magic != GLB_MAGIC:
+        raise ValueError(f"{file_path} is not a GLB file")
+    json_length, _ = struct.unpack_from("<II", content, 12)
+    gltf = json.loads(content[20:20 + json_length])
+    blob_start = 20 + json_length + 8
+
+    def accessor(index, dtype, width):
+        acc = gltf["accessors"][index]
+        view = gltf["bufferViews"][acc["bufferView"]]
+        start = blob_start + view["byteOffset"]
+        return np.frombuffer(content, dtype=dtype, count=acc["count"] * width, offset=start).reshape(-1, width)
+
+    meshes = {}
+    for mesh in gltf["meshes"]:
+        primitive = mesh["primitives"][0]
+        vertices = accessor(primitive["attributes"]["POSITION"], "<f4", 3)
+        faces = accessor(primitive["indices"], "<u4", 1).reshape(-1, 3)
+        meshes[mesh["name"]] = (vertices, faces)
+    return meshes, gltf["scenes"][0].get("extras", {})
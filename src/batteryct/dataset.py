@@ -0,0 +1,238 @@
+"""
+File: dataset.py
+Description: Packs generated cells into tar shards (WebDataset layout) with an index for training
+
+Every sample of a shard consists of the members <key>.<name>, with the key <cell>_<time>:
+    labels.json     labeling data of the cell
+    labels.npz      the labels as arrays (e.g. anode.position (n, 3), anode.bending (n, 2))
+    <part>.stl / glb    the meshes as exported
+    voxels.npy      optional material volume (uint8, see MATERIALS)
+    recon.npy       optional reconstruction (float32 slices)
+
+index.json lists the shards and the byte offset and size of every member, so that a single
+sample can also be read without unpacking the shard.
+
+    python -m batteryct.dataset <export folder> --out <dataset folder> --voxel-size 0.0005
+"""
+
+import argparse
+import io
+import json
+import os
+import tarfile
+
+import numpy as np
+
+from .container import read_glb
+from .manifest import MANIFEST_NAME, read_manifest
+
+INDEX_NAME = "index.json"
+
+# Material numbers of the voxel volumes
+MATERIALS = {"air": 0, "housing": 1, "anode": 2, "anode_coating": 3, "cathode": 4, "cathode_coating": 5, "particle": 6, "separator": 7}
+
+
+# Labels of a cell as arrays, one entry per part and quantity
+def labels_to_arrays(data):
+    arrays = {}
+    for name, part in data.items():
+        if not isinstance(part, dict) or name == "random":
+            continue
+        for quantity, values in part.items():
+            key = f"{name}.{quantity[len(name)+1:] if quantity.startswith(name + '_') else quantity}"
+            if isinstance(values, dict):
+                arrays[key] = np.array(list(values.values()), dtype=np.float64).T
+            else:
+                arrays[key] = np.array(values, dtype=np.float64)
+    return arrays
+
+
+# Material volume of a stacked cell from its labels (plates as boxes, the bending is not rasterised)
+def voxelize(data, voxel_size):
+    housing = data["housing"]["housing_dimensions"]
+    outer = np.array([housing["outer_length"][0], housing["outer_width"][0], housing["outer_height"][0]])
+    inner = np.array([housing["inner_length"][0], housing["inner_width"][0], housing["inner_height"][0]])
+    origin = np.array([-outer[0]/2.0, -outer[1]/2.0, 0.0])
+    shape = np.ceil(outer / voxel_size).astype(int)
+    volume = np.zeros(shape, dtype=np.uint8)
+
+    def fill(center, size, material):
+        lower = np.clip(np.round((np.asarray(center) - np.asarray(size)/2.0 - origin) / voxel_size).astype(int), 0, shape)
+        upper = np.clip(np.round((np.asarray(center) + np.asarray(size)/2.0 - origin) / voxel_size).astype(int), 0, shape)
+        volume[lower[0]:upper[0], lower[1]:upper[1], lower[2]:upper[2]] = material
+
+    fill((0, 0, outer[2]/2.0), outer, MATERIALS["housing"])
+    fill((0, 0, outer[2]/2.0), inner, MATERIALS["air"])
+    for name, material in [("anode", "anode"), ("lower_anode_coating", "anode_coating"), ("upper_anode_coating", "anode_coating"),
+                           ("cathode", "cathode"), ("lower_cathode_coating", "cathode_coating"), ("upper_cathode_coating", "cathode_coating")]:
+        position = data[name][f"{name}_position"]
+        dimensions = data[name][f"{name}_dimensions"]
+        for n in range(len(position["x"])):
+            fill((position["x"][n], position["y"][n], position["z"][n]),
+                 (dimensions["length"][n], dimensions["width"][n], dimensions["height"][n]), MATERIALS[material])
+    for defect in data.get("defects", []):
+        if defect["type"] == "particle_inclusion":
+            for x, y, z, size in zip(defect["position"]["x"], defect["position"]["y"], defect["position"]["z"], defect["size"]):
+                fill((x, y, z), (size, size, size), MATERIALS["particle"])
+    return volume
+
+
+def npy_bytes(array):
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def npz_bytes(arrays):
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+# Reconstructed slices of a cell: <folder>/<cell>.npy or <folder>/<cell>/slice_*.tiff (save_reconstruction)
+def read_reconstruction(folder, j):
+    npy_path = os.path.join(folder, f"{j+1}.npy")
+    if os.path.exists(npy_path):
+        return np.load(npy_path)
+    slice_folder = os.path.join(folder, str(j+1))
+    if os.path.isdir(slice_folder):
+        import tifffile as tiff
+        files = sorted(f for f in os.listdir(slice_folder) if f.endswith((".tif", ".tiff")))
+        volume = np.stack([tiff.imread(os.path.join(slice_folder, f)) for f in files]).astype(np.float32)
+        # uint16 slices of a reduced precision reconstruction: value = offset + q * step
+        scale_path = os.path.join(slice_folder, "scale.json")
+        if os.path.exists(scale_path):
+            with open(scale_path, 'r') as file:
+                scale = json.load(file)
+            volume = scale["offset"] + volume * scale["step"]
+        return volume
+    return None
+
+
+# Members of the sample of cell j from its files in the export folder
+def cell_sample(export_path, file_names, j, voxel_size=0.0, reconstructions=None):
+    members = {}
+    data = None
+    for file_name in sorted(file_names):
+        # <cell>_<date>_<time>_<name>
+        name = file_name.split("_", 3)[3]
+        file_path = os.path.join(export_path, file_name)
+        with open(file_path, 'rb') as file:
+            content = file.read()
+        if name == "labeling.json":
+            data = json.loads(content)
+            name = "labels.json"
+        elif name == "cell.glb":
+            data = read_glb(file_path)[1]
+            name = "glb"
+        members[name] = content
+    if data is not None:
+        members.setdefault("labels.json", json.dumps(data).encode("utf-8"))
+        members["labels.npz"] = npz_bytes(labels_to_arrays(data))
+        # wound cells (labels per turn) are not voxelized
+        if voxel_size > 0 and "winding" not in data:
+            members["voxels.npy"] = npy_bytes(voxelize(data, voxel_size))
+    if reconstructions:
+        reconstruction = read_reconstruction(reconstructions, j)
+        if reconstruction is not None:
+            members["recon.npy"] = npy_bytes(reconstruction.astype(np.float32))
+    return members
+
+
+class ShardWriter:
+    # Writes samples into shard_000000.tar, shard_000001.tar, ... A shard is written as .tmp and renamed
+    # when it is full, then the index is replaced. After an interruption the finished shards stay valid,
+    # the samples of the unfinished shard are packed again (they are not in the index).
+
+    def __init__(self, path, max_bytes=1 << 30, max_samples=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_samples = max_samples
+        os.makedirs(path, exist_ok=True)
+        self.index = {"shards": []}
+        if os.path.exists(os.path.join(path, INDEX_NAME)):
+            with open(os.path.join(path, INDEX_NAME), 'r') as file:
+                self.index = json.load(file)
+        self.keys = {key for shard in self.index["shards"] for key in shard["members"]}
+        self.tar = None
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def open_shard(self):
+        self.shard = {"file": f"shard_{len(self.index['shards']):06d}.tar", "samples": 0, "bytes": 0, "members": {}}
+        self.tmp_path = os.path.join(self.path, self.shard["file"] + ".tmp")
+        self.tar = tarfile.open(self.tmp_path, 'w')
+
+    def add(self, key, members):
+        if self.tar is None:
+            self.open_shard()
+        self.shard["members"][key] = {}
+        for name, content in members.items():
+            info = tarfile.TarInfo(f"{key}.{name}")
+            info.size = len(content)
+            self.tar.addfile(info, io.BytesIO(content))
+            # the data ends at the current offset of the archive, padded to full blocks
+            offset = self.tar.offset - -(-info.size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+            self.shard["members"][key][name] = [offset, info.size]
+            self.shard["bytes"] += info.size
+        self.shard["samples"] += 1
+        self.keys.add(key)
+        if self.shard["bytes"] >= self.max_bytes or (self.max_samples and self.shard["samples"] >= self.max_samples):
+            self.close_shard()
+
+    def close_shard(self):
+        if self.tar is None:
+            return
+        self.tar.close()
+        self.tar = None
+        os.replace(self.tmp_path, os.path.join(self.path, self.shard["file"]))
+        self.index["shards"].append(self.shard)
+        tmp_index = os.path.join(self.path, INDEX_NAME + ".tmp")
+        with open(tmp_index, 'w') as file:
+            json.dump(self.index, file)
+        os.replace(tmp_index, os.path.join(self.path, INDEX_NAME))
+
+    def close(self):
+        self.close_shard()
+
+
+# Reads one member (e.g. "labels.npz") of a sample with the index, without unpacking the shard
+def read_member(path, key, name):
+    with open(os.path.join(path, INDEX_NAME), 'r') as file:
+        index = json.load(file)
+    for shard in index["shards"]:
+        if key in shard["members"]:
+            offset, size = shard["members"][key][name]
+            with open(os.path.join(path, shard["file"]), 'rb') as file:
+                file.seek(offset)
+                return file.read(size)
+    raise KeyError(key)
+
+
+# Packs the finished cells of an export folder (from its manifest) into shards
+def pack_dataset(export_path, out, shard_size=1 << 30, voxel_size=0.0, reconstructions=None):
+    header, cells = read_manifest(os.path.join(export_path, MANIFEST_NAME))
+    writer = ShardWriter(out, shard_size)
+    for j in sorted(cells):
+        key = f"{j+1}_{header['current_datetime']}"
+        if key not in writer and not cells[j].get("rejected"):
+            writer.add(key, cell_sample(export_path, cells[j]["files"], j, voxel_size, reconstructions))
+    writer.close()
+    return writer.index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Packs generated cells into tar shards with an index")
+    parser.add_argument("export_path", help="export folder with manifest.jsonl")
+    parser.add_argument("--out", required=True, help="dataset folder (shards and index.json)")
+    parser.add_argument("--shard-size", type=float, default=1024, help="shard size in MB")
+    parser.add_argument("--voxel-size", type=float, default=0.0, help="edge length of the voxels in m (0: no volumes)")
+    parser.add_argument("--reconstructions", help="folder with the reconstructions (<cell>.npy or <cell>/slice_*.tiff)")
+    args = parser.parse_args(argv)
+    index = pack_dataset(args.export_path, args.out, int(args.shard_size * 1e6), args.voxel_size, args.reconstructions)
+    print(f"{sum(s['samples'] for s in index['shards'])} cells in {len(index['shards'])} shards: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
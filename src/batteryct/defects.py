@@ -0,0 +1,101 @@
+"""
+File: defects.py
+Description: Production defects that are injected into the plate table of a cell
+"""
+
+import numpy as np
+
+from .config import PLATE_DTYPE, PLATE_TYPES, PARTICLE_TYPE, ZONE_TURN
+
+
+# Parameters of the defects, "probability" is the chance that a cell contains the defect.
+# Single defects can be overwritten with the "defects" entry of a config file.
+DEFECT_DEFAULTS = {
+    "missing_electrode": {"probability": 0.0},
+    # turn of the folded end (degrees), the fold lies in the bent zone at one end of the plate
+    "folded_electrode": {"probability": 0.0, "min_fold": 160.0, "max_fold": 180.0},
+    "particle_inclusion": {"probability": 0.0, "max_count": 3, "min_size": 0.0002, "max_size": 0.0008},
+    "separator_wrinkle": {"probability": 0.0, "min_amplitude": 0.0001, "max_amplitude": 0.0005},
+    "delamination": {"probability": 0.0, "min_gap": 0.0001, "max_gap": 0.0005},
+    "tab_misalignment": {"probability": 0.0, "min_offset": 0.002, "max_offset": 0.005},
+}
+
+# Random anode (type 0) or cathode (type 3) row that is still part of the cell
+def choose_carrier(plates, rng, types=(0, 3)):
+    rows = np.flatnonzero(np.isin(plates["type"], types) & plates["visible"])
+    return int(rng.choice(rows))
+
+# Every injector gets the plate table of one cell, the random generator of the cell and the
+# defect parameters. It returns the changed plate table and the label entry of the defect.
+def inject_missing_electrode(modeling, plates, rng, params):
+    carrier = choose_carrier(plates, rng)
+    plates["visible"][plates["carrier"] == carrier] = False
+    return plates, {"plate": PLATE_TYPES[plates["type"][carrier]], "layer": int(plates["layer"][carrier])}
+
+def inject_folded_electrode(modeling, plates, rng, params):
+    # The end zone is folded by fold degrees: bending angle of the plate table that turns the zone that far
+    carrier = choose_carrier(plates, rng)
+    fold = rng.uniform(params["min_fold"], params["max_fold"]) * rng.choice([-1, 1])
+    angle = fold / ZONE_TURN
+    side = "x+" if rng.random() < 0.5 else "x-"
+    plates["bend_pos" if side == "x+" else "bend_neg"][plates["carrier"] == carrier] = angle
+    return plates, {"plate": PLATE_TYPES[plates["type"][carrier]], "layer": int(plates["layer"][carrier]), "side": side, "fold": fold, "angle": angle}
+
+def inject_particle_inclusion(modeling, plates, rng, params):
+    # Particles lie in the separator gap above an anode
+    count = int(rng.integers(1, params["max_count"] + 1))
+    carriers = [choose_carrier(plates, rng, types=(0,)) for _ in range(count)]
+    particles = np.zeros(count, dtype=PLATE_DTYPE)
+    particles["type"] = PARTICLE_TYPE
+    particles["layer"] = np.arange(count)
+    particles["carrier"] = len(plates) + np.arange(count)
+    particles["visible"] = True
+    size = rng.uniform(params["min_size"], params["max_size"], size=count)
+    particles["length"] = particles["width"] = particles["height"] = size
+    for n, carrier in enumerate(carriers):
+        coating = plates[(plates["carrier"] == carrier) & (plates["type"] == 2)][0]
+        particles["x"][n] = coating["x"] + rng.uniform(-0.5, 0.5) * coating["length"]
+        particles["y"][n] = coating["y"] + rng.uniform(-0.5, 0.5) * coating["width"]
+        particles["z"][n] = coating["z"] + (coating["height"] + modeling.seperator_height) / 2.0
+    label = {
+        "layer": [int(plates["layer"][c]) for c in carriers],
+        "position": {"x": particles["x"].tolist(), "y": particles["y"].tolist(), "z": particles["z"].tolist()},
+        "size": size.tolist()
+    }
+    return np.concatenate([plates, particles]), label
+
+def inject_separator_wrinkle(modeling, plates, rng, params):
+    # A wrinkled separator lifts everything above it
+    carrier = choose_carrier(plates, rng)
+    top = plates[plates["carrier"] == carrier]["z"].max()
+    amplitude = rng.uniform(params["min_amplitude"], params["max_amplitude"])
+    plates["z"][plates["z"] > top] += amplitude
+    return plates, {"above": PLATE_TYPES[plates["type"][carrier]], "layer": int(plates["layer"][carrier]), "amplitude": amplitude}
+
+def inject_delamination(modeling, plates, rng, params):
+    # Coating detaches from its current collector
+    carrier = choose_carrier(plates, rng)
+    rows = np.flatnonzero((plates["carrier"] == carrier) & (plates["type"] != plates["type"][carrier]))
+    row = int(rng.choice(rows))
+    gap = rng.uniform(params["min_gap"], params["max_gap"])
+    plates["z"][row] += gap if plates["z"][row] > plates["z"][carrier] else -gap
+    return plates, {"plate": PLATE_TYPES[plates["type"][row]], "layer": int(plates["layer"][row]), "gap": gap}
+
+def inject_tab_misalignment(modeling, plates, rng, params):
+    # Tabs are not modeled, the whole electrode with its coatings is shifted
+    carrier = choose_carrier(plates, rng)
+    offset = rng.uniform(params["min_offset"], params["max_offset"])
+    direction = rng.uniform(0, 2*np.pi)
+    rows = plates["carrier"] == carrier
+    plates["x"][rows] += offset * np.cos(direction)
+    plates["y"][rows] += offset * np.sin(direction)
+    return plates, {"plate": PLATE_TYPES[plates["type"][carrier]], "layer": int(plates["layer"][carrier]), "offset": {"x": offset * np.cos(direction), "y": offset * np.sin(direction)}}
+
+DEFECT_INJECTORS = {
+    "missing_electrode": inject_missing_electrode,
+    "folded_electrode": inject_folded_electrode,
+    "particle_inclusion": inject_particle_inclusion,
+    "separator_wrinkle": inject_separator_wrinkle,
+    "delamination": inject_delamination,
+    "tab_misalignment": inject_tab_misalignment,
+}
@@ -0,0 +1,122 @@
+"""
+File: export.py
+Description: Cell generation without Blender (NumPy meshes, binary STL), also with worker processes
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from .config import DEFAULT_PARAMS, PLATE_TYPES
+from .mesh import housing_mesh, merge_meshes, plate_mesh, write_stl
+from .model import CellModel
+
+
+class MeshModeling(CellModel):
+    # Same cells, labels and file names as the Blender panel. The housing has no bevel
+    # and the cuts of the housing (only a visualisation in Blender) are not applied.
+
+    def build_cell(self, j):
+        for name in PLATE_TYPES + ["particle"]:
+            self.create_and_export_inner_battery(j, name)
+        self.create_and_export_housing(j)
+
+    def create_and_export_inner_battery(self, j, name):
+        plates = self.plates[(self.plates["type"] == (PLATE_TYPES + ["particle"]).index(name)) & self.plates["visible"]]
+        if len(plates) == 0 or not self.export_inner_battery_bool:
+            return
+        with self.profiler.stage("plate_creation", cell=j, plate=name) as info:
+            meshes = []
+            for plate in plates:
+                segments_xpos = segments_xneg = 0
+                # without bending the table has no angles except the end of a folded electrode
+                if plate["bend_pos"] != 0 or plate["bend_neg"] != 0:
+                    segments_xpos = self.bend_segments(float(plate["bend_pos"]), float(plate["length"]))
+                    segments_xneg = self.bend_segments(float(plate["bend_neg"]), float(plate["length"]))
+                meshes.append(plate_mesh(plate, float(self.plates["z"][plate["carrier"]]), segments_xpos, segments_xneg))
+            vertices, faces = merge_meshes(meshes)
+            info["objects"] = len(plates)
+            info["vertices"] = len(vertices)
+
+        self.export_part(j, name, vertices, faces)
+
+    def create_and_export_housing(self, j):
+        if not self.export_housing_bool:
+            return
+        vertices, faces = housing_mesh(self.housing_geometry)
+        self.export_part(j, "housing", vertices, faces)
+
+    # The meshes of a .glb cell file are written together by write_container
+    def export_part(self, j, name, vertices, faces):
+        if self.export_format == "glb":
+            self.meshes[name] = (vertices, faces)
+            return
+        with self.profiler.stage("stl_export", cell=j, plate=name):
+            write_stl(os.path.join(self.export_path, f"{j+1}_{self.current_datetime}_{name}.stl"), vertices, faces)
+
+
+# NumPy backend for the cell type of a config
+def create_modeler(params):
+    if params.get("cell_type", DEFAULT_PARAMS["cell_type"]) == "stacked":
+        return MeshModeling()
+    # winding.py builds on MeshModeling, so it is imported here
+    from .winding import WoundModeling
+    return WoundModeling()
+
+
+# Modeler of a worker process, created once per process by init_worker
+worker_modeler = None
+
+
+def init_worker(params, current_datetime, export_path):
+    global worker_modeler
+    worker_modeler = create_modeler(params)
+    worker_modeler.update_parameters_from_ui(params)
+    worker_modeler.set_run(current_datetime, export_path)
+
+
+# Generates cell j in a worker process and returns its manifest record and the profiling events
+def generate_cell_worker(j):
+    with worker_modeler.profiler.stage("cell", cell=j):
+        worker_modeler.generate_cell(j)
+    events = worker_modeler.profiler.events
+    worker_modeler.profiler.events = []
+    return worker_modeler.cell_record(j), events
+
+
+# Generates the cells of a config with several processes. Every cell has its own random stream
+# (seed + cell number), so the result does not depend on the number of workers. Only this process
+# writes the manifest, cells that are already in it (e.g. of an interrupted run) are skipped.
+def generate_parallel(params, workers=None, current_datetime=None, export_path=None):
+    modeler = create_modeler(params)
+    modeler.update_parameters_from_ui(params)
+    if current_datetime is not None:
+        modeler.set_run(current_datetime, export_path)
+    workers = workers or os.cpu_count() or 1
+    # the seed is drawn once here, so that all workers use the same one
+    params = dict(params, seed=int(modeler.seed))
+
+    manifest = modeler.open_manifest()
+    modeler.open_shards()
+    cells = []
+    for j in range(modeler.iterations):
+        if manifest.is_complete(j):
+            modeler.add_to_shards(j)
+        else:
+            cells.append(j)
+    print(f"{modeler.iterations - len(cells)} of {modeler.iterations} cells already generated")
+
+    if cells:
+        with ProcessPoolExecutor(max_workers=min(workers, len(cells)), initializer=init_worker,
+                                 initargs=(params, modeler.current_datetime, modeler.export_path)) as executor:
+            futures = [executor.submit(generate_cell_worker, j) for j in cells]
+            for future in as_completed(futures):
+                record, events = future.result()
+                manifest.add(record)
+                modeler.add_to_shards(record["cell"])
+                modeler.profiler.events += events
+    modeler.close_shards()
+
+    modeler.write_profile()
+    # only here, the workers do not print the export path of every cell
+    print("Export done to: " + str(modeler.export_path))
+    return modeler
@@ -0,0 +1,116 @@
+"""
+File: manifest.py
+Description: Checkpoint of a generation run (config, seed and the finished cells with their files)
+"""
+
+import hashlib
+import json
+import os
+
+from .config import CODE_VERSION
+
+MANIFEST_NAME = "manifest.jsonl"
+
+
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Record of a finished cell: size and hash of every file, so that a restart can verify them
+def cell_record(j, export_path, file_names):
+    files = {}
+    for name in sorted(file_names):
+        file_path = os.path.join(export_path, name)
+        files[name] = {"size": os.path.getsize(file_path), "sha256": file_digest(file_path)}
+    return {"cell": j, "files": files}
+
+
+class Manifest:
+    # JSON Lines file in the export folder: the first line describes the run, every further line is
+    # one finished cell. A record is appended (and synced) after the cell is complete, so the file is
+    # valid at every moment, a torn last line of an interrupted write is ignored when it is read.
+
+    def __init__(self, file_path, header):
+        self.file_path = file_path
+        self.cells = {}
+        self.verified = set()
+        if os.path.exists(file_path):
+            truncate_torn_line(file_path)
+            self.header, self.cells = read_manifest(file_path)
+            for key in ("code_version", "seed", "config_hash"):
+                if self.header.get(key) != header[key]:
+                    raise ValueError(f"{file_path} belongs to a different run ({key} differs), use another export folder")
+        else:
+            self.header = header
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            # header is written to a temporary file and renamed, so that a manifest always has one
+            tmp_path = file_path + ".tmp"
+            with open(tmp_path, 'w') as file:
+                file.write(json.dumps(header) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, file_path)
+
+    # True if cell j is recorded and all its files still exist unchanged
+    def is_complete(self, j):
+        if j in self.verified:
+            return True
+        record = self.cells.get(j)
+        if record is None:
+            return False
+        export_path = os.path.dirname(self.file_path)
+        for name, info in record["files"].items():
+            file_path = os.path.join(export_path, name)
+            if not os.path.exists(file_path) or os.path.getsize(file_path) != info["size"] or file_digest(file_path) != info["sha256"]:
+                print(f"Cell {j+1}: {name} is missing or changed, the cell is generated again")
+                return False
+        self.verified.add(j)
+        return True
+
+    def add(self, record):
+        with open(self.file_path, 'a') as file:
+            file.write(json.dumps(record) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self.cells[record["cell"]] = record
+        self.verified.add(record["cell"])
+
+
+# Removes the rest of a record that was not completely written, so that the next record starts on a new line
+def truncate_torn_line(file_path):
+    with open(file_path, 'rb+') as file:
+        content = file.read()
+        end = content.rfind(b"\n") + 1
+        if end < len(content):
+            file.truncate(end)
+
+
+def read_manifest(file_path):
+    cells = {}
+    with open(file_path, 'r') as file:
+        header = json.loads(file.readline())
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # torn last line of an interrupted write
+                continue
+            cells[record["cell"]] = record
+    return header, cells
+
+
+def manifest_header(modeler):
+    return {
+        "manifest_version": 1,
+        "code_version": CODE_VERSION,
+        "seed": int(modeler.seed),
+        "config_hash": hashlib.sha256(modeler.canonical_config().encode("utf-8")).hexdigest(),
+        "current_datetime": modeler.current_datetime,
+        "params": dict(modeler.params, seed=int(modeler.seed)),
+        # wound cells label deviations per turn (radial_gap, axial_offset) instead of per plate
+        "label_schema": {"cell_type": modeler.cell_type, "deviations": list(modeler.deviation_keys)},
+    }
@@ -0,0 +1,142 @@
+"""
+File: mesh.py
+Description: Triangle meshes of the plates and the housing with NumPy, binary STL export
+"""
+
+import numpy as np
+
+from .config import BEND_SCALE, BEND_ZONE
+
+# Binary STL: 80 byte header, number of triangles, then one record per triangle
+STL_DTYPE = np.dtype([
+    ("normal", "<f4", (3,)),
+    ("vertices", "<f4", (3, 3)),
+    ("attribute", "<u2"),
+])
+
+
+# Box along x with cross sections at the relative positions stations (0 to 1).
+# Returns the vertices (n, 3) and the triangles (m, 3) with outward normals.
+def box_mesh(center, size, stations=(0.0, 1.0)):
+    stations = np.asarray(stations, dtype=np.float64)
+    n = len(stations)
+    # cross section: (y, z) corners counter-clockwise seen from x+
+    corners = np.array([[-0.5, -0.5], [0.5, -0.5], [0.5, 0.5], [-0.5, 0.5]])
+    vertices = np.empty((n, 4, 3))
+    vertices[:, :, 0] = (stations[:, None] - 0.5) * size[0]
+    vertices[:, :, 1] = corners[None, :, 0] * size[1]
+    vertices[:, :, 2] = corners[None, :, 1] * size[2]
+    vertices = vertices.reshape(-1, 3) + np.asarray(center, dtype=np.float64)
+
+    # side faces between two neighbouring cross sections
+    k = np.arange(4)
+    s = np.arange(n - 1)[:, None] * 4
+    a, b = s + k, s + (k + 1) % 4
+    c, d = b + 4, a + 4
+    sides = np.concatenate([np.stack([a, b, c], axis=-1), np.stack([a, c, d], axis=-1)], axis=1).reshape(-1, 3)
+    # end caps
+    first = np.array([[0, 2, 1], [0, 3, 2]])
+    last = np.array([[0, 1, 2], [0, 2, 3]]) + 4 * (n - 1)
+    return vertices, np.concatenate([first, sides, last])
+
+
+# Same deformation as the SimpleDeform BEND modifier of Blender: the angle is spread over
+# the whole length, the vertices of the zone are bent around an axis parallel to y at (x0, z0)
+def bend_vertices(vertices, angle, length, x0, z0, zone):
+    theta = angle * BEND_SCALE
+    if theta == 0:
+        return vertices
+    curvature = theta / length
+    radius = 1.0 / curvature
+    phi = (vertices[zone, 0] - x0) * curvature
+    h = vertices[zone, 2] - z0
+    vertices[zone, 0] = x0 + (radius - h) * np.sin(phi)
+    vertices[zone, 2] = z0 + radius - (radius - h) * np.cos(phi)
+    return vertices
+
+
+# Mesh of one row of the plate table, bent around the mid plane of its anode/cathode (carrier_z)
+def plate_mesh(plate, carrier_z, segments_xpos=0, segments_xneg=0):
+    length = float(plate["length"])
+    stations = np.unique(np.concatenate([
+        [0.0, 1.0],
+        np.linspace(0, BEND_ZONE, segments_xneg + 1) if segments_xneg else [],
+        np.linspace(1 - BEND_ZONE, 1, segments_xpos + 1) if segments_xpos else [],
+    ]))
+    center = (float(plate["x"]), float(plate["y"]), float(plate["z"]))
+    vertices, faces = box_mesh(center, (length, float(plate["width"]), float(plate["height"])), stations)
+
+    if segments_xpos or segments_xneg:
+        relative_x = (vertices[:, 0] - center[0]) / length + 0.5
+        x_pos = center[0] + (0.5 - BEND_ZONE) * length
+        x_neg = center[0] - (0.5 - BEND_ZONE) * length
+        tol = 1e-9
+        bend_vertices(vertices, float(plate["bend_pos"]), length, x_pos, carrier_z, relative_x >= 1 - BEND_ZONE - tol)
+        bend_vertices(vertices, float(plate["bend_neg"]), length, x_neg, carrier_z, relative_x <= BEND_ZONE + tol)
+    return vertices, faces
+
+
+# Housing as a closed shell: outer box and inner box with inverted normals (without bevel)
+def housing_mesh(housing_geometry):
+    outer_height = housing_geometry["more_geometry"]["outer_height"]
+    wall = housing_geometry["wall_thickness"]
+    center = (0.0, 0.0, outer_height/2.0)
+    outer_vertices, outer_faces = box_mesh(center, (housing_geometry["outer_length"], housing_geometry["outer_width"], outer_height))
+    inner_vertices, inner_faces = box_mesh(center, (housing_geometry["outer_length"] - wall, housing_geometry["outer_width"] - wall, outer_height - wall))
+    return merge_meshes([(outer_vertices, outer_faces), (inner_vertices, inner_faces[:, ::-1])])
+
+
+# Closed cylinder around the z axis (polygon with segments corners), outward normals
+def cylinder_mesh(radius, height, center_z, segments):
+    angles = 2 * np.pi * np.arange(segments) / segments
+    ring = np.stack([radius * np.cos(angles), radius * np.sin(angles)], axis=-1)
+    vertices = np.concatenate([
+        np.column_stack([ring, np.full(segments, center_z - height/2.0)]),
+        np.column_stack([ring, np.full(segments, center_z + height/2.0)]),
+        [[0.0, 0.0, center_z - height/2.0], [0.0, 0.0, center_z + height/2.0]],
+    ])
+    a = np.arange(segments)
+    b = (a + 1) % segments
+    bottom, top = np.full(segments, 2 * segments), np.full(segments, 2 * segments + 1)
+    faces = np.concatenate([
+        np.stack([a, b, b + segments], axis=-1),
+        np.stack([a, b + segments, a + segments], axis=-1),
+        np.stack([bottom, b, a], axis=-1),
+        np.stack([top, a + segments, b + segments], axis=-1),
+    ])
+    return vertices, faces
+
+
+# Can of a cylindrical cell: outer and inner cylinder (inverted normals), outer_length is the diameter
+def can_mesh(housing_geometry, segments):
+    outer_height = housing_geometry["more_geometry"]["outer_height"]
+    wall = housing_geometry["wall_thickness"]
+    outer = cylinder_mesh(housing_geometry["outer_length"]/2.0, outer_height, outer_height/2.0, segments)
+    inner_vertices, inner_faces = cylinder_mesh((housing_geometry["outer_length"] - wall)/2.0, outer_height - wall, outer_height/2.0, segments)
+    return merge_meshes([outer, (inner_vertices, inner_faces[:, ::-1])])
+
+
+def merge_meshes(meshes):
+    vertices, faces, offset = [], [], 0
+    for v, f in meshes:
+        vertices.append(v)
+        faces.append(f + offset)
+        offset += len(v)
+    if not vertices:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    return np.concatenate(vertices), np.concatenate(faces)
+
+
+def write_stl(file_path, vertices, faces, header=b"BatteryCT"):
+    triangles = vertices[faces]
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    norm = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = np.divide(normals, norm, out=np.zeros_like(normals), where=norm > 0)
+
+    records = np.zeros(len(faces), dtype=STL_DTYPE)
+    records["normal"] = normals
+    records["vertices"] = triangles
+    with open(file_path, 'wb') as file:
+        file.write(header[:80].ljust(80, b"\0"))
+        file.write(np.uint32(len(records)).tobytes())
+        file.write(records.tobytes())
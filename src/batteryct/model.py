@@ -0,0 +1,664 @@
+"""
+File: model.py
+Description: Blender-independent cell model (sampling, stack planning, labeling, result cache)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import numpy as np
+
+from .config import (BEND_SCALE, BEND_ZONE, CARRIER_TYPES, CODE_VERSION, DEFAULT_PARAMS, PART_NAMES, PLATE_DTYPE, PLATE_TYPES,
+                     RUN_KEYS)
+from .container import read_glb, read_stl, write_glb
+from .dataset import ShardWriter, cell_sample
+from .defects import DEFECT_DEFAULTS, DEFECT_INJECTORS
+from .manifest import MANIFEST_NAME, Manifest, cell_record, manifest_header
+from .profiling import Profiler
+from .validation import validate_plates
+
+# ------------------------------------------------------------------------
+#    Properties Battery Modeling
+# ------------------------------------------------------------------------
+
+class CellModel(ABC):
+    # Base of the geometry backends (Blender panel, NumPy meshes, wound cells), they implement build_cell
+
+    # keys of the <name>_deviations labels (recorded in the manifest header)
+    deviation_keys = ["length", "width", "height", "x_position", "y_position"]
+
+    def __init__(self):
+        # create time stamp for export
+        self.current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.export_folder = os.path.normpath("Model_" + self.current_datetime)
+
+        # All lengths in m (SI)
+        self.update_parameters_from_ui(DEFAULT_PARAMS)
+        self.reset_data()
+        self.issues = []
+        self.discarded_defects = {}
+
+    ######################################## FUNCTIONS START ########################################
+    # Funktion, die leere Labeling-Daten anlegt (für jede Zelle neu, ein .json-file pro Zelle)
+    def reset_data(self):
+        self.data = {
+            "anode": {
+                "anode_position": {"x": [], "y": [], "z": []},
+                "anode_layer": [],
+                "anode_dimensions": {"length": [], "width": [], "height": []},
+                "anode_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []},
+                "anode_bending": {"x+": [], "x-":[]},
+                "anode_overhang": []
+            },
+            "cathode": {
+                "cathode_position": {"x": [], "y": [], "z": []},
+                "cathode_layer": [],
+                "cathode_dimensions": {"length": [], "width": [], "height": []},
+                "cathode_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []},
+                "cathode_bending": {"x+": [], "x-":[]}
+            },
+            "housing": {
+                "housing_position": {"x": [], "y": [], "z": []},
+                "housing_dimensions": {"outer_length": [], "outer_width": [], "outer_height": [], "inner_length": [],"inner_width": [],"inner_height": []}
+            },
+            "upper_cathode_coating": {
+                "upper_cathode_coating_position": {"x": [], "y": [], "z": []},
+                "upper_cathode_coating_layer": [],
+                "upper_cathode_coating_dimensions": {"length": [], "width": [], "height": []},
+                "upper_cathode_coating_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []}
+            },
+            "lower_cathode_coating": {
+                "lower_cathode_coating_position": {"x": [], "y": [], "z": []},
+                "lower_cathode_coating_layer": [],
+                "lower_cathode_coating_dimensions": {"length": [], "width": [], "height": []},
+                "lower_cathode_coating_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []}
+            },
+            "upper_anode_coating": {
+                "upper_anode_coating_position": {"x": [], "y": [], "z": []},
+                "upper_anode_coating_layer": [],
+                "upper_anode_coating_dimensions": {"length": [], "width": [], "height": []},
+                "upper_anode_coating_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []}
+            },
+            "lower_anode_coating": {
+                "lower_anode_coating_position": {"x": [], "y": [], "z": []},
+                "lower_anode_coating_layer": [],
+                "lower_anode_coating_dimensions": {"length": [], "width": [], "height": []},
+                "lower_anode_coating_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []}
+            },
+            "defects": []
+        }
+
+
+    # Spawn key of cell jj, further draws of an invalid cell get their own key (jj, attempt)
+    def spawn_key(self, jj, attempt=0):
+        return [jj] if attempt == 0 else [jj, attempt]
+
+    # Random generator of cell jj, the streams of the cells are independent (SeedSequence with spawn key jj)
+    def cell_rng(self, jj, attempt=0):
+        return np.random.default_rng(np.random.SeedSequence(self.seed, spawn_key=tuple(self.spawn_key(jj, attempt))))
+
+    # Draws the deviations of all plates of a cell (or of num_cells cells) in one vectorized call
+    def generate_deviations(self, rng, num_cells=None):
+        parts = [getattr(self, name) for name in PLATE_TYPES]
+        amounts = [p["amount"] for p in parts]
+        shape = (sum(amounts),) if num_cells is None else (num_cells, sum(amounts))
+
+        # Standard deviations per plate: length, width, height, x_position, y_position
+        scales = np.repeat([[p["length_tol"], p["width_tol"], p["height_tol"], self.x_variation, self.y_variation] for p in parts], amounts, axis=0)
+        # loc heißt Mittelwert und scale heißt Standardabweichung
+        normal = rng.normal(loc=0.0, scale=scales, size=shape + (5,))
+        bending = rng.uniform(self.min_angle, self.max_angle, size=shape + (2,))
+        # GIBT FÜR JEDE ANODE EINE ZUFÄLLIGE GLEITKOMMAZAHL IN DIESEM BEREICH ZURÜCK
+        overhang = rng.uniform(self.anode["min_overhang"], self.anode["max_overhang"], size=shape[:-1] + (self.anode["amount"],))
+
+        deviations = {}
+        start = 0
+        for name, amount in zip(PLATE_TYPES, amounts):
+            stop = start + amount
+            deviations[name] = {
+                "length": normal[..., start:stop, 0], # aktuell = 0 --> berücksichtigen bei Positionierung noch erforderlich!! 
+                "width": normal[..., start:stop, 1],  # aktuell = 0 --> berücksichtigen bei Positionierung noch erforderlich!! 
+                "height": normal[..., start:stop, 2], # aktuell = 0 --> berücksichtigen bei Positionierung noch erforderlich!! 
+                "x_position": normal[..., start:stop, 3],
+                "y_position": normal[..., start:stop, 4],
+                "bending":
+                    {
+                        "x+": bending[..., start:stop, 0],
+                        "x-": bending[..., start:stop, 1]
+                    }
+            }
+            start = stop
+        deviations["anode"]["overhang"] = overhang
+        return deviations
+
+    # Computes the plate table of a cell (or of a batch of cells) from the config and the deviations in one vectorized pass
+    def plan_stack(self, deviations):
+        parts = [getattr(self, name) for name in PLATE_TYPES]
+        amounts = [p["amount"] for p in parts]
+        types = np.repeat(np.arange(len(PLATE_TYPES)), amounts)
+        layers = np.concatenate([np.arange(amount) for amount in amounts])
+        offsets = np.cumsum([0] + amounts[:-1])
+        carriers = offsets[np.array(CARRIER_TYPES)[types]] + layers
+
+        # Formula for parametric positioning (nominal heights)
+        h = {name: p["height"] for name, p in zip(PLATE_TYPES, parts)}
+        z_distance = sum(h.values()) + 2*self.seperator_height
+        anode_z = (h["anode"]/2.0) + h["lower_anode_coating"] + self.seperator_height + (self.housing_geometry["wall_thickness"]/2.0)
+        cathode_z = anode_z + ((h["anode"]+h["cathode"])/2.0) + h["upper_anode_coating"] + h["lower_cathode_coating"] + self.seperator_height
+        z_start = np.array([
+            anode_z,
+            anode_z - ((h["anode"] + h["lower_anode_coating"]) / 2.0),
+            anode_z + ((h["anode"] + h["upper_anode_coating"]) / 2.0),
+            cathode_z,
+            cathode_z - ((h["cathode"] + h["lower_cathode_coating"]) / 2.0),
+            cathode_z + ((h["cathode"] + h["upper_cathode_coating"]) / 2.0),
+        ])
+
+        shape = deviations["anode"]["length"].shape[:-1]
+        plates = np.zeros(shape + (len(types),), dtype=PLATE_DTYPE)
+        plates["type"] = types
+        plates["layer"] = layers
+        plates["carrier"] = carriers
+        plates["visible"] = True
+        plates["z"] = z_start[types] + layers * z_distance
+
+        for field, key in [("dev_length", "length"), ("dev_width", "width"), ("dev_height", "height"), ("dev_x", "x_position"), ("dev_y", "y_position")]:
+            plates[field] = np.concatenate([deviations[name][key] for name in PLATE_TYPES], axis=-1)
+        bend_pos = np.concatenate([deviations[name]["bending"]["x+"] for name in PLATE_TYPES], axis=-1)
+        bend_neg = np.concatenate([deviations[name]["bending"]["x-"] for name in PLATE_TYPES], axis=-1)
+
+        # Coatings take position, bending and overhang of their anode/cathode
+        plates["x"] = plates["dev_x"][..., carriers]
+        plates["y"] = plates["dev_y"][..., carriers]
+        plates["bend_pos"] = bend_pos[..., carriers]
+        plates["bend_neg"] = bend_neg[..., carriers]
+        if not self.bending_bool:
+            # flat plates, only a folded electrode (defects) bends its end
+            plates["bend_pos"] = 0.0
+            plates["bend_neg"] = 0.0
+        if self.anode_overhang_bool == True:
+            is_anode = np.array(CARRIER_TYPES)[types] == 0
+            plates["overhang"][..., is_anode] = deviations["anode"]["overhang"][..., layers[is_anode]]
+
+        nominal = np.array([[p["length"], p["width"], p["height"]] for p in parts])[types]
+        plates["length"] = np.maximum(0.001, nominal[:, 0] + plates["dev_length"] + plates["overhang"])
+        plates["width"] = np.maximum(0.001, nominal[:, 1] + plates["dev_width"])
+        plates["height"] = np.maximum(0.001, nominal[:, 2] + plates["dev_height"])
+        return plates
+
+    # Applies the configured defects to the plate table of one cell, every defect gets an entry in the labels
+    def apply_defects(self, plates, rng):
+        for name, params in self.defects.items():
+            if params["probability"] > 0 and rng.random() < params["probability"]:
+                plates, label = DEFECT_INJECTORS[name](self, plates, rng, params)
+                label["type"] = name
+                self.data["defects"].append(label)
+        return plates
+
+    # Draws the deviations, plans the stack (self.plates) and fills the labels of one cell
+    def plan_cell(self, rng):
+        self.deviations = self.generate_deviations(rng)
+        self.plates = self.apply_defects(self.plan_stack(self.deviations), rng)
+        self.label_plates()
+        self.label_housing()
+
+    # Overlapping or protruding plates of the cell, a folded electrode overlaps on purpose
+    def validate_cell(self):
+        ignore_carriers = []
+        for defect in self.data["defects"]:
+            if defect["type"] == "folded_electrode":
+                rows = (self.plates["type"] == PLATE_TYPES.index(defect["plate"])) & (self.plates["layer"] == defect["layer"])
+                ignore_carriers += self.plates["carrier"][rows].tolist()
+        # the angles of the table are the bends of the geometry (0 without bending)
+        return validate_plates(self.plates, self.housing_geometry, True, ignore_carriers=ignore_carriers)
+
+    # Datentransfer für Labeling mit .json-file (aus der Plattentabelle)
+    def label_plates(self):
+        for t, name in enumerate(PLATE_TYPES):
+            plates = self.plates[(self.plates["type"] == t) & self.plates["visible"]]
+            # number of the plate in the stack, plates removed by a defect leave a gap
+            self.data[name][f"{name}_layer"] = plates["layer"].tolist()
+            self.data[name][f"{name}_position"] = {"x": plates["x"].tolist(), "y": plates["y"].tolist(), "z": plates["z"].tolist()}
+            self.data[name][f"{name}_dimensions"] = {"length": plates["length"].tolist(), "width": plates["width"].tolist(), "height": plates["height"].tolist()}
+            self.data[name][f"{name}_deviations"] = {
+                "length": plates["dev_length"].tolist(),
+                "width": plates["dev_width"].tolist(),
+                "height": plates["dev_height"].tolist(),
+                "x_position": plates["dev_x"].tolist(),
+                "y_position": plates["dev_y"].tolist()
+            }
+            if name in ["anode", "cathode"]:
+                self.data[name][f"{name}_bending"] = {"x+": plates["bend_pos"].tolist(), "x-": plates["bend_neg"].tolist()}
+            if name == "anode":
+                self.data[name]["anode_overhang"] = plates["overhang"].tolist()
+
+    # Housing labels (the housing is the same for all cells of a config)
+    def label_housing(self):
+        housing_geometry = self.housing_geometry
+        self.data["housing"]["housing_dimensions"]["outer_length"].append(housing_geometry["outer_length"])
+        self.data["housing"]["housing_dimensions"]["outer_width"].append(housing_geometry["outer_width"])
+        self.data["housing"]["housing_dimensions"]["outer_height"].append(housing_geometry["more_geometry"]["outer_height"])
+        self.data["housing"]["housing_dimensions"]["inner_length"].append(housing_geometry["outer_length"] - housing_geometry["wall_thickness"])
+        self.data["housing"]["housing_dimensions"]["inner_width"].append(housing_geometry["outer_width"] - housing_geometry["wall_thickness"])
+        self.data["housing"]["housing_dimensions"]["inner_height"].append(housing_geometry["more_geometry"]["outer_height"] - housing_geometry["wall_thickness"])
+        
+        self.data["housing"]["housing_position"]["x"].append(0)
+        self.data["housing"]["housing_position"]["y"].append(0)
+        self.data["housing"]["housing_position"]["z"].append(housing_geometry["more_geometry"]["outer_height"]/2.0)
+
+    # Number of segments of a bent zone, so that the chord error of the bent arc stays below bend_tolerance.
+    # The bend (SimpleDeform in Blender) spreads the angle over the whole plate length, so the radius
+    # is length/angle and the zone at each end covers only BEND_ZONE of the angle.
+    def bend_segments(self, angle, length):
+        theta = abs(angle) * BEND_SCALE  # degrees in radians + scaling
+        if theta == 0 or length <= 0:
+            return 1
+        radius = length / theta
+        zone_angle = theta * BEND_ZONE
+        # chord error of a segment with the angle phi: radius * (1 - cos(phi/2))
+        max_phi = 2 * np.arccos(np.clip(1 - self.bend_tolerance / radius, -1.0, 1.0))
+        return int(np.clip(np.ceil(zone_angle / max_phi), 1, 64))
+
+    # One .glb file per cell with a mesh per part and the labels. Backends that keep their meshes in
+    # self.meshes hand them over directly, otherwise the .stl files of the parts are read and replaced.
+    def write_container(self, j):
+        meshes = {}
+        for name in PART_NAMES:
+            file_path = os.path.join(self.export_path, f"{j+1}_{self.current_datetime}_{name}.stl")
+            if name in self.meshes:
+                meshes[name] = self.meshes[name]
+            elif os.path.exists(file_path):
+                meshes[name] = read_stl(file_path)
+                os.remove(file_path)
+        self.data['Comment:'] = "All dimensions and deviations refer to the center point of the object.\nThe characteristic values for each element (1 to n) can be found below."
+        write_glb(os.path.join(self.export_path, f"{j+1}_{self.current_datetime}_cell.glb"), meshes, self.data)
+
+    def write_data_to_file(self, data, filename):
+        self.data['Comment:'] = "All dimensions and deviations refer to the center point of the object.\nThe characteristic values for each element (1 to n) can be found below."
+        full_path = os.path.join(self.export_path, filename)        
+        with open(full_path, 'w') as file:
+            json.dump(data, file, indent=4)
+
+    ######################################## RESULT CACHE ########################################
+    # Without random variation every cell of a config is identical
+    def is_deterministic(self):
+        parts = [getattr(self, name) for name in PLATE_TYPES]
+        tolerances = [p[k] for p in parts for k in ("length_tol", "width_tol", "height_tol")]
+        if any(tol != 0.0 for tol in tolerances) or self.x_variation != 0.0 or self.y_variation != 0.0:
+            return False
+        if self.bending_bool and self.min_angle != self.max_angle:
+            return False
+        if self.anode_overhang_bool and self.anode["min_overhang"] != self.anode["max_overhang"]:
+            return False
+        if any(params["probability"] > 0 for params in self.defects.values()):
+            return False
+        return True
+
+    # Canonical form of everything that has an influence on the exported files of a cell. The settings of the
+    # run (run_config) are not part of it: cell j does not depend on them, so a cache entry is shared by runs
+    # with more cells or another export folder.
+    def canonical_config(self):
+        config = {
+            "backend": type(self).__name__,
+            "seperator_height": self.seperator_height,
+            "anode_overhang_bool": self.anode_overhang_bool,
+            "export_inner_battery_bool": self.export_inner_battery_bool,
+            "export_housing_bool": self.export_housing_bool,
+            "cut_housing_zy_bool": self.cut_housing_zy_bool,
+            "cut_housing_zx_bool": self.cut_housing_zx_bool,
+            "bending_bool": self.bending_bool,
+            "bend_tolerance": self.bend_tolerance,
+            "max_angle": self.max_angle,
+            "min_angle": self.min_angle,
+            "x_variation": self.x_variation,
+            "y_variation": self.y_variation,
+            "housing_geometry": self.housing_geometry,
+            "defects": self.defects,
+            "export_format": self.export_format,
+            "validation": self.validation,
+            "max_attempts": self.max_attempts,
+            "cell_type": self.cell_type,
+            "winding": self.winding,
+        }
+        for name in PLATE_TYPES:
+            config[name] = getattr(self, name)
+        return json.dumps(config, sort_keys=True, separators=(",", ":"))
+
+    # Canonical form of the settings of a run that change its output but not the files of a single cell
+    # (number of cells, folders, shards, profiling)
+    def run_config(self):
+        return json.dumps({key: self.params.get(key, DEFAULT_PARAMS[key]) for key in RUN_KEYS}, sort_keys=True, separators=(",", ":"))
+
+    # Hash key of cell jj, None if caching is switched off
+    def cache_key(self, jj):
+        if not self.cache_bool:
+            return None
+        if self.is_deterministic():
+            cell = "deterministic"
+        else:
+            cell = f"seed={self.seed};cell={jj}"
+        content = f"{CODE_VERSION}|{cell}|{self.canonical_config()}"
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def load_from_cache(self, key, jj):
+        entry = os.path.join(self.cache_path, key)
+        if not os.path.isdir(entry):
+            return False
+
+        if not os.path.exists(self.export_path):
+            os.makedirs(self.export_path)
+        for name in sorted(os.listdir(entry)):
+            file_path = os.path.join(self.export_path, f"{jj+1}_{self.current_datetime}_{name}")
+            if name == "labeling.json":
+                # deterministic entries are shared by all cells, so the random state has to be replaced
+                with open(os.path.join(entry, name), 'r') as file:
+                    data = json.load(file)
+                if self.is_deterministic():
+                    data["random"] = self.data["random"]
+                with open(file_path, 'w') as file:
+                    json.dump(data, file, indent=4)
+            elif name == "cell.glb":
+                meshes, data = read_glb(os.path.join(entry, name))
+                if self.is_deterministic():
+                    data["random"] = self.data["random"]
+                write_glb(file_path, meshes, data)
+            else:
+                shutil.copyfile(os.path.join(entry, name), file_path)
+        print(f"[{self.current_datetime}] Cell {jj+1} restored from cache ({key[:12]})")
+        return True
+
+    def store_in_cache(self, key, jj):
+        entry = os.path.join(self.cache_path, key)
+        if os.path.isdir(entry):
+            return
+
+        # Copy to a temporary folder first and rename it, so that an entry is either complete or missing
+        tmp_entry = f"{entry}.tmp{os.getpid()}"
+        os.makedirs(tmp_entry, exist_ok=True)
+        prefix = f"{jj+1}_{self.current_datetime}_"
+        for file_name in self.cell_files(jj):
+            shutil.copyfile(os.path.join(self.export_path, file_name), os.path.join(tmp_entry, file_name[len(prefix):]))
+        try:
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # entry was written by another run in the meantime
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    def generate_cells(self):
+        ######################################## GENERATING START ########################################
+        self.open_manifest()
+        self.open_shards()
+        for j in range(self.iterations):
+            self.run_cell(j)
+        self.close_shards()
+
+        self.write_profile()
+        ######################################## GENERATING END ########################################
+
+    # Generates cell j, unless the manifest already contains it with unchanged files
+    def run_cell(self, j):
+        if self.manifest.is_complete(j):
+            print(f"Cell {j+1} already generated, skipped")
+            self.add_to_shards(j)
+            return False
+        with self.profiler.stage("cell", cell=j):
+            self.generate_cell(j)
+        print(f"Cell {j+1} exported to: {self.export_path}")
+        self.manifest.add(self.cell_record(j))
+        self.add_to_shards(j)
+        return True
+
+    # Continue a run (same time stamp and export folder), e.g. in a worker or after a restart
+    def set_run(self, current_datetime, export_path):
+        self.current_datetime = current_datetime
+        self.export_path = export_path
+
+    def open_manifest(self):
+        self.manifest = Manifest(os.path.join(self.export_path, MANIFEST_NAME), manifest_header(self))
+        return self.manifest
+
+    def open_shards(self):
+        self.shard_writer = ShardWriter(self.shard_path, int(self.shard_size * 1e6)) if self.shard_path else None
+
+    # Streams cell j into the current dataset shard (if it is not already in a finished shard)
+    def add_to_shards(self, j):
+        key = f"{j+1}_{self.current_datetime}"
+        if self.shard_writer is None or key in self.shard_writer or self.manifest.cells[j].get("rejected"):
+            return
+        with self.profiler.stage("shard_write", cell=j):
+            file_names = self.manifest.cells[j]["files"]
+            self.shard_writer.add(key, cell_sample(self.export_path, file_names, j, self.voxel_size))
+
+    def close_shards(self):
+        if self.shard_writer is not None:
+            self.shard_writer.close()
+
+    # Files of cell jj in the export folder
+    def cell_files(self, jj):
+        prefix = f"{jj+1}_{self.current_datetime}_"
+        return [file_name for file_name in os.listdir(self.export_path) if file_name.startswith(prefix)]
+
+    # Record of the manifest, a rejected cell has no files but its issues. Defects of invalid draws that were
+    # resampled are counted per type (discarded_defects).
+    def cell_record(self, jj):
+        record = cell_record(jj, self.export_path, self.cell_files(jj))
+        if self.discarded_defects:
+            record["discarded_defects"] = self.discarded_defects
+        if self.issues:
+            record["rejected"] = True
+            record["issues"] = self.issues
+        return record
+
+    def write_profile(self):
+        if self.profiler.enabled:
+            extension = "csv" if self.profile_format == "csv" else "json"
+            os.makedirs(self.export_path, exist_ok=True)
+            file_path = os.path.join(self.export_path, f"{self.current_datetime}_profile.{extension}")
+            self.profiler.write(file_path, self.profile_format)
+            print("Profiling trace written to: " + file_path)
+
+    def generate_cell(self, j):
+        # SKIP CELLS THAT HAVE ALREADY BEEN GENERATED WITH THE SAME CONFIG
+        self.reset_data()
+        self.data["random"] = {"seed": self.seed, "spawn_key": self.spawn_key(j)}
+        self.issues = []
+        self.discarded_defects = {}
+        key = self.cache_key(j)
+        if key is not None:
+            with self.profiler.stage("cache_restore", cell=j) as info:
+                hit = self.load_from_cache(key, j)
+                info["hit"] = hit
+            if hit:
+                return
+        
+        # DRAW ALL DEVIATIONS OF THE CELL AT ONCE AND PLAN THE STACK
+        # (an invalid cell is drawn again with the next spawn key or rejected)
+        attempts = self.max_attempts if self.validation == "resample" else 1
+        for attempt in range(attempts):
+            with self.profiler.stage("stack_planning", cell=j, attempt=attempt) as info:
+                self.reset_data()
+                self.data["random"] = {"seed": self.seed, "spawn_key": self.spawn_key(j, attempt)}
+                self.plan_cell(self.cell_rng(j, attempt))
+                info["plates"] = len(self.plates)
+            if self.validation == "off":
+                break
+            with self.profiler.stage("validation", cell=j, attempt=attempt) as info:
+                self.issues = self.validate_cell()
+                info["issues"] = len(self.issues)
+            if not self.issues:
+                break
+            # defects of an invalid draw are lost, they are counted so that the defect rates can be corrected
+            for defect in self.data["defects"]:
+                self.discarded_defects[defect["type"]] = self.discarded_defects.get(defect["type"], 0) + 1
+            if self.data["defects"]:
+                print(f"Cell {j+1}, attempt {attempt+1} invalid, defects discarded: {', '.join(d['type'] for d in self.data['defects'])}")
+        if self.issues:
+            print(f"Cell {j+1} rejected after {attempts} attempt(s): {self.issues[0]}")
+            return
+        
+        # CREATE AND EXPORT THE GEOMETRY (Blender or NumPy backend)
+        if not os.path.exists(self.export_path):
+            os.makedirs(self.export_path)
+        self.meshes = {}
+        self.build_cell(j)
+        
+        if self.export_format == "glb":
+            with self.profiler.stage("container_write", cell=j):
+                self.write_container(j)
+        else:
+            with self.profiler.stage("json_write", cell=j):
+                filename = f"{j+1}_{self.current_datetime}_labeling.json"
+                self.write_data_to_file(self.data, filename)
+        
+        if key is not None:
+            with self.profiler.stage("cache_store", cell=j):
+                self.store_in_cache(key, j)
+        
+        self.finish_cell(j)
+
+    # Creates the geometry of cell j from self.plates and writes the .stl files of all parts
+    @abstractmethod
+    def build_cell(self, j):
+        pass
+
+    # Called after the export of cell j (e.g. for the visualisation in Blender)
+    def finish_cell(self, j):
+        pass
+
+    def update_parameters_from_ui(self, params):
+        # update time stamp for export
+        self.current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.export_path = os.path.join(params["path"], self.export_folder)
+        self.cache_path = os.path.join(params["path"], "BatteryCT_cache")
+        self.params = dict(params)
+        self.iterations = params["num_export"]
+        self.cache_bool = params.get("cache", True)
+        # Without a given seed a fresh one is drawn, it is recorded in the labeling files anyway
+        self.seed = params.get("seed", -1)
+        if self.seed < 0:
+            self.seed = np.random.SeedSequence().entropy
+        
+        self.seperator_height = params["separator"]
+        self.anode_overhang_bool = params["overhang"]
+        self.export_inner_battery_bool = True
+        self.export_housing_bool = params["case"]
+        self.cut_housing_zy_bool = params["cut_zy"]
+        self.cut_housing_zx_bool = params["cut_zx"]
+        self.bending_bool = params["bending"]
+        self.bend_tolerance = params.get("bend_tolerance", DEFAULT_PARAMS["bend_tolerance"])
+        self.profiler = Profiler(params.get("profile", False))
+        self.profile_format = params.get("profile_format", DEFAULT_PARAMS["profile_format"])
+        self.export_format = params.get("export_format", DEFAULT_PARAMS["export_format"])
+        self.shard_path = params.get("shard_path", DEFAULT_PARAMS["shard_path"])
+        self.shard_size = params.get("shard_size", DEFAULT_PARAMS["shard_size"])
+        self.voxel_size = params.get("voxel_size", DEFAULT_PARAMS["voxel_size"])
+        self.validation = params.get("validation", DEFAULT_PARAMS["validation"])
+        self.max_attempts = params.get("max_attempts", DEFAULT_PARAMS["max_attempts"])
+        self.cell_type = params.get("cell_type", DEFAULT_PARAMS["cell_type"])
+        self.winding = {key: params.get(key, DEFAULT_PARAMS[key]) for key in ("winding_turns", "core_radius", "flat_length", "winding_gap")}
+        
+        self.max_angle = params["max_angle"]
+        self.min_angle = params["min_angle"]
+
+        self.x_variation = params["dev_x"]
+        self.y_variation = params["dev_y"]
+        
+        self.anode = {
+            "length": params["size_x"], # 0.1015
+            "width": params["size_y"], # 0.050
+            "height": params["size_z"], # 0.001
+            "length_tol": 0.000,
+            "max_overhang": params["max_overhang"], # 0.0068
+            "min_overhang": params["min_overhang"], # 0.0023
+            "width_tol": 0.000,
+            "height_tol": 0.000,
+            "amount": params["num_anodes"], # integer
+            "color": (1, 0, 0, 1),  # red color (RGB values)
+        }
+
+        self.lower_anode_coating = {
+            "length": params["size_x"],
+            "width": params["size_y"],
+            "height": params["size_z"],
+            "length_tol": 0.000,
+            "max_overhang": self.anode["max_overhang"],
+            "min_overhang": self.anode["min_overhang"],
+            "width_tol": 0.000,
+            "height_tol": 0.000,
+            "amount": self.anode["amount"],
+            "color": (0, 0, 0, 1),  # black color (RGB values)
+        }
+
+        self.upper_anode_coating = {
+            "length": params["size_x"],
+            "width": params["size_y"],
+            "height": params["size_z"],
+            "length_tol": 0.000,
+            "max_overhang": self.anode["max_overhang"],
+            "min_overhang": self.anode["min_overhang"],
+            "width_tol": 0.000,
+            "height_tol": 0.000,
+            "amount": self.anode["amount"],
+            "color": (0, 0, 0, 1),  # black color (RGB values)
+        }
+
+        self.cathode = {
+            "length": params["size_x"],
+            "width": params["size_y"],
+            "height": params["size_z"],
+            "length_tol": 0.000,
+            "width_tol": 0.000,
+            "height_tol": 0.000,
+            "amount": self.anode["amount"]-1, # integer
+            "color": (0, 1, 0, 1),  # green color (RGB values)
+        }
+
+        self.lower_cathode_coating = {
+            "length": params["size_x"],
+            "width": params["size_y"],
+            "height": params["size_z"],
+            "length_tol": 0.000,
+            "width_tol": 0.000,
+            "height_tol": 0.000,
+            "amount": self.anode["amount"]-1,
+            "color": (0, 0, 1, 1),  # blue color (RGB values)
+        }
+
+        self.upper_cathode_coating = {
+            "length": params["size_x"],
+            "width": params["size_y"],
+            "height": params["size_z"],
+            "length_tol": 0.000,
+            "width_tol": 0.000,
+            "height_tol": 0.000,
+            "amount": self.anode["amount"]-1,
+            "color": (0, 0, 1, 1),  # blue color (RGB values)
+        }
+
+        self.particle = {
+            "color": (1, 1, 1, 1),  # white color (RGB values)
+        }
+
+        # Every defect uses the probability of the UI, single defects can be changed in the config file
+        self.defects = {}
+        for name, defaults in DEFECT_DEFAULTS.items():
+            self.defects[name] = dict(defaults, probability=params.get("defect_probability", 0.0))
+            self.defects[name].update(params.get("defects", {}).get(name, {}))
+
+        # END VARIABLE PARAMETERSET
+
+        self.housing_geometry = {
+            # battery sizes
+            "outer_width": (self.anode["width"] + self.y_variation*2 + 0.008), 
+            "outer_length": (self.anode["length"] + self.anode["max_overhang"] + self.x_variation*2 + 0.008),  
+            "wall_thickness": 0.001
+        }
+
+        self.housing_geometry["more_geometry"] = {
+            "bevel_radius": 0.01,
+            "outer_height": (self.anode["amount"]*self.anode["height"]) + (self.cathode["amount"]*self.cathode["height"]) + (self.lower_anode_coating["amount"]*self.lower_anode_coating["height"]) + (self.upper_anode_coating["amount"]*self.upper_anode_coating["height"]) + (self.lower_cathode_coating["amount"]*self.lower_cathode_coating["height"]) + (self.upper_cathode_coating["amount"]*self.upper_cathode_coating["height"]) + (2*self.anode["amount"]*self.seperator_height)+(self.housing_geometry["wall_thickness"]), 
+        }
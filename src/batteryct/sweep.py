@@ -0,0 +1,274 @@
+"""
+File: sweep.py
+Description: Parameter sweeps and designs of experiments over the config keys, all cells in one worker pool
+
+A sweep file names the varied config keys and how they vary, every other key comes from the base config:
+
+    {
+        "config": "config.json",                            (optional, base config of Save Config)
+        "base": {"num_export": 20},                         (optional, overrides of the base config)
+        "design": "grid",                                   ("grid", "lhs" Latin hypercube or "sobol")
+        "samples": 16,                                      (points of lhs/sobol)
+        "seed": 0,                                          (seed of the design and of the cells)
+        "parameters": {
+            "num_anodes": [8, 10, 12],                      (levels)
+            "separator": {"min": 0.0005, "max": 0.002, "num": 4},           (range, num levels in a grid)
+            "dev_x": {"min": 0.0001, "max": 0.01, "scale": "log"},
+            "max_angle": {"distribution": "normal", "mean": 15.0, "std": 3.0}
+        }
+    }
+
+Every point of the design is a unit vector u in [0, 1)^d that is mapped per key to a level (index of u in the
+list), a value of the range (linear or logarithmic) or a quantile of the normal distribution; values are
+converted to the type of the key in DEFAULT_PARAMS. A grid takes every level, num points of every range (with
+the end points) and num quantiles of every distribution. Points that lead to the same canonical config and the
+same settings of the run (e.g. several u in one level, or int keys rounded to the same value) are generated once,
+points with a min_ key above its max_ key (min_overhang, min_angle) are skipped. All points use the same seed, so the cells of two
+points differ only by the varied keys.
+
+Each point is an export folder <path>/Sweep_<time>/<point>/ with its own manifest, the cells of all points are
+distributed over one pool of worker processes. sweep.json in the sweep folder lists the points with their
+values; an interrupted sweep is continued with --resume <sweep folder>.
+
+    python -m batteryct.sweep sweep.json --workers 8
+    python -m batteryct.sweep --resume <path>/Sweep_<time>
+"""
+
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+import numpy as np
+
+from .config import DEFAULT_PARAMS
+from .export import create_modeler
+
+DESIGNS = ["grid", "lhs", "sobol"]
+SWEEP_NAME = "sweep.json"
+# levels of a range or distribution in a grid without "num"
+GRID_LEVELS = 3
+# cells submitted to the pool per worker at a time (a large sweep is not queued at once)
+PENDING_PER_WORKER = 2
+
+
+# Value of a config key at the unit coordinate u of the design
+def unit_to_value(key, spec, u):
+    if isinstance(spec, list):
+        value = spec[min(int(u * len(spec)), len(spec) - 1)]
+    elif "distribution" in spec:
+        if spec["distribution"] != "normal":
+            raise ValueError(f"{key}: unknown distribution {spec['distribution']} (normal or a range with min and max)")
+        from scipy.stats import norm
+        value = spec["mean"] + spec["std"] * norm.ppf(np.clip(u, 1e-9, 1 - 1e-9))
+    elif spec.get("scale", "linear") == "log":
+        value = spec["min"] * (spec["max"] / spec["min"]) ** u
+    else:
+        value = spec["min"] + u * (spec["max"] - spec["min"])
+    # type of the key in the config (int levels are rounded)
+    default = DEFAULT_PARAMS[key]
+    if isinstance(default, bool):
+        return bool(value)
+    if isinstance(default, int):
+        return int(round(float(value)))
+    if isinstance(default, float):
+        return float(value)
+    return value
+
+
+# Unit coordinates of the grid along one key
+def grid_units(spec):
+    if isinstance(spec, list):
+        return (np.arange(len(spec)) + 0.5) / len(spec)
+    num = spec.get("num", GRID_LEVELS)
+    if "distribution" in spec:
+        return (np.arange(num) + 0.5) / num
+    return np.linspace(0.0, 1.0, num)
+
+
+# Unit vectors (points, keys) of the design
+def design_units(parameters, design="grid", samples=16, seed=0):
+    keys = list(parameters)
+    if design == "grid":
+        return np.array(list(itertools.product(*[grid_units(parameters[key]) for key in keys]))).reshape(-1, len(keys))
+    from scipy.stats import qmc
+    if design == "lhs":
+        return qmc.LatinHypercube(d=len(keys), seed=seed).random(samples)
+    if design == "sobol":
+        return qmc.Sobol(d=len(keys), scramble=True, seed=seed).random(samples)
+    raise ValueError(f"Unknown design {design} ({', '.join(DESIGNS)})")
+
+
+# Params of every point of the sweep: list of (values of the varied keys, params), same canonical config only once.
+# Returns the points and the number of duplicate and skipped points.
+def expand_sweep(base, parameters, design="grid", samples=16, seed=0):
+    unknown = [key for key in parameters if key not in DEFAULT_PARAMS]
+    if unknown:
+        raise ValueError(f"Unknown config keys: {', '.join(unknown)}")
+    points, seen = [], set()
+    duplicates = skipped = 0
+    for units in design_units(parameters, design, samples, seed):
+        values = {key: unit_to_value(key, spec, u) for (key, spec), u in zip(parameters.items(), units)}
+        params = dict(base, **values)
+        if any(key.startswith("min_") and "max_" + key[4:] in params and params[key] > params["max_" + key[4:]] for key in params):
+            skipped += 1
+            continue
+        modeler = create_modeler(params)
+        modeler.update_parameters_from_ui(params)
+        # cells and settings of the run (e.g. num_export), the seed is the same for all points
+        canonical = modeler.canonical_config() + "|" + modeler.run_config()
+        if canonical in seen:
+            duplicates += 1
+            continue
+        seen.add(canonical)
+        points.append((values, params))
+    return points, duplicates, skipped
+
+
+# Modelers of a worker process, one per point (created at the first cell of the point)
+worker_modelers = {}
+
+
+def generate_point_cell(point, params, current_datetime, export_path, j):
+    modeler = worker_modelers.get(point)
+    if modeler is None:
+        modeler = worker_modelers[point] = create_modeler(params)
+        modeler.update_parameters_from_ui(params)
+        modeler.set_run(current_datetime, export_path)
+    with modeler.profiler.stage("cell", cell=j, point=point):
+        modeler.generate_cell(j)
+    events = modeler.profiler.events
+    modeler.profiler.events = []
+    return point, modeler.cell_record(j), events
+
+
+# Generates all cells of all points with one pool of worker processes. Like generate_parallel only this process
+# writes the manifests (one per point), cells that are already in them are skipped. At most PENDING_PER_WORKER
+# cells per worker are submitted, the next ones when cells are done.
+def run_sweep(sweep, workers=None):
+    sweep_path = sweep["sweep_path"]
+    modelers, cells = [], []
+    for point in sweep["points"]:
+        modeler = create_modeler(point["params"])
+        modeler.update_parameters_from_ui(point["params"])
+        modeler.set_run(sweep["current_datetime"], os.path.join(sweep_path, point["name"]))
+        if modeler.shard_path:
+            modeler.shard_path = os.path.join(modeler.shard_path, point["name"])
+        modeler.open_manifest()
+        modeler.open_shards()
+        for j in range(modeler.iterations):
+            if modeler.manifest.is_complete(j):
+                modeler.add_to_shards(j)
+            else:
+                cells.append((point["point"], j))
+        modelers.append(modeler)
+    total = sum(modeler.iterations for modeler in modelers)
+    print(f"{total - len(cells)} of {total} cells of {len(modelers)} points already generated")
+
+    if cells:
+        workers = min(workers or os.cpu_count() or 1, len(cells))
+        queue = iter(cells)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            def submit(k, j):
+                return executor.submit(generate_point_cell, k, sweep["points"][k]["params"], sweep["current_datetime"],
+                                       modelers[k].export_path, j)
+
+            pending = {submit(k, j) for k, j in itertools.islice(queue, workers * PENDING_PER_WORKER)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    k, record, events = future.result()
+                    modelers[k].manifest.add(record)
+                    modelers[k].add_to_shards(record["cell"])
+                    modelers[k].profiler.events += events
+                    pending |= {submit(k, j) for k, j in itertools.islice(queue, 1)}
+    for modeler in modelers:
+        modeler.close_shards()
+        modeler.write_profile()
+    return modelers
+
+
+# Sweep folder and sweep.json of a sweep file (the seed of the cells is drawn once for all points)
+def plan_sweep(spec, config=None):
+    base = dict(DEFAULT_PARAMS)
+    if config or spec.get("config"):
+        with open(config or spec["config"], 'r') as file:
+            base.update(json.load(file))
+    base.update(spec.get("base", {}))
+    seed = spec.get("seed", base["seed"])
+    if seed < 0:
+        seed = int(np.random.SeedSequence().entropy)
+    base["seed"] = seed
+    design = spec.get("design", "grid")
+    if design not in DESIGNS:
+        raise ValueError(f"Unknown design {design} ({', '.join(DESIGNS)})")
+
+    points, duplicates, skipped = expand_sweep(base, spec["parameters"], design, spec.get("samples", 16), seed)
+    current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
+    width = len(str(max(len(points) - 1, 0)))
+    return {
+        "design": design,
+        "samples": spec.get("samples", 16),
+        "seed": seed,
+        "parameters": spec["parameters"],
+        "duplicates": duplicates,
+        "skipped": skipped,
+        "current_datetime": current_datetime,
+        "sweep_path": os.path.join(base["path"], f"Sweep_{current_datetime}"),
+        "points": [{"point": k, "name": f"{k:0{width}d}", "values": values, "params": params}
+                   for k, (values, params) in enumerate(points)],
+    }
+
+
+def write_sweep(sweep):
+    os.makedirs(sweep["sweep_path"], exist_ok=True)
+    file_path = os.path.join(sweep["sweep_path"], SWEEP_NAME)
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(sweep, file, indent=4)
+    os.replace(tmp_path, file_path)
+
+
+def read_sweep(sweep_path):
+    with open(os.path.join(sweep_path, SWEEP_NAME), 'r') as file:
+        sweep = json.load(file)
+    # the folder may have been moved since
+    sweep["sweep_path"] = os.path.abspath(sweep_path)
+    return sweep
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parameter sweep or design of experiments of the cell generation")
+    parser.add_argument("sweep", nargs="?", help="sweep file (varied keys, design, base config)")
+    parser.add_argument("--config", help="base config (overrides the config of the sweep file)")
+    parser.add_argument("--path", help="output folder (overrides the base config)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--dry-run", action="store_true", help="only list the points of the design")
+    parser.add_argument("--resume", help="sweep folder of an interrupted sweep, its missing cells are generated")
+    args = parser.parse_args(argv)
+
+    if args.resume:
+        sweep = read_sweep(args.resume)
+    else:
+        if not args.sweep:
+            parser.error("a sweep file or --resume is required")
+        with open(args.sweep, 'r') as file:
+            spec = json.load(file)
+        if args.path is not None:
+            spec["base"] = dict(spec.get("base", {}), path=args.path)
+        sweep = plan_sweep(spec, args.config)
+
+    print(f"{sweep['design']}: {len(sweep['points'])} points ({sweep['duplicates']} duplicates, {sweep['skipped']} with min > max skipped)")
+    for point in sweep["points"]:
+        print(f"  {point['name']}: " + ", ".join(f"{key}={value}" for key, value in point["values"].items()))
+    if args.dry_run:
+        return
+    write_sweep(sweep)
+    run_sweep(sweep, args.workers)
+    print(f"Sweep done: {sweep['sweep_path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+File: validation.py
+Description: Checks the plate table of a cell for interpenetrating plates and plates outside of the housing
+
+Broad phase: axis aligned bounding boxes of the (bent) plates, sweep and prune along z (the stack axis).
+The plates are boxes with at most two bent ends, so there is no BVH or grid over the triangles of the meshes.
+Narrow phase: the straight parts of two plates are axis aligned boxes and are intersected exactly. For the bent
+zones surface points of one plate are tested against the solid of the other plate, the bend is inverted
+analytically, so the bent zones are tested against the exact solid and not against their triangles.
+"""
+
+import numpy as np
+
+from .config import BEND_SCALE, BEND_ZONE, PLATE_TYPES
+
+
+# Points on the surfaces of all plates (plates, points, 3), dense enough in the bent zones that no slab of
+# height min_height can be crossed between two of them along the plate and no plate of width min_width across
+# it (edges and corners included). Same bend as mesh.bend_vertices.
+def sample_points(plates, carrier_z, bending, min_height, min_width):
+    segments = int(np.clip(np.ceil(BEND_ZONE * plates["length"].max() / (min_height / 2.0)), 1, 64)) if bending else 1
+    u = np.unique(np.concatenate([np.linspace(0, BEND_ZONE, segments + 1), np.linspace(1 - BEND_ZONE, 1, segments + 1)]))
+    u = np.unique(np.concatenate([u, (u[1:] + u[:-1]) / 2.0]))
+    columns = int(np.clip(np.ceil(plates["width"].max() / (min_width / 2.0)), 2, 64))
+    u, v, w = np.meshgrid(u, np.linspace(-0.5, 0.5, columns + 1), [-0.5, 0.0, 0.5], indexing="ij")
+    surface = (np.abs(v) == 0.5) | (np.abs(w) == 0.5) | (u == 0) | (u == 1)
+    local = np.stack([u[surface] - 0.5, v[surface], w[surface]], axis=-1)
+
+    size = np.stack([plates["length"], plates["width"], plates["height"]], axis=-1)
+    center = np.stack([plates["x"], plates["y"], plates["z"]], axis=-1)
+    points = center[:, None, :] + local[None, :, :] * size[:, None, :]
+    if not bending:
+        return points
+
+    length = plates["length"][:, None]
+    for angles, sign, zone in [(plates["bend_pos"], 1, local[:, 0] >= 0.5 - BEND_ZONE), (plates["bend_neg"], -1, local[:, 0] <= -0.5 + BEND_ZONE)]:
+        curvature = (angles * BEND_SCALE)[:, None] / length
+        x0 = center[:, 0:1] + sign * (0.5 - BEND_ZONE) * length
+        d = points[:, zone, 0] - x0
+        h = points[:, zone, 2] - carrier_z[:, None]
+        phi = d * curvature
+        straight = curvature == 0
+        safe = np.where(straight, 1.0, curvature)
+        # x0 + (r - h) sin(phi), z0 + r - (r - h) cos(phi) with r = 1/curvature
+        points[:, zone, 0] = x0 + np.where(straight, d, np.sin(phi) / safe) - h * np.sin(phi)
+        points[:, zone, 2] = carrier_z[:, None] + np.where(straight, 0.0, (1 - np.cos(phi)) / safe) + h * np.cos(phi)
+    return points
+
+
+# True for every point that lies inside the plate (shrunk by tolerance, so touching plates do not count)
+def inside_plate(points, plate, carrier_z, bending, tolerance):
+    length, width, height = float(plate["length"]), float(plate["width"]), float(plate["height"])
+    center = np.array([plate["x"], plate["y"], plate["z"]], dtype=np.float64)
+    zone = BEND_ZONE * length
+    inside_y = np.abs(points[:, 1] - center[1]) <= width/2.0 - tolerance
+    offset_z = center[2] - carrier_z
+
+    # flat middle part
+    local_x = points[:, 0] - center[0]
+    inside = (np.abs(local_x) <= length/2.0 - zone) & (np.abs(points[:, 2] - center[2]) <= height/2.0 - tolerance)
+
+    for angle, sign in [(float(plate["bend_pos"]) if bending else 0.0, 1), (float(plate["bend_neg"]) if bending else 0.0, -1)]:
+        x0 = center[0] + sign * (length/2.0 - zone)
+        theta = angle * BEND_SCALE
+        if theta == 0:
+            d = points[:, 0] - x0
+            h = points[:, 2] - carrier_z
+        else:
+            # inverse of bend_vertices: polar coordinates around the centre of the bend
+            curvature = theta / length
+            radius = 1.0 / curvature
+            vx = points[:, 0] - x0
+            vz = points[:, 2] - (carrier_z + radius)
+            rho = np.hypot(vx, vz)
+            if radius > 0:
+                phi = np.arctan2(vx, -vz)
+                h = radius - rho
+            else:
+                phi = np.arctan2(-vx, vz)
+                h = radius + rho
+            d = phi / curvature
+        in_zone = (sign * d >= 0) & (sign * d <= zone - tolerance)
+        inside |= in_zone & (np.abs(h - offset_z) <= height/2.0 - tolerance)
+    return inside & inside_y
+
+
+# Lower and upper corners (plates, 3) of the straight parts of the plates: without their bent zones
+def straight_boxes(plates, bending):
+    zone = BEND_ZONE * plates["length"]
+    size = np.stack([plates["length"], plates["width"], plates["height"]], axis=-1)
+    center = np.stack([plates["x"], plates["y"], plates["z"]], axis=-1)
+    lower = center - size / 2.0
+    upper = center + size / 2.0
+    if bending:
+        lower[:, 0] += np.where(plates["bend_neg"] != 0, zone, 0.0)
+        upper[:, 0] -= np.where(plates["bend_pos"] != 0, zone, 0.0)
+    return lower, upper
+
+
+def plate_name(plates, row):
+    names = PLATE_TYPES + ["particle"]
+    return [names[plates["type"][row]], int(plates["layer"][row])]
+
+
+# Returns a list of issues (empty for a valid cell). Plates of the carriers in ignore_carriers
+# (e.g. a folded electrode, which is an intended defect) are not checked against other plates.
+def validate_plates(plates, housing_geometry, bending=True, tolerance=1e-6, ignore_carriers=()):
+    rows = np.flatnonzero(plates["visible"])
+    if len(rows) == 0:
+        return []
+    carrier_z = plates["z"][plates["carrier"]]
+    min_height = plates["height"][rows].min()
+    min_width = np.minimum(plates["width"][rows], plates["length"][rows]).min()
+    points = sample_points(plates[rows], carrier_z[rows], bending, min_height, min_width)
+    straight_lower, straight_upper = straight_boxes(plates[rows], bending)
+    lower = points.min(axis=1) + tolerance
+    upper = points.max(axis=1) - tolerance
+    issues = []
+
+    # Housing: all points inside the inner box
+    outer_height = housing_geometry["more_geometry"]["outer_height"]
+    wall = housing_geometry["wall_thickness"]
+    inner_lower = np.array([-(housing_geometry["outer_length"] - wall)/2.0, -(housing_geometry["outer_width"] - wall)/2.0, wall/2.0])
+    inner_upper = np.array([(housing_geometry["outer_length"] - wall)/2.0, (housing_geometry["outer_width"] - wall)/2.0, outer_height - wall/2.0])
+    for n in np.flatnonzero(np.any(lower < inner_lower, axis=1) | np.any(upper > inner_upper, axis=1)):
+        issues.append({"type": "housing_collision", "plate": plate_name(plates, rows[n])})
+
+    # Broad phase: sweep along z over the sorted bounding boxes
+    order = np.argsort(lower[:, 2])
+    ends = np.searchsorted(lower[order, 2], upper[order, 2], side="left")
+    ignored = np.isin(plates["carrier"][rows], list(ignore_carriers))
+    for a_pos, a in enumerate(order):
+        candidates = order[a_pos + 1:ends[a_pos]]
+        candidates = candidates[np.all((lower[candidates] < upper[a]) & (upper[candidates] > lower[a]), axis=1)]
+        for b in candidates:
+            ra, rb = rows[a], rows[b]
+            if plates["carrier"][ra] == plates["carrier"][rb] or ignored[a] or ignored[b]:
+                continue
+            # Narrow phase: straight parts exactly, then the points of the bent zones in both directions
+            straight = np.all(np.maximum(straight_lower[a], straight_lower[b]) < np.minimum(straight_upper[a], straight_upper[b]) - 2 * tolerance)
+            if straight or inside_plate(points[a], plates[rb], carrier_z[rb], bending, tolerance).any() or \
+               inside_plate(points[b], plates[ra], carrier_z[ra], bending, tolerance).any():
+                issues.append({"type": "overlap", "plates": [plate_name(plates, ra), plate_name(plates, rb)]})
+    return issues
@@ -0,0 +1,212 @@
+"""
+File: winding.py
+Description: Wound cells (jelly roll): electrode, coating and separator sheets along an Archimedean spiral
+
+Cylindrical cells are wound around a round mandrel, prismatic wound cells around a flat one (the spiral
+gets straight parts of flat_length). One turn consists of the sheets of WINDING_ORDER, their total
+thickness is the pitch of the spiral. Every turn has its own deviations: an additional radial gap
+(loose winding, it moves all following turns outwards) and an axial offset of anode and cathode
+(telescoping). Labels and export are the same as for stacked cells, with one entry per turn.
+"""
+
+import numpy as np
+
+from .config import PLATE_DTYPE, PLATE_TYPES
+from .export import MeshModeling
+from .mesh import box_mesh, can_mesh, merge_meshes
+
+# Sheets of one turn from the inside to the outside and the electrode they belong to
+WINDING_ORDER = [
+    ("lower_anode_coating", "anode"), ("anode", "anode"), ("upper_anode_coating", "anode"), ("separator", None),
+    ("lower_cathode_coating", "cathode"), ("cathode", "cathode"), ("upper_cathode_coating", "cathode"), ("separator", None),
+]
+
+
+# Segments of a full circle (multiple of 4), so that the chord error stays below tolerance
+def circle_segments(radius, tolerance):
+    max_phi = 2 * np.arccos(np.clip(1 - tolerance / radius, -1.0, 1.0))
+    return int(np.clip(np.ceil(2 * np.pi / max_phi / 4), 1, 64)) * 4
+
+
+# Angles of the cross sections of a spiral with turns turns and the x shift of its flat sides.
+# A flat winding has every station at 90 and 270 degrees twice, the straight part lies in between.
+def spiral_stations(turns, segments, flat_length):
+    k = np.arange(turns * segments + 1)
+    m = k % segments
+    side = np.where((m < segments // 4) | (m >= 3 * segments // 4), 1.0, -1.0)
+    if flat_length > 0:
+        counts = np.where((m == segments // 4) | (m == 3 * segments // 4), 2, 1)
+        first = np.cumsum(counts) - counts
+        k, side = np.repeat(k, counts), np.repeat(side, counts)
+        side[first[counts == 2]] *= -1
+    return 2 * np.pi * k / segments, side * flat_length / 2.0
+
+
+class WoundModeling(MeshModeling):
+    # Only the NumPy backend builds wound cells, the defects of the plate table do not exist for them
+
+    deviation_keys = ["radial_gap", "axial_offset"]
+
+    def update_parameters_from_ui(self, params):
+        super().update_parameters_from_ui(params)
+        defects = [name for name, defect in self.defects.items() if defect["probability"] > 0]
+        if defects:
+            raise ValueError(f"Defects are not supported for {self.cell_type} cells: {', '.join(defects)}")
+        self.flat_length = self.winding["flat_length"] if self.cell_type == "prismatic_wound" else 0.0
+        self.sheet_thickness = np.array([self.seperator_height if name == "separator" else getattr(self, name)["height"] for name, _ in WINDING_ORDER])
+        self.pitch = self.sheet_thickness.sum()
+        # mid plane of every sheet within one turn
+        self.sheet_offsets = np.cumsum(self.sheet_thickness) - self.sheet_thickness / 2.0
+        self.separator_width = self.anode["width"] + self.anode["max_overhang"] + 0.002
+        self.turn_segments = circle_segments(self.winding["core_radius"], self.bend_tolerance)
+        self.phi, self.shift = spiral_stations(self.winding["winding_turns"], self.turn_segments, self.flat_length)
+
+        # housing of the nominal winding (same for all cells of a config), the last turn ends one pitch further out
+        radius = self.winding["core_radius"] + self.pitch * (self.winding["winding_turns"] + 1)
+        self.housing_geometry = {
+            "shape": "cylinder" if self.cell_type == "cylindrical" else "box",
+            "outer_width": 2*radius + 0.008,
+            "outer_length": self.flat_length + 2*radius + 0.008,
+            "wall_thickness": 0.001
+        }
+        self.housing_geometry["more_geometry"] = {
+            "bevel_radius": 0.01,
+            "outer_height": self.separator_width + 0.002 + self.housing_geometry["wall_thickness"],
+        }
+
+    def reset_data(self):
+        super().reset_data()
+        self.data["separator"] = {
+            "separator_position": {"x": [], "y": [], "z": []},
+            "separator_layer": [],
+            "separator_dimensions": {"length": [], "width": [], "height": []},
+        }
+        # deviations per turn instead of per plate, no bending
+        for name in PLATE_TYPES + ["separator"]:
+            self.data[name][f"{name}_deviations"] = {key: [] for key in self.deviation_keys}
+            self.data[name].pop(f"{name}_bending", None)
+        self.data["winding"] = {"turns": [], "core_radius": [], "flat_length": [], "pitch": []}
+        self.data["cell_type"] = self.cell_type
+
+    def is_deterministic(self):
+        return super().is_deterministic() and self.winding["winding_gap"] == 0.0
+
+    # Draws the deviations of every turn, the plate table of stacked cells stays empty
+    def plan_cell(self, rng):
+        turns = self.winding["winding_turns"]
+        self.gaps = np.abs(rng.normal(0.0, self.winding["winding_gap"], size=turns))
+        self.axial = {
+            "anode": rng.normal(0.0, self.y_variation, size=turns),
+            "cathode": rng.normal(0.0, self.y_variation, size=turns),
+        }
+        self.overhang = rng.uniform(self.anode["min_overhang"], self.anode["max_overhang"]) if self.anode_overhang_bool else 0.0
+        self.plates = np.zeros(0, dtype=PLATE_DTYPE)
+        self.label_sheets()
+        self.label_housing()
+
+    # Mid radius of sheet k (index in WINDING_ORDER) at the angles phi
+    def sheet_radius(self, k, phi):
+        gaps = np.concatenate([[0.0], np.cumsum(self.gaps)])
+        gap = np.interp(phi, 2 * np.pi * np.arange(len(gaps)), gaps)
+        return self.winding["core_radius"] + self.sheet_offsets[k] + self.pitch * phi / (2 * np.pi) + gap
+
+    # Height of the mid plane of sheet k at the angles phi (offsets interpolated between the middles of the turns)
+    def sheet_z(self, k, phi):
+        z = np.full_like(phi, self.housing_geometry["more_geometry"]["outer_height"] / 2.0)
+        carrier = WINDING_ORDER[k][1]
+        if carrier is not None:
+            z += np.interp(phi, 2 * np.pi * (np.arange(self.winding["winding_turns"]) + 0.5), self.axial[carrier])
+        return z
+
+    # Axial width of sheet k, the anode with its coatings overhangs the cathode
+    def sheet_width(self, k):
+        name, carrier = WINDING_ORDER[k]
+        if carrier is None:
+            return self.separator_width
+        return getattr(self, name)["width"] + (self.overhang if carrier == "anode" else 0.0)
+
+    # Datentransfer für Labeling: one entry per turn, position of the sheet at the start of the turn
+    def label_sheets(self):
+        turns = self.winding["winding_turns"]
+        start = 2 * np.pi * np.arange(turns)
+        for k, (name, carrier) in enumerate(WINDING_ORDER):
+            radius = self.sheet_radius(k, self.phi)
+            x, y = radius * np.cos(self.phi) + self.shift, radius * np.sin(self.phi)
+            # arc length of every turn along the mid line of the sheet
+            turn = np.minimum((self.phi[:-1] / (2 * np.pi) + 1e-9).astype(int), turns - 1)
+            length = np.bincount(turn, np.hypot(np.diff(x), np.diff(y)), minlength=turns)
+
+            entry = self.data[name]
+            # number of the sheet entry (the turn for the electrodes, both separators one after the other)
+            entry[f"{name}_layer"] += list(range(len(entry[f"{name}_layer"]), len(entry[f"{name}_layer"]) + turns))
+            entry[f"{name}_position"]["x"] += (self.sheet_radius(k, start) + self.flat_length / 2.0).tolist()
+            entry[f"{name}_position"]["y"] += [0.0] * turns
+            entry[f"{name}_position"]["z"] += self.sheet_z(k, start).tolist()
+            entry[f"{name}_dimensions"]["length"] += length.tolist()
+            entry[f"{name}_dimensions"]["width"] += [self.sheet_width(k)] * turns
+            entry[f"{name}_dimensions"]["height"] += [float(self.sheet_thickness[k])] * turns
+            entry[f"{name}_deviations"]["radial_gap"] += self.gaps.tolist()
+            entry[f"{name}_deviations"]["axial_offset"] += (self.axial[carrier] if carrier else np.zeros(turns)).tolist()
+        self.data["anode"]["anode_overhang"] = [self.overhang] * turns
+        self.data["winding"] = {
+            "turns": [turns],
+            "core_radius": [self.winding["core_radius"]],
+            "flat_length": [self.flat_length],
+            "pitch": [self.pitch],
+        }
+
+    # Sheets cannot penetrate each other (the gaps only add space), only the housing is checked
+    def validate_cell(self):
+        height = self.housing_geometry["more_geometry"]["outer_height"]
+        wall = self.housing_geometry["wall_thickness"]
+        issues = []
+        for k, (name, _) in enumerate(WINDING_ORDER):
+            z = self.sheet_z(k, self.phi)
+            outer = self.sheet_radius(k, self.phi) + self.sheet_thickness[k] / 2.0
+            x, y = outer * np.cos(self.phi) + self.shift, outer * np.sin(self.phi)
+            if self.housing_geometry["shape"] == "cylinder":
+                outside = np.hypot(x, y) > (self.housing_geometry["outer_length"] - wall) / 2.0
+            else:
+                outside = (np.abs(x) > (self.housing_geometry["outer_length"] - wall) / 2.0) | (np.abs(y) > (self.housing_geometry["outer_width"] - wall) / 2.0)
+            outside |= (z - self.sheet_width(k) / 2.0 < wall / 2.0) | (z + self.sheet_width(k) / 2.0 > height - wall / 2.0)
+            for turn in np.unique((self.phi[outside] / (2 * np.pi)).astype(int)):
+                issues.append({"type": "housing_collision", "plate": [name, int(min(turn, self.winding["winding_turns"] - 1))]})
+        return issues
+
+    # Sheet k as a box along the spiral: x of the box follows the angle, y the axis and z the radius
+    def sheet_mesh(self, k):
+        n = len(self.phi)
+        vertices, faces = box_mesh((0.0, 0.0, 0.0), (1.0, self.sheet_width(k), self.sheet_thickness[k]), np.linspace(0, 1, n))
+        vertices = vertices.reshape(n, 4, 3)
+        radius = self.sheet_radius(k, self.phi)[:, None] + vertices[:, :, 2]
+        vertices = np.stack([
+            radius * np.cos(self.phi)[:, None] + self.shift[:, None],
+            radius * np.sin(self.phi)[:, None],
+            self.sheet_z(k, self.phi)[:, None] + vertices[:, :, 1],
+        ], axis=-1)
+        return vertices.reshape(-1, 3), faces
+
+    def build_cell(self, j):
+        for name in PLATE_TYPES + ["separator"]:
+            self.create_and_export_sheets(j, name)
+        self.create_and_export_housing(j)
+
+    def create_and_export_sheets(self, j, name):
+        if not self.export_inner_battery_bool:
+            return
+        with self.profiler.stage("plate_creation", cell=j, plate=name) as info:
+            sheets = [k for k, (sheet, _) in enumerate(WINDING_ORDER) if sheet == name]
+            vertices, faces = merge_meshes([self.sheet_mesh(k) for k in sheets])
+            info["objects"] = len(sheets)
+            info["vertices"] = len(vertices)
+
+        self.export_part(j, name, vertices, faces)
+
+    def create_and_export_housing(self, j):
+        if self.housing_geometry["shape"] == "box":
+            return super().create_and_export_housing(j)
+        if not self.export_housing_bool:
+            return
+        segments = circle_segments(self.housing_geometry["outer_length"] / 2.0, self.bend_tolerance)
+        vertices, faces = can_mesh(self.housing_geometry, segments)
+        self.export_part(j, "housing", vertices, faces)
@@ -2,398 +2,134 @@
 File: ui.py
 Author: F. Bisinger, E. Grenz, I. Schopf
 Date: 2024-04-29
-Description: BatteryCT Blender UI + Cell generation
+Description: BatteryCT Blender UI + Cell generation (Blender backend of batteryct)
 """
 
 import bpy
 import json
 import numpy as np
 import os
-from datetime import datetime
+import sys
+import time
+import traceback
 import bmesh
 
+# The Blender-independent part of the generation (sampling, stack planning, labeling, cache) is the
+# package batteryct next to this file
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from batteryct import BEND_ZONE, BEND_SCALE, DEFAULT_PARAMS, PLATE_TYPES, VALIDATION_MODES, CellModel
+
 # ------------------------------------------------------------------------
 #    Properties Battery Modeling
 # ------------------------------------------------------------------------
 
-class Modeling:
+class Modeling(CellModel):
+    # Blender backend of the cell model: creates, bends and exports the objects of a cell in the scene
     
     def __init__(self):
-        # All lengths in m (SI)
-        self.iterations = 1
-        self.seperator_height = 0.001 
-        self.anode_overhang_bool = True
-        self.export_inner_battery_bool = True
-        self.export_housing_bool = True
-        self.cut_housing_zy_bool = True
-        self.cut_housing_zx_bool = True
-        self.bending_bool = True
-        
-        self.max_angle = 15.0
-        self.min_angle = -15.0
-
-        self.x_variation = 1e-3
-        self.y_variation = 1e-3
-
-        # create time stamp for export
-        self.current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.export_folder = os.path.normpath("Model_" + self.current_datetime)
-        self.export_path = os.path.join(r"C:/", self.export_folder)
-
-        self.anode = {
-            "length": 0.1015,
-            "width": 0.050,
-            "height": 0.001, 
-            "length_tol": 0.000,
-            "max_overhang": 0.0068,
-            "min_overhang": 0.0023,
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": 10 , # integer
-            "color": (1, 0, 0, 1),  # red color (RGB values)
-        }
-
-        self.lower_anode_coating = {
-            "length": 0.1015,
-            "width": 0.050,
-            "height": 0.05,
-            "length_tol": 0.000,
-            "max_overhang": self.anode["max_overhang"],
-            "min_overhang": self.anode["min_overhang"],
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"],
-            "color": (0, 0, 0, 1),  # black color (RGB values)
-        }
-
-        self.upper_anode_coating = {
-            "length": 0.1015,
-            "width": 0.050,
-            "height": 0.05,
-            "length_tol": 0.000,
-            "max_overhang": self.anode["max_overhang"],
-            "min_overhang": self.anode["min_overhang"],
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"],
-            "color": (0, 0, 0, 1),  # black color (RGB values)
-        }
-
-        self.cathode = {
-            "length": 0.1015,
-            "width": 0.050,
-            "height": 0.001, 
-            "length_tol": 0.000,
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"]-1, # integer
-            "color": (0, 1, 0, 1),  # green color (RGB values)
-        }
-
-        self.lower_cathode_coating = {
-            "length": 0.1015,
-            "width": 0.050,
-            "height": 0.001,
-            "length_tol": 0.000,
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"]-1,
-            "color": (0, 0, 1, 1),  # blue color (RGB values)
-        }
-
-        self.upper_cathode_coating = {
-            "length": 0.1015,
-            "width": 0.050,
-            "height": 0.001,
-            "length_tol": 0.000,
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"]-1,
-            "color": (0, 0, 1, 1),  # blue color (RGB values)
-        }
-
-        # END VARIABLE PARAMETERSET
-
-        self.housing_geometry = {
-            # battery sizes
-            "outer_width": (self.anode["width"] + self.y_variation*2 + 0.008), 
-            "outer_length": (self.anode["length"] + self.anode["max_overhang"] + self.x_variation*2 + 0.008),  
-            "wall_thickness": 0.001
-        }
-
-        self.anode["overhang"] = {
-         # GIBT EINE ZUFÄLLIGE GLEITKOMMAZAHL IN DIESEM BEREICH ZURÜCK
-         "anode_overhang": np.random.uniform(self.anode["min_overhang"], self.anode["max_overhang"])
-        }
-
-        # Formula for parametric positioning
-        self.anode["position"] = {
-            "z_position": ((self.anode["height"]/2.0) + (self.lower_anode_coating["height"])+self.seperator_height + (self.housing_geometry["wall_thickness"]/2.0)),
-            "z_distance": self.anode["height"]+self.cathode["height"]+2*self.seperator_height+self.upper_anode_coating["height"]+self.lower_anode_coating["height"]+self.upper_cathode_coating["height"]+self.lower_cathode_coating["height"]
-        }
-
-        self.lower_anode_coating["position"] = {
-            "z_position": self.anode["position"]["z_position"]-((self.anode["height"] + self.lower_anode_coating["height"]) / 2.0),
-            "z_distance": self.anode["position"]["z_distance"]
-        }
-
-        self.upper_anode_coating["position"] = {
-            "z_position": self.anode["position"]["z_position"]+((self.anode["height"] + self.upper_anode_coating["height"]) / 2.0),
-            "z_distance": self.anode["position"]["z_distance"]
-        }
-
-        self.cathode["position"] = {
-            "z_position": self.anode["position"]["z_position"]+(((self.anode["height"]+self.cathode["height"])/2)+self.upper_anode_coating["height"]+self.lower_cathode_coating["height"]+self.seperator_height),
-            "z_distance": self.anode["height"]+self.cathode["height"]+2*self.seperator_height+self.upper_anode_coating["height"]+self.lower_anode_coating["height"]+self.upper_cathode_coating["height"]+self.lower_cathode_coating["height"]
-        }
+        super().__init__()
 
-        self.lower_cathode_coating["position"] = {
-            "z_position": (self.cathode["position"]["z_position"]-((self.cathode["height"]+self.lower_cathode_coating["height"])/2.0)),
-            "z_distance": self.cathode["position"]["z_distance"]
-        }
+        print("PARAMS INIT DONE")
 
-        self.upper_cathode_coating["position"] = {
-            "z_position": (self.cathode["position"]["z_position"]+((self.cathode["height"]+self.lower_cathode_coating["height"])/2.0)),
-            "z_distance": self.cathode["position"]["z_distance"]
-        }
 
-        self.housing_geometry["more_geometry"] = {
-            "bevel_radius": 1,
-            "outer_height": (self.anode["amount"]*self.anode["height"]) + (self.cathode["amount"]*self.cathode["height"]) + (self.lower_anode_coating["amount"]*self.lower_anode_coating["height"]) + (self.upper_anode_coating["amount"]*self.upper_anode_coating["height"]) + (self.lower_cathode_coating["amount"]*self.lower_cathode_coating["height"]) + (self.upper_cathode_coating["amount"]*self.upper_cathode_coating["height"]) + (2*self.anode["amount"]*self.seperator_height)+(self.housing_geometry["wall_thickness"]), 
-        }
-        
-        self.data = {
-            "anode": {
-                "anode_position": {"x": [], "y": [], "z": []},
-                "anode_dimensions": {"length": [], "width": [], "height": []},
-                "anode_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []},
-                "anode_bending": {"x+": [], "x-":[]}
-            },
-            "cathode": {
-                "cathode_position": {"x": [], "y": [], "z": []},
-                "cathode_dimensions": {"length": [], "width": [], "height": []},
-                "cathode_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []},
-                "cathode_bending": {"x+": [], "x-":[]}
-            },
-            "housing": {
-                "housing_position": {"x": [], "y": [], "z": []},
-                "housing_dimensions": {"outer_length": [], "outer_width": [], "outer_height": [], "inner_length": [],"inner_width": [],"inner_height": []}
-            },
-            "upper_cathode_coating": {
-                "upper_cathode_coating_position": {"x": [], "y": [], "z": []},
-                "upper_cathode_coating_dimensions": {"length": [], "width": [], "height": []},
-                "upper_cathode_coating_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []}
-            },
-            "lower_cathode_coating": {
-                "lower_cathode_coating_position": {"x": [], "y": [], "z": []},
-                "lower_cathode_coating_dimensions": {"length": [], "width": [], "height": []},
-                "lower_cathode_coating_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []}
-            },
-            "upper_anode_coating": {
-                "upper_anode_coating_position": {"x": [], "y": [], "z": []},
-                "upper_anode_coating_dimensions": {"length": [], "width": [], "height": []},
-                "upper_anode_coating_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []}
-            },
-            "lower_anode_coating": {
-                "lower_anode_coating_position": {"x": [], "y": [], "z": []},
-                "lower_anode_coating_dimensions": {"length": [], "width": [], "height": []},
-                "lower_anode_coating_deviations": {"length": [],"width": [], "height": [], "x_position": [], "y_position": []}
-            }
-        }
-        
+    ######################################## FUNCTIONS START ########################################
+    def build_cell(self, j):
+        # SELECT AND DELETE ALL BEFORE CREATING NEW BATTERY
+        with self.profiler.stage("scene_reset", cell=j) as info:
+            info["objects"] = len(bpy.data.objects)
+            if bpy.context.selected_objects:
+                bpy.ops.object.select_all(action='DESELECT')
+            bpy.ops.object.select_all(action='SELECT')
+            bpy.ops.object.select_by_type(type='MESH')
+            bpy.ops.object.delete()
+            self.delete_empty_objects()
         
-                    
+        # CREATE NEW INNER BATTERY GEOMETRY
+        self.create_and_export_inner_battery(j, self.anode,"anode")
+        self.create_and_export_inner_battery(j, self.lower_anode_coating, "lower_anode_coating")
+        self.create_and_export_inner_battery(j, self.upper_anode_coating, "upper_anode_coating")
+        self.create_and_export_inner_battery(j, self.cathode,"cathode")
+        self.create_and_export_inner_battery(j, self.lower_cathode_coating, "lower_cathode_coating")
+        self.create_and_export_inner_battery(j, self.upper_cathode_coating, "upper_cathode_coating")
+        self.create_and_export_inner_battery(j, self.particle, "particle")
         
-        print("PARAMS INIT DONE")
+        # CREATE HOUSING
+        self.create_and_export_housing(self.housing_geometry, j)
 
+    def finish_cell(self, j):
+        # VISUALISATION OF INTERSECTIONS OF THE HOUSING
+        self.cut_housing_zy(self.housing_geometry, j)
+        self.cut_housing_zx(self.housing_geometry, j)
 
-    ######################################## FUNCTIONS START ########################################
     def create_and_export_inner_battery(self, j, parameters, name):
-            
-        for i in range(parameters["amount"]):
-
-            deviations = self.generate_deviations(parameters, self.x_variation, self.y_variation)
-            
-            # Adjust x and y position if upper or lower anode/cathode coating
-            if parameters in [self.lower_anode_coating, self.upper_anode_coating]:
-                x_position = self.data["anode"]["anode_position"]["x"][i]  # Get x position from the anode position list
-                y_position = self.data["anode"]["anode_position"]["y"][i]  # Get y position from the anode position list
-            elif parameters in [self.lower_cathode_coating, self.upper_cathode_coating]:
-                x_position = self.data["cathode"]["cathode_position"]["x"][i]  # Get x position from the cathode position list
-                y_position = self.data["cathode"]["cathode_position"]["y"][i]  # Get y position from the cathode position list
-            else:
-                # Für den Fall, dass es eine Anode oder Kathode ist wird eine neue Position generiert
-                x_position = deviations["x_position"]
-                y_position = deviations["y_position"]
-            
-            z_position = parameters["position"]["z_position"] + i * (parameters["position"]["z_distance"])
-
-            dimensions = self.generate_dimensions(name, parameters, deviations)
-            actual_bending_plus = deviations["bending"]["x+"]
-            actual_bending_minus = deviations["bending"]["x-"]
-                        
-            bpy.ops.mesh.primitive_cube_add(size=1, enter_editmode=False, align='WORLD', location=(x_position, y_position, z_position))
-            obj = bpy.context.object
-            obj.name = f"{name}_{i}" 
-            obj_name = str(obj.name)    
-
-            # Positionsübergabe: Ziel: Position_Blech == Position_Beschichtung (x und y), z ist individuell!
-            # Datentransfer für Labeling mit .json-file
-
-            if name == "anode":
-                    self.data["anode"]["anode_position"]["x"].append(x_position)
-                    self.data["anode"]["anode_position"]["y"].append(y_position)
-                    self.data["anode"]["anode_position"]["z"].append(z_position)
-                    
-                    self.data["anode"]["anode_dimensions"]["length"].append(dimensions["length"])
-                    self.data["anode"]["anode_dimensions"]["width"].append(dimensions["width"])
-                    self.data["anode"]["anode_dimensions"]["height"].append(dimensions["height"])
-                    
-                    self.data["anode"]["anode_deviations"]["length"].append(deviations["length"])
-                    self.data["anode"]["anode_deviations"]["width"].append(deviations["width"])
-                    self.data["anode"]["anode_deviations"]["height"].append(deviations["height"])
-                    self.data["anode"]["anode_deviations"]["x_position"].append(deviations["x_position"])
-                    self.data["anode"]["anode_deviations"]["y_position"].append(deviations["y_position"])
-                    self.data["anode"]["anode_bending"]["x+"].append(actual_bending_plus)
-                    self.data["anode"]["anode_bending"]["x-"].append(actual_bending_minus)
-                    
-            elif name == "cathode":
-                    self.data["cathode"]["cathode_position"]["x"].append(x_position)
-                    self.data["cathode"]["cathode_position"]["y"].append(y_position)
-                    self.data["cathode"]["cathode_position"]["z"].append(z_position)
-                    
-                    self.data["cathode"]["cathode_dimensions"]["length"].append(dimensions["length"])
-                    self.data["cathode"]["cathode_dimensions"]["width"].append(dimensions["width"])
-                    self.data["cathode"]["cathode_dimensions"]["height"].append(dimensions["height"])
-                    
-                    self.data["cathode"]["cathode_deviations"]["length"].append(deviations["length"])
-                    self.data["cathode"]["cathode_deviations"]["width"].append(deviations["width"])
-                    self.data["cathode"]["cathode_deviations"]["height"].append(deviations["height"])
-                    self.data["cathode"]["cathode_deviations"]["x_position"].append(deviations["x_position"])
-                    self.data["cathode"]["cathode_deviations"]["y_position"].append(deviations["y_position"])
-                    self.data["cathode"]["cathode_bending"]["x+"].append(actual_bending_plus)
-                    self.data["cathode"]["cathode_bending"]["x-"].append(actual_bending_minus)
-   
-            elif name == "upper_anode_coating":
-                    self.data["upper_anode_coating"]["upper_anode_coating_position"]["x"].append(x_position)
-                    self.data["upper_anode_coating"]["upper_anode_coating_position"]["y"].append(y_position)
-                    self.data["upper_anode_coating"]["upper_anode_coating_position"]["z"].append(z_position)
-                    
-                    self.data["upper_anode_coating"]["upper_anode_coating_dimensions"]["length"].append(dimensions["length"])
-                    self.data["upper_anode_coating"]["upper_anode_coating_dimensions"]["width"].append(dimensions["width"])
-                    self.data["upper_anode_coating"]["upper_anode_coating_dimensions"]["height"].append(dimensions["height"])
-                    
-                    self.data["upper_anode_coating"]["upper_anode_coating_deviations"]["length"].append(deviations["length"])
-                    self.data["upper_anode_coating"]["upper_anode_coating_deviations"]["width"].append(deviations["width"])
-                    self.data["upper_anode_coating"]["upper_anode_coating_deviations"]["height"].append(deviations["height"])
-                    self.data["upper_anode_coating"]["upper_anode_coating_deviations"]["x_position"].append(deviations["x_position"])
-                    self.data["upper_anode_coating"]["upper_anode_coating_deviations"]["y_position"].append(deviations["y_position"])           
-                    
-            elif name == "lower_anode_coating":
-                    self.data["lower_anode_coating"]["lower_anode_coating_position"]["x"].append(x_position)
-                    self.data["lower_anode_coating"]["lower_anode_coating_position"]["y"].append(y_position)
-                    self.data["lower_anode_coating"]["lower_anode_coating_position"]["z"].append(z_position)
-                    
-                    self.data["lower_anode_coating"]["lower_anode_coating_dimensions"]["length"].append(dimensions["length"])
-                    self.data["lower_anode_coating"]["lower_anode_coating_dimensions"]["width"].append(dimensions["width"])
-                    self.data["lower_anode_coating"]["lower_anode_coating_dimensions"]["height"].append(dimensions["height"])
-                    
-                    self.data["lower_anode_coating"]["lower_anode_coating_deviations"]["length"].append(deviations["length"])
-                    self.data["lower_anode_coating"]["lower_anode_coating_deviations"]["width"].append(deviations["width"])
-                    self.data["lower_anode_coating"]["lower_anode_coating_deviations"]["height"].append(deviations["height"])
-                    self.data["lower_anode_coating"]["lower_anode_coating_deviations"]["x_position"].append(deviations["x_position"])
-                    self.data["lower_anode_coating"]["lower_anode_coating_deviations"]["y_position"].append(deviations["y_position"])
-                    
-            elif name == "upper_cathode_coating":
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_position"]["x"].append(x_position)
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_position"]["y"].append(y_position)
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_position"]["z"].append(z_position)
-                    
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_dimensions"]["length"].append(dimensions["length"])
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_dimensions"]["width"].append(dimensions["width"])
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_dimensions"]["height"].append(dimensions["height"])
-                    
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_deviations"]["length"].append(deviations["length"])
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_deviations"]["width"].append(deviations["width"])
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_deviations"]["height"].append(deviations["height"])
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_deviations"]["x_position"].append(deviations["x_position"])
-                    self.data["upper_cathode_coating"]["upper_cathode_coating_deviations"]["y_position"].append(deviations["y_position"])           
-                    
-            elif name == "lower_cathode_coating":
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_position"]["x"].append(x_position)
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_position"]["y"].append(y_position)
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_position"]["z"].append(z_position)
-                    
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_dimensions"]["length"].append(dimensions["length"])
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_dimensions"]["width"].append(dimensions["width"])
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_dimensions"]["height"].append(dimensions["height"])
-                    
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_deviations"]["length"].append(deviations["length"])
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_deviations"]["width"].append(deviations["width"])
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_deviations"]["height"].append(deviations["height"])
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_deviations"]["x_position"].append(deviations["x_position"])
-                    self.data["lower_cathode_coating"]["lower_cathode_coating_deviations"]["y_position"].append(deviations["y_position"])
-            else:
-                # Sicherung im Zustandsautomaten
-                print("Error: No objects found")
-            
-            
-            obj.scale = (dimensions["length"], dimensions["width"], dimensions["height"])
-            self.bend_object(obj_name, parameters, dimensions,  name, i)
-         
-            
-            # Set color of the object
-            obj.active_material = bpy.data.materials.new(name=f"Color_{j}_{i}")
-            obj.active_material.diffuse_color = parameters["color"]
+        
+        # Positionsübergabe: Position_Blech == Position_Beschichtung (x und y) ist bereits in der Plattentabelle enthalten
+        plates = self.plates[(self.plates["type"] == (PLATE_TYPES + ["particle"]).index(name)) & self.plates["visible"]]
+        if len(plates) == 0:
+            return
+        with self.profiler.stage("plate_creation", cell=j, plate=name) as info:
+            for plate in plates:
+                i = int(plate["layer"])
+                            
+                bpy.ops.mesh.primitive_cube_add(size=1, enter_editmode=False, align='WORLD', location=(float(plate["x"]), float(plate["y"]), float(plate["z"])))
+                obj = bpy.context.object
+                obj.name = f"{name}_{i}" 
+                obj_name = str(obj.name)    
+                
+                obj.scale = (float(plate["length"]), float(plate["width"]), float(plate["height"]))
+                with self.profiler.stage("bending", cell=j, plate=name, layer=i) as bending_info:
+                    self.bend_object(obj_name, plate)
+                    bending_info["vertices"] = len(obj.data.vertices)
+             
+                
+                # Set color of the object
+                obj.active_material = bpy.data.materials.new(name=f"Color_{j}_{i}")
+                obj.active_material.diffuse_color = parameters["color"]
 
-            bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY', center='BOUNDS')
-            # Objekt bennenen --> Relvant für die Auswahl des Objekts!
+                bpy.ops.object.origin_set(type='ORIGIN_GEOMETRY', center='BOUNDS')
+                # Objekt bennenen --> Relvant für die Auswahl des Objekts!
 
+            info["objects"] = len(plates)
 
         # Export sequence
-        self.export_inner_battery(name, i, j)
+        with self.profiler.stage("stl_export", cell=j, plate=name):
+            self.export_inner_battery(name, i, j)
 
     # Funktion zum Biegen der Objekte    
-    def bend_object(self, obj_name, type, dimensions, name, i):        
-        if self.bending_bool == True:
-            # Bending of elements
-            
-            if name == "anode" or name == "lower_anode_coating" or name == "upper_anode_coating":
-                start_pos_z = self.data["anode"]["anode_position"]["z"][i]
-                bending_x_pos = self.data["anode"]["anode_bending"]["x+"][i]
-                bending_x_neg = self.data["anode"]["anode_bending"]["x-"][i]
-            elif name == "cathode" or name == "lower_cathode_coating" or name == "upper_cathode_coating":
-                start_pos_z = self.data["cathode"]["cathode_position"]["z"][i]
-                bending_x_pos = self.data["cathode"]["cathode_bending"]["x+"][i]
-                bending_x_neg = self.data["cathode"]["cathode_bending"]["x-"][i]
-            else:
-                print("Error: No bending positioning possible")                 
-               
+    def bend_object(self, obj_name, plate):        
+        # without bending the table has no angles except the end of a folded electrode
+        if plate["bend_pos"] != 0 or plate["bend_neg"] != 0:
+            # Bending of elements (coatings are bent around the anode/cathode they belong to)
+            start_pos_z = float(self.plates["z"][plate["carrier"]])
+            bending_x_pos = float(plate["bend_pos"])
+            bending_x_neg = float(plate["bend_neg"])
+            dimensions = {"length": float(plate["length"])}
                
-            obj = bpy.context.active_object
-            mesh = obj.data
-            
             # Get the active mesh object
+            obj = bpy.context.active_object
             mesh = obj.data
 
+            #Relative Positionen Bending
+            relBendingposXpos=1 - BEND_ZONE
+            relBendingposXneg=BEND_ZONE
+
             # Create a BMesh from the mesh
             bm = bmesh.new()
             bm.from_mesh(mesh)
 
-            # Get edges to cut, here it's all edges of the mesh
-            edges = bm.edges
-
-            # Perform the loop cut
-            bmesh.ops.subdivide_edges(bm, edges=edges, cuts=50, use_grid_fill=True)
+            # Loop cuts along x only in the bent zones, the flat part stays one face
+            segments_xpos = self.bend_segments(bending_x_pos, dimensions["length"])
+            segments_xneg = self.bend_segments(bending_x_neg, dimensions["length"])
+            cuts = np.concatenate([np.linspace(0, relBendingposXneg, segments_xneg + 1)[1:], np.linspace(relBendingposXpos, 1, segments_xpos + 1)[:-1]])
+            for relative_x in cuts:
+                # unit cube: local x from -0.5 to 0.5
+                geom = bm.verts[:] + bm.edges[:] + bm.faces[:]
+                bmesh.ops.bisect_plane(bm, geom=geom, plane_co=(relative_x - 0.5, 0, 0), plane_no=(1, 0, 0))
 
             # Update the original mesh with the new data
             bm.to_mesh(mesh)
             bm.free()
             mesh.update()
-
-            #Relative Positionen Bending
-            relBendingposXpos=0.97
-            relBendingposXneg=0.03
             ########## Vertex X+ ####################################################
 
             # Create a vertex group X+ Bending
@@ -401,10 +137,9 @@ class Modeling:
 
             # Add vertices to the vertex group based on relative position
             for v in mesh.vertices:
-                # Transform the vertex coordinate into world space
-                world_vertex_co = obj.matrix_world @ v.co
-                # Calculate the relative x position (from 0 to 1)
-                relative_x = (world_vertex_co.x - obj.bound_box[0][0]) / (obj.bound_box[7][0] - obj.bound_box[0][0])
+                # Calculate the relative x position (from 0 to 1) in object space, like the bounding box
+                # (the scale of the cube is not applied, in world space no vertex lies in a bent zone)
+                relative_x = (v.co.x - obj.bound_box[0][0]) / (obj.bound_box[7][0] - obj.bound_box[0][0])
                 # Check if the relative x-coordinate is between 0.8 and 1 (80% to 100% of the object's length)
                 if relBendingposXpos <= relative_x <= 1:
                     vertex_group.add([v.index], 1.0, 'ADD')
@@ -416,10 +151,9 @@ class Modeling:
 
             # Add vertices to the vertex group based on relative position
             for v in mesh.vertices:
-                # Transform the vertex coordinate into world space
-                world_vertex_co = obj.matrix_world @ v.co
-                # Calculate the relative x position (from 0 to 1)
-                relative_x = (world_vertex_co.x - obj.bound_box[0][0]) / (obj.bound_box[7][0] - obj.bound_box[0][0])
+                # Calculate the relative x position (from 0 to 1) in object space, like the bounding box
+                # (the scale of the cube is not applied, in world space no vertex lies in a bent zone)
+                relative_x = (v.co.x - obj.bound_box[0][0]) / (obj.bound_box[7][0] - obj.bound_box[0][0])
                 # Check if the relative x-coordinate is between 0 and 0.2 (0% to 20% of the object's length)
                 if 0 <= relative_x <= relBendingposXneg:
                     vertex_group.add([v.index], 1.0, 'ADD')
@@ -427,8 +161,8 @@ class Modeling:
             # Switch back to Object Mode
             bpy.ops.object.mode_set(mode='OBJECT')
 
-            # Calculate the start position of the vertex group in world space
-            start_pos_x = (obj.bound_box[0][0] * dimensions["length"]) + relBendingposXpos * ((obj.bound_box[7][0] * dimensions["length"]) - (obj.bound_box[0][0] * dimensions["length"]))
+            # Calculate the start position of the vertex group in world space (the cube is centred on the plate x)
+            start_pos_x = float(plate["x"]) + (obj.bound_box[0][0] * dimensions["length"]) + relBendingposXpos * ((obj.bound_box[7][0] * dimensions["length"]) - (obj.bound_box[0][0] * dimensions["length"]))
 
             # Create an empty at the start position of the vertex group
             bpy.ops.object.empty_add(type='PLAIN_AXES', align='WORLD', location=(start_pos_x, 0, start_pos_z))
@@ -439,7 +173,7 @@ class Modeling:
                 
 
             # Calculate the start position of the vertex group neg in world space
-            start_pos_xneg = (obj.bound_box[0][0] * dimensions["length"]) + relBendingposXneg * ((obj.bound_box[7][0] * dimensions["length"]) - (obj.bound_box[0][0] * dimensions["length"]))
+            start_pos_xneg = float(plate["x"]) + (obj.bound_box[0][0] * dimensions["length"]) + relBendingposXneg * ((obj.bound_box[7][0] * dimensions["length"]) - (obj.bound_box[0][0] * dimensions["length"]))
 
             # Create an empty at the start position of the vertex group
             bpy.ops.object.empty_add(type='PLAIN_AXES', align='WORLD', location=(start_pos_xneg, 0, start_pos_z))
@@ -460,7 +194,7 @@ class Modeling:
             modifier.vertex_group = 'My Vertex Group'
 
             # Set the angle of bending (in radians)            
-            bend_angle = bending_x_pos * (np.pi)/180 * 360/45  # degrees in radians + scaling
+            bend_angle = bending_x_pos * BEND_SCALE  # degrees in radians + scaling
             modifier.angle = bend_angle
 
             ########## Bending X- ####################################################
@@ -474,23 +208,9 @@ class Modeling:
             # Assign the vertex group to the modifier
             modifier.vertex_group = 'My Vertex Group Xneg'
             # Set the angle of bending (in radians)
-            bend_angle2 = bending_x_neg * (np.pi)/180 * 360/45  #degrees in radians + scaling
+            bend_angle2 = bending_x_neg * BEND_SCALE  #degrees in radians + scaling
             modifier.angle = bend_angle2
             
-            
-            ########## Decimate Modifier ####################################################
-
-            # Add Decimate Modifier to reduce the number of vertices
-            decimate_modifier = obj.modifiers.new(name="Decimate", type='DECIMATE')
-            decimate_modifier.ratio = 0.1  # Adjust the ratio as needed (0.0 to 1.0)
-
-            # Apply the Decimate Modifier
-            bpy.context.view_layer.objects.active = obj
-            bpy.ops.object.modifier_apply(modifier="Decimate")
-            
-            
-            
-                    
     # Funktion, um alle leeren Objekte im Raum vor neuem Programausführen löscht                
     def delete_empty_objects(self):
         # Filtere alle leeren Objekte heraus
@@ -544,44 +264,6 @@ class Modeling:
             else:
                 print("No objects selected for export.")
 
-    def generate_deviations(self, parameters, x_variation, y_variation):
-        deviations = {
-        # loc heißt Mittelwert und scale heißt Standardabweichung
-            "length": np.random.normal(loc=0.0, scale=parameters["length_tol"]), # aktuell = 0 --> berücksichtigen bei Positionierung noch erforderlich!! 
-            "width": np.random.normal(loc=0.0, scale=parameters["width_tol"]),   # aktuell = 0 --> berücksichtigen bei Positionierung noch erforderlich!! 
-            "height": np.random.normal(loc=0.0, scale=parameters["height_tol"]), # aktuell = 0 --> berücksichtigen bei Positionierung noch erforderlich!! 
-            "x_position": np.random.normal(loc=0.0, scale=x_variation),
-            "y_position": np.random.normal(loc=0.0, scale=y_variation),
-            "bending":
-                {
-                    "x+": np.random.uniform(self.min_angle, self.max_angle),
-                    "x-": np.random.uniform(self.min_angle, self.max_angle)
-                } 
-        }
-        return deviations
-
-    def generate_dimensions(self, name, parameters, deviations):
-        dimensions = {}
-        
-        if self.anode_overhang_bool == True:
-            if name in ["anode", "lower_anode_coating", "upper_anode_coating"]:
-                dimensions["length"] = max(0.001, parameters["length"] + deviations["length"] + self.anode["overhang"]["anode_overhang"])
-            else:
-                dimensions["length"] = max(0.001, parameters["length"] + deviations["length"])
-        else:
-            dimensions["length"] = max(0.001, parameters["length"] + deviations["length"])
-        
-        dimensions["width"] = max(0.001, parameters["width"] + deviations["width"])
-        dimensions["height"] = max(0.001, parameters["height"] + deviations["height"])
-        return dimensions
-
-    def write_data_to_file(self, data, filename):
-        self.data['Comment:'] = "All dimensions and deviations refer to the center point of the object.\nThe characteristic values for each element (1 to n) can be found below."
-        full_path = os.path.join(self.export_path, filename)        
-        with open(full_path, 'w') as file:
-            json.dump(data, file, indent=4)
-            
-
     def create_and_export_housing(self, housing_geometry, jj):
         # CREATE HOUSING
         # Create outer block
@@ -618,28 +300,19 @@ class Modeling:
         bpy.ops.object.mode_set(mode='OBJECT')
 
         # Apply boolean modifier to subtract inner block from outer block
-        bpy.context.view_layer.objects.active = outer_block
-        modifier = outer_block.modifiers.new(name="Boolean", type='BOOLEAN')
-        modifier.object = inner_block
-        modifier.operation = 'DIFFERENCE'
-        bpy.ops.object.modifier_apply(modifier=modifier.name)
+        with self.profiler.stage("housing_boolean", cell=jj) as info:
+            bpy.context.view_layer.objects.active = outer_block
+            modifier = outer_block.modifiers.new(name="Boolean", type='BOOLEAN')
+            modifier.object = inner_block
+            modifier.operation = 'DIFFERENCE'
+            bpy.ops.object.modifier_apply(modifier=modifier.name)
+            info["vertices"] = len(outer_block.data.vertices)
 
         # Remove inner block (we only needed it for the boolean operation)
         bpy.data.objects.remove(inner_block)
         
         # EXPORT HOUSING
         self.export_housing(jj)
-        
-        self.data["housing"]["housing_dimensions"]["outer_length"].append(housing_geometry["outer_length"])
-        self.data["housing"]["housing_dimensions"]["outer_width"].append(housing_geometry["outer_width"])
-        self.data["housing"]["housing_dimensions"]["outer_height"].append(housing_geometry["more_geometry"]["outer_height"])
-        self.data["housing"]["housing_dimensions"]["inner_length"].append(inner_length)
-        self.data["housing"]["housing_dimensions"]["inner_width"].append(inner_width)
-        self.data["housing"]["housing_dimensions"]["inner_height"].append(inner_height)
-        
-        self.data["housing"]["housing_position"]["x"].append(x_loc)
-        self.data["housing"]["housing_position"]["y"].append(y_loc)
-        self.data["housing"]["housing_position"]["z"].append(z_loc)
 
         
     def export_housing(self, jj):
@@ -670,12 +343,14 @@ class Modeling:
             ########## Decimate Modifier ####################################################
 
             # Add Decimate Modifier to reduce the number of vertices
-            decimate_modifier = obj.modifiers.new(name="Decimate", type='DECIMATE')
-            decimate_modifier.ratio = 0.1  # Adjust the ratio as needed (0.0 to 1.0)
+            with self.profiler.stage("decimation", cell=jj, plate="housing") as info:
+                decimate_modifier = obj.modifiers.new(name="Decimate", type='DECIMATE')
+                decimate_modifier.ratio = 0.1  # Adjust the ratio as needed (0.0 to 1.0)
 
-            # Apply the Decimate Modifier
-            bpy.context.view_layer.objects.active = obj
-            bpy.ops.object.modifier_apply(modifier="Decimate")
+                # Apply the Decimate Modifier
+                bpy.context.view_layer.objects.active = obj
+                bpy.ops.object.modifier_apply(modifier="Decimate")
+                info["vertices"] = len(obj.data.vertices)
             
             # Set export file path
             file_path = os.path.join(self.export_path, f"{jj+1}_{self.current_datetime}_housing.stl")
@@ -683,7 +358,8 @@ class Modeling:
             # Export the combined object as .stl file
             # GANZ WICHTIG: Letzter Teil im Code: use_selection=True
             # QUELLE: https://docs.blender.org/api/current/bpy.ops.export_scene.html
-            bpy.ops.export_mesh.stl(filepath=file_path, check_existing=False, filter_glob="*.stl", ascii=False, use_selection=True)        
+            with self.profiler.stage("stl_export", cell=jj, plate="housing"):
+                bpy.ops.export_mesh.stl(filepath=file_path, check_existing=False, filter_glob="*.stl", ascii=False, use_selection=True)        
             # Deselect all objects after export
             bpy.ops.object.select_all(action='DESELECT')
             print(f"[{self.current_datetime}] Export of housing_{jj+1} was successful, export path:\n{self.export_path}\n")
@@ -707,10 +383,11 @@ class Modeling:
                 bpy.context.view_layer.objects.active = outer_block
 
                 # Apply boolean modifier to subtract cut_block from outer block
-                modifier = outer_block.modifiers.new(name="Boolean", type='BOOLEAN')
-                modifier.object = cut_block
-                modifier.operation = 'DIFFERENCE'
-                bpy.ops.object.modifier_apply(modifier=modifier.name)
+                with self.profiler.stage("housing_boolean", cell=jj, cut=True):
+                    modifier = outer_block.modifiers.new(name="Boolean", type='BOOLEAN')
+                    modifier.object = cut_block
+                    modifier.operation = 'DIFFERENCE'
+                    bpy.ops.object.modifier_apply(modifier=modifier.name)
 
                 # Remove cut_block (we only needed it for the boolean operation)
                 bpy.data.objects.remove(cut_block)
@@ -734,192 +411,17 @@ class Modeling:
                 bpy.context.view_layer.objects.active = outer_block
 
                 # Apply boolean modifier to subtract cut_block from outer block
-                modifier = outer_block.modifiers.new(name="Boolean", type='BOOLEAN')
-                modifier.object = cut_block
-                modifier.operation = 'DIFFERENCE'
-                bpy.ops.object.modifier_apply(modifier=modifier.name)
+                with self.profiler.stage("housing_boolean", cell=jj, cut=True):
+                    modifier = outer_block.modifiers.new(name="Boolean", type='BOOLEAN')
+                    modifier.object = cut_block
+                    modifier.operation = 'DIFFERENCE'
+                    bpy.ops.object.modifier_apply(modifier=modifier.name)
 
                 # Remove cut_block (we only needed it for the boolean operation)
                 bpy.data.objects.remove(cut_block)
             else:
                 print("outer_block not found!")
 
-    def generate_cells(self):
-        ######################################## GENERATING START ########################################
-        for j in range(self.iterations):
-            
-            # SELECT AND DELETE ALL BEFORE CREATING NEW BATTERY
-            if bpy.context.selected_objects:
-                bpy.ops.object.select_all(action='DESELECT')
-            bpy.ops.object.select_all(action='SELECT')
-            bpy.ops.object.select_by_type(type='MESH')
-            bpy.ops.object.delete()
-            self.delete_empty_objects()
-            
-            # CREATE NEW INNER BATTERY GEOMETRY
-            self.create_and_export_inner_battery(j, self.anode,"anode")
-            self.create_and_export_inner_battery(j, self.lower_anode_coating, "lower_anode_coating")
-            self.create_and_export_inner_battery(j, self.upper_anode_coating, "upper_anode_coating")
-            self.create_and_export_inner_battery(j, self.cathode,"cathode")
-            self.create_and_export_inner_battery(j, self.lower_cathode_coating, "lower_cathode_coating")
-            self.create_and_export_inner_battery(j, self.upper_cathode_coating, "upper_cathode_coating")
-            
-            # CREATE HOUSING
-            self.create_and_export_housing(self.housing_geometry, j)
-            
-            filename = f"{j+1}_{self.current_datetime}_labeling.json"
-            self.write_data_to_file(self.data, filename)
-            
-            # VISUALISATION OF INTERSECTIONS OF THE HOUSING
-            self.cut_housing_zy(self.housing_geometry, j)
-            self.cut_housing_zx(self.housing_geometry, j)
-            
-            print("Export done to: " + str(self.export_path))
-
-        ######################################## GENERATING END ########################################
-
-    def update_parameters_from_ui(self, params):
-        # update time stamp for export
-        self.current_datetime = datetime.now().strftime("%Y%m%d_%H%M%S")
-        self.export_path = os.path.join(params["path"], self.export_folder)
-        self.iterations = params["num_export"]
-        
-        self.seperator_height = params["separator"]
-        self.anode_overhang_bool = params["overhang"]
-        self.export_inner_battery_bool = True
-        self.export_housing_bool = params["case"]
-        self.cut_housing_zy_bool = params["cut_zy"]
-        self.cut_housing_zx_bool = params["cut_zx"]
-        self.bending_bool = params["bending"]
-        
-        self.max_angle = params["max_angle"]
-        self.min_angle = params["min_angle"]
-
-        self.x_variation = params["dev_x"]
-        self.y_variation = params["dev_y"]
-        
-        self.anode = {
-            "length": params["size_x"], # 0.1015
-            "width": params["size_y"], # 0.050
-            "height": params["size_z"], # 0.001
-            "length_tol": 0.000,
-            "max_overhang": params["max_overhang"], # 0.0068
-            "min_overhang": params["min_overhang"], # 0.0023
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": params["num_anodes"], # integer
-            "color": (1, 0, 0, 1),  # red color (RGB values)
-        }
-
-        self.lower_anode_coating = {
-            "length": params["size_x"],
-            "width": params["size_y"],
-            "height": params["size_z"],
-            "length_tol": 0.000,
-            "max_overhang": self.anode["max_overhang"],
-            "min_overhang": self.anode["min_overhang"],
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"],
-            "color": (0, 0, 0, 1),  # black color (RGB values)
-        }
-
-        self.upper_anode_coating = {
-            "length": params["size_x"],
-            "width": params["size_y"],
-            "height": params["size_z"],
-            "length_tol": 0.000,
-            "max_overhang": self.anode["max_overhang"],
-            "min_overhang": self.anode["min_overhang"],
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"],
-            "color": (0, 0, 0, 1),  # black color (RGB values)
-        }
-
-        self.cathode = {
-            "length": params["size_x"],
-            "width": params["size_y"],
-            "height": params["size_z"],
-            "length_tol": 0.000,
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"]-1, # integer
-            "color": (0, 1, 0, 1),  # green color (RGB values)
-        }
-
-        self.lower_cathode_coating = {
-            "length": params["size_x"],
-            "width": params["size_y"],
-            "height": params["size_z"],
-            "length_tol": 0.000,
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"]-1,
-            "color": (0, 0, 1, 1),  # blue color (RGB values)
-        }
-
-        self.upper_cathode_coating = {
-            "length": params["size_x"],
-            "width": params["size_y"],
-            "height": params["size_z"],
-            "length_tol": 0.000,
-            "width_tol": 0.000,
-            "height_tol": 0.000,
-            "amount": self.anode["amount"]-1,
-            "color": (0, 0, 1, 1),  # blue color (RGB values)
-        }
-
-        # END VARIABLE PARAMETERSET
-
-        self.housing_geometry = {
-            # battery sizes
-            "outer_width": (self.anode["width"] + self.y_variation*2 + 0.008), 
-            "outer_length": (self.anode["length"] + self.anode["max_overhang"] + self.x_variation*2 + 0.008),  
-            "wall_thickness": 0.001
-        }
-
-        self.anode["overhang"] = {
-         # GIBT EINE ZUFÄLLIGE GLEITKOMMAZAHL IN DIESEM BEREICH ZURÜCK
-         "anode_overhang": np.random.uniform(self.anode["min_overhang"], self.anode["max_overhang"])
-        }
-
-        # Formula for parametric positioning
-        self.anode["position"] = {
-            "z_position": ((self.anode["height"]/2.0) + (self.lower_anode_coating["height"])+self.seperator_height + (self.housing_geometry["wall_thickness"]/2.0)),
-            "z_distance": self.anode["height"]+self.cathode["height"]+2*self.seperator_height+self.upper_anode_coating["height"]+self.lower_anode_coating["height"]+self.upper_cathode_coating["height"]+self.lower_cathode_coating["height"]
-        }
-
-        self.lower_anode_coating["position"] = {
-            "z_position": self.anode["position"]["z_position"]-((self.anode["height"] + self.lower_anode_coating["height"]) / 2.0),
-            "z_distance": self.anode["position"]["z_distance"]
-        }
-
-        self.upper_anode_coating["position"] = {
-            "z_position": self.anode["position"]["z_position"]+((self.anode["height"] + self.upper_anode_coating["height"]) / 2.0),
-            "z_distance": self.anode["position"]["z_distance"]
-        }
-
-        self.cathode["position"] = {
-            "z_position": self.anode["position"]["z_position"]+(((self.anode["height"]+self.cathode["height"])/2)+self.upper_anode_coating["height"]+self.lower_cathode_coating["height"]+self.seperator_height),
-            "z_distance": self.anode["height"]+self.cathode["height"]+2*self.seperator_height+self.upper_anode_coating["height"]+self.lower_anode_coating["height"]+self.upper_cathode_coating["height"]+self.lower_cathode_coating["height"]
-        }
-
-        self.lower_cathode_coating["position"] = {
-            "z_position": (self.cathode["position"]["z_position"]-((self.cathode["height"]+self.lower_cathode_coating["height"])/2.0)),
-            "z_distance": self.cathode["position"]["z_distance"]
-        }
-
-        self.upper_cathode_coating["position"] = {
-            "z_position": (self.cathode["position"]["z_position"]+((self.cathode["height"]+self.lower_cathode_coating["height"])/2.0)),
-            "z_distance": self.cathode["position"]["z_distance"]
-        }
-
-        self.housing_geometry["more_geometry"] = {
-            "bevel_radius": 0.01,
-            "outer_height": (self.anode["amount"]*self.anode["height"]) + (self.cathode["amount"]*self.cathode["height"]) + (self.lower_anode_coating["amount"]*self.lower_anode_coating["height"]) + (self.upper_anode_coating["amount"]*self.upper_anode_coating["height"]) + (self.lower_cathode_coating["amount"]*self.lower_cathode_coating["height"]) + (self.upper_cathode_coating["amount"]*self.upper_cathode_coating["height"]) + (2*self.anode["amount"]*self.seperator_height)+(self.housing_geometry["wall_thickness"]), 
-        }
-
 # ------------------------------------------------------------------------
 #    Scene Properties UI
 # ------------------------------------------------------------------------
@@ -966,6 +468,28 @@ bpy.types.Scene.checkbox_5 = bpy.props.BoolProperty(
     name="",
     description="",
     default = True) 
+
+bpy.types.Scene.checkbox_6 = bpy.props.BoolProperty(
+    name="",
+    description="",
+    default = True) 
+
+bpy.types.Scene.checkbox_7 = bpy.props.BoolProperty(
+    name="",
+    description="",
+    default = False) 
+
+bpy.types.Scene.checkbox_8 = bpy.props.BoolProperty(
+    name="",
+    description="",
+    default = False) 
+
+# Handling of cells with overlapping plates, the same modes as the config and --validation
+bpy.types.Scene.validation_mode = bpy.props.EnumProperty(
+    name="Invalid Cells",
+    description="Cells with overlapping plates are drawn again, not exported or exported anyway",
+    items=[(mode, mode.capitalize(), "") for mode in VALIDATION_MODES],
+    default=DEFAULT_PARAMS["validation"])
  
 # Number of Exports
 bpy.types.Scene.num_slider = bpy.props.IntProperty(
@@ -1075,6 +599,45 @@ bpy.types.Scene.min_angle_slider = bpy.props.FloatProperty(
     max=0      # Maximum value
 )
 
+# Probability of every production defect per cell
+bpy.types.Scene.defect_slider = bpy.props.FloatProperty(
+    name="Defect Probability",
+    description="Probability of each production defect per cell",
+    default=0.0,  # Default value
+    min=0.0,      # Minimum value
+    max=1.0       # Maximum value
+)
+
+# Parameters of single defects from the config file (no UI element)
+bpy.types.Scene.defects_json = bpy.props.StringProperty(
+    name="",
+    description="Defect parameters of the loaded config file (JSON)",
+    default="{}")
+
+# State of the last generation run (JSON, empty if it is complete), used to resume a cancelled run
+bpy.types.Scene.generation_state = bpy.props.StringProperty(
+    name="",
+    description="Parameters, seed, export folder and next cell of the last generation run",
+    default="")
+
+# Seed for the random deviations
+bpy.types.Scene.seed_slider = bpy.props.IntProperty(
+    name="Random Seed",
+    description="Seed for reproducible cells (-1 = draw a new seed, it is recorded in the labeling files)",
+    default=-1,  # Default value
+    min=-1      # Minimum value
+)
+
+# Maximum deviation of the bent mesh from the exact arc
+bpy.types.Scene.bend_tolerance_slider = bpy.props.FloatProperty(
+    name="Bending Tolerance",
+    description="Maximum chord error of the bent zones (m), controls the mesh resolution",
+    default=0.00001,  # Default value
+    min=0.0000001,    # Minimum value
+    max=0.001,        # Maximum value
+    precision=7
+)
+
 # ------------------------------------------------------------------------
 #    Classes
 # ------------------------------------------------------------------------
@@ -1111,6 +674,10 @@ class CustomPanel(bpy.types.Panel):
         col.prop(scene.path_tool_2, "path", text="")
         layout.prop(scene, "num_slider")
         layout.operator("object.export_button")
+        if scene.generation_state:
+            state = json.loads(scene.generation_state)
+            layout.label(text=f"Last run stopped after {state['next_cell']}/{state['params']['num_export']} cells")
+            layout.operator("object.resume_export_button")
         
         layout.separator()
         layout.label(text="MODELLING SETTINGS:")  
@@ -1120,12 +687,17 @@ class CustomPanel(bpy.types.Panel):
         layout.prop(scene, "checkbox_3", text="Cut Battery Case ZY?")
         layout.prop(scene, "checkbox_4", text="Cut Battery Case ZX?")
         layout.prop(scene, "checkbox_5", text="Anode/Cathode Bending?")
+        layout.prop(scene, "checkbox_6", text="Reuse Cached Cells?")
+        layout.prop(scene, "checkbox_8", text="Single File per Cell (GLB)?")
+        layout.prop(scene, "validation_mode")
+        layout.prop(scene, "seed_slider")
         
         # Add a slider to adjust the custom property value
         layout.prop(scene, "anode_slider")
         layout.label(text="Bending Angle Range:")
         layout.prop(scene, "max_angle_slider")
         layout.prop(scene, "min_angle_slider")
+        layout.prop(scene, "bend_tolerance_slider")
         layout.label(text="Ideal Size Anode/Cathode/Separator:")
         layout.prop(scene, "x_slider")
         layout.prop(scene, "y_slider")
@@ -1140,10 +712,14 @@ class CustomPanel(bpy.types.Panel):
         layout.prop(scene, "min_overhang_slider")
         layout.prop(scene, "max_overhang_slider")
         
+        layout.label(text="Production Defects:")
+        layout.prop(scene, "defect_slider")
+        
         
         # Debug
         layout.separator()
         layout.label(text="Debugging:")
+        layout.prop(scene, "checkbox_7", text="Write Profiling Trace?")
         layout.operator("object.data_button")
         
 
@@ -1198,6 +774,14 @@ class LoadConfig(bpy.types.Operator):
         bpy.context.scene.separator_slider = json_object["separator"]
         bpy.context.scene.max_angle_slider = json_object["max_angle"]
         bpy.context.scene.min_angle_slider = json_object["min_angle"]
+        bpy.context.scene.seed_slider = json_object.get("seed", DEFAULT_PARAMS["seed"])
+        bpy.context.scene.checkbox_6 = json_object.get("cache", DEFAULT_PARAMS["cache"])
+        bpy.context.scene.defect_slider = json_object.get("defect_probability", DEFAULT_PARAMS["defect_probability"])
+        bpy.context.scene.defects_json = json.dumps(json_object.get("defects", {}))
+        bpy.context.scene.bend_tolerance_slider = json_object.get("bend_tolerance", DEFAULT_PARAMS["bend_tolerance"])
+        bpy.context.scene.checkbox_7 = json_object.get("profile", DEFAULT_PARAMS["profile"])
+        bpy.context.scene.checkbox_8 = json_object.get("export_format", DEFAULT_PARAMS["export_format"]) == "glb"
+        bpy.context.scene.validation_mode = json_object.get("validation", DEFAULT_PARAMS["validation"])
         
         #Shows a message box with a message, custom title, and a specific icon
         ShowMessageBox("Configuration imported successfully", "Config Import", 'ERROR')
@@ -1231,7 +815,15 @@ class SaveConfig(bpy.types.Operator):
             "max_overhang": float(bpy.context.scene.max_overhang_slider),
             "separator": float(bpy.context.scene.separator_slider),
             "max_angle": float(bpy.context.scene.max_angle_slider), 
-            "min_angle": float(bpy.context.scene.min_angle_slider),  
+            "min_angle": float(bpy.context.scene.min_angle_slider),
+            "seed": int(bpy.context.scene.seed_slider),
+            "cache": bpy.context.scene.checkbox_6,
+            "defect_probability": float(bpy.context.scene.defect_slider),
+            "defects": json.loads(bpy.context.scene.defects_json or "{}"),
+            "bend_tolerance": float(bpy.context.scene.bend_tolerance_slider),
+            "profile": bpy.context.scene.checkbox_7,
+            "export_format": "glb" if bpy.context.scene.checkbox_8 else "stl",  
+            "validation": bpy.context.scene.validation_mode,
         }
         
         json_object = json.dumps(params, indent=4)
@@ -1244,7 +836,87 @@ class SaveConfig(bpy.types.Operator):
         
         return {'FINISHED'}    
 
-class Export(bpy.types.Operator):
+# Generates one cell per timer tick, so that Blender stays responsive during long runs (ESC cancels).
+# The state of the run is kept in the scene (also in the saved .blend file) and updated after every
+# cell, a cancelled run continues with the same seed and export folder at the next cell.
+class GenerationModal:
+    _timer = None
+
+    def start_generation(self, context, state):
+        self.state = state
+        self.modeler = Modeling()
+        self.modeler.update_parameters_from_ui(dict(state["params"], seed=state["seed"]))
+        self.modeler.set_run(state["current_datetime"], state["export_path"])
+        # cells of the manifest (also of an earlier session) are verified and skipped
+        self.modeler.open_manifest()
+        self.modeler.open_shards()
+        self.first_cell = state["next_cell"]
+        self.start_time = time.perf_counter()
+        context.scene.generation_state = json.dumps(state)
+
+        wm = context.window_manager
+        wm.progress_begin(0, self.modeler.iterations)
+        self._timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            return self.finish_generation(context, cancelled=True)
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+
+        j = self.state["next_cell"]
+        if j >= self.modeler.iterations:
+            return self.finish_generation(context)
+        try:
+            self.modeler.run_cell(j)
+        except Exception as error:
+            # the timer and the progress bar are removed, the run can be resumed from this cell
+            traceback.print_exc()
+            self.cleanup(context)
+            self.report({'ERROR'}, f"BatteryCT: cell {j+1} failed: {error}")
+            ShowMessageBox(f"Cell {j+1} failed ({error}), the run can be resumed", "Cell Generation", 'ERROR')
+            return {'CANCELLED'}
+        self.state["next_cell"] = j + 1
+        context.scene.generation_state = json.dumps(self.state)
+
+        # Progress and estimated remaining time (from the cells of this session)
+        done = j + 1 - self.first_cell
+        eta = (time.perf_counter() - self.start_time) / done * (self.modeler.iterations - j - 1)
+        context.window_manager.progress_update(j + 1)
+        context.workspace.status_text_set(f"BatteryCT: cell {j+1}/{self.modeler.iterations} done, remaining approx. {eta:.0f} s (ESC to cancel)")
+        return {'RUNNING_MODAL'}
+
+    # Called by Blender when the modal operator is stopped from outside (e.g. a new file is loaded)
+    def cancel(self, context):
+        self.cleanup(context)
+
+    # Timer, progress bar, status text, shards and profile of the run (only once)
+    def cleanup(self, context):
+        if self._timer is None:
+            return
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        self._timer = None
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        self.modeler.close_shards()
+        self.modeler.write_profile()
+
+    def finish_generation(self, context, cancelled=False):
+        self.cleanup(context)
+
+        if cancelled:
+            ShowMessageBox(f"Generation cancelled after {self.state['next_cell']} cells, it can be resumed", "Cell Generation", 'ERROR')
+            return {'CANCELLED'}
+        context.scene.generation_state = ""
+        #Shows a message box with a message, custom title, and a specific icon
+        ShowMessageBox("Cells generated successfully", "Cell Generation", 'ERROR')
+        return {'FINISHED'}
+
+
+class Export(GenerationModal, bpy.types.Operator):
     bl_idname = "object.export_button"
     bl_label = "Generate and Export Cell(s)"
 
@@ -1269,21 +941,43 @@ class Export(bpy.types.Operator):
             "separator": float(bpy.context.scene.separator_slider),
             "max_angle": float(bpy.context.scene.max_angle_slider), 
             "min_angle": float(bpy.context.scene.min_angle_slider),
+            "seed": int(bpy.context.scene.seed_slider),
+            "cache": bpy.context.scene.checkbox_6,
+            "defect_probability": float(bpy.context.scene.defect_slider),
+            "defects": json.loads(bpy.context.scene.defects_json or "{}"),
+            "bend_tolerance": float(bpy.context.scene.bend_tolerance_slider),
+            "profile": bpy.context.scene.checkbox_7,
+            "export_format": "glb" if bpy.context.scene.checkbox_8 else "stl",
+            "validation": bpy.context.scene.validation_mode,
            
         }
         
         modeler = Modeling()
-        # Update parameters based on UI config
+        # Update parameters based on UI config (draws the seed, if none is given)
         modeler.update_parameters_from_ui(params)
-        # Generate and export cells
-        modeler.generate_cells()
-        
-        #Shows a message box with a message, custom title, and a specific icon
-        ShowMessageBox("Cells generated successfully", "Cell Generation", 'ERROR')
-        
-        
-        return {'FINISHED'}   
-    
+        state = {
+            "params": params,
+            "seed": int(modeler.seed),
+            "current_datetime": modeler.current_datetime,
+            "export_path": modeler.export_path,
+            "next_cell": 0,
+        }
+        # Generate and export cells (one cell per timer tick)
+        return self.start_generation(context, state)
+
+
+class ResumeExport(GenerationModal, bpy.types.Operator):
+    """Continue the last cancelled generation run with the next cell"""
+    bl_idname = "object.resume_export_button"
+    bl_label = "Resume Generation"
+
+    @classmethod
+    def poll(cls, context):
+        return bool(context.scene.generation_state)
+
+    def execute(self, context):
+        return self.start_generation(context, json.loads(context.scene.generation_state))
+
 
 # ------------------------------------------------------------------------
 #     Registration
@@ -1296,7 +990,8 @@ classes = (
     FileProperty,
     LoadConfig,
     SaveConfig,
-    Export
+    Export,
+    ResumeExport
 )
 
 def register():
@@ -1313,7 +1008,7 @@ def unregister():
         unregister_class(cls)
 
     del bpy.types.Scene.path_tool_1
-    del bpy.types.Scene.path_tool_1
+    del bpy.types.Scene.path_tool_2
 
 
 if __name__ == "__main__":
@@ -0,0 +1,13 @@
+"""
+File: conftest.py
+Description: Puts the packages of the repository on the path of the tests (batteryct in src, the reconstruction scripts)
+
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "reconstruction"))
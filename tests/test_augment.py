@@ -0,0 +1,35 @@
+"""
+File: test_augment.py
+Description: Subsampled variants keep the first and last projection and record the angles of their projections
+"""
+
+import numpy as np
+import pytest
+
+from augment import OFF, augment_folder, read_angles, scan_angles, subsample_indices
+from reconstructions import read_projections
+
+tiff = pytest.importorskip("tifffile")
+
+
+def test_subsample_indices():
+    np.testing.assert_array_equal(subsample_indices(10, 1), np.arange(10))
+    np.testing.assert_array_equal(subsample_indices(121, 3), np.arange(0, 121, 3))
+    kept = subsample_indices(120, 3)
+    assert len(kept) == 40 and kept[0] == 0 and kept[-1] == 119
+    assert set(np.diff(kept)) <= {3, 4}
+
+
+def test_variant_records_angles(tmp_path):
+    source = tmp_path / "scan"
+    source.mkdir()
+    images = np.random.default_rng(0).integers(1000, 2000, size=(20, 4, 6), dtype=np.uint16)
+    for k, image in enumerate(images):
+        tiff.imwrite(str(source / f"scan_{k:04d}.tif"), image)
+    record, = augment_folder(str(source), str(tmp_path / "out"), 1, dict(OFF, subsample=[4]), workers=1)
+    variant = str(tmp_path / "out" / "0")
+    kept = subsample_indices(20, 4)
+    assert record["kept"] == kept.tolist()
+    np.testing.assert_allclose(read_angles(variant), scan_angles(20)[kept])
+    np.testing.assert_array_equal(read_projections(variant), images[kept])
+    assert read_angles(str(source)) is None
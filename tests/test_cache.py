@@ -0,0 +1,61 @@
+"""
+File: test_cache.py
+Description: Result cache: cells of a run are restored in a later run, per cell and per anode sampled overhang
+"""
+
+import json
+import os
+
+import pytest
+
+from batteryct import DEFAULT_PARAMS
+from batteryct.export import MeshModeling
+
+PARAMS = dict(DEFAULT_PARAMS, num_anodes=3, num_export=2, seed=99, cache=True)
+
+
+def run(params, export_path, build=True):
+    modeler = MeshModeling()
+    modeler.update_parameters_from_ui(params)
+    modeler.set_run("20260101_000000", export_path)
+    if not build:
+        def fail(j):
+            raise AssertionError(f"cell {j+1} was built instead of restored from the cache")
+        modeler.build_cell = fail
+    modeler.generate_cells()
+    return modeler
+
+
+def files(export_path):
+    result = {}
+    for name in os.listdir(export_path):
+        if name.endswith((".stl", ".json")) and not name.startswith("manifest"):
+            with open(os.path.join(export_path, name), 'rb') as file:
+                result[name] = file.read()
+    return result
+
+
+def test_second_run_restores_all_cells(tmp_path):
+    params = dict(PARAMS, path=str(tmp_path))
+    run(params, str(tmp_path / "first"))
+    run(dict(params, num_export=1), str(tmp_path / "second"), build=False)
+    first, second = files(str(tmp_path / "first")), files(str(tmp_path / "second"))
+    assert second and all(first[name] == content for name, content in second.items())
+
+
+def test_overhang_per_anode_and_cell(tmp_path):
+    run(dict(PARAMS, path=str(tmp_path)), str(tmp_path / "first"))
+    overhangs = []
+    for j in range(2):
+        with open(os.path.join(str(tmp_path / "first"), f"{j+1}_20260101_000000_labeling.json"), 'r') as file:
+            overhangs.append(json.load(file)["anode"]["anode_overhang"])
+    assert len(overhangs[0]) == 3 and len(set(overhangs[0])) == 3
+    assert overhangs[0] != overhangs[1]
+    assert all(PARAMS["min_overhang"] <= value <= PARAMS["max_overhang"] for value in overhangs[0] + overhangs[1])
+
+
+def test_changed_config_misses(tmp_path):
+    params = dict(PARAMS, path=str(tmp_path))
+    run(params, str(tmp_path / "first"))
+    with pytest.raises(AssertionError, match="built instead of restored"):
+        run(dict(params, max_overhang=0.005), str(tmp_path / "second"), build=False)
@@ -0,0 +1,66 @@
+"""
+File: test_defects.py
+Description: Labels of defective cells: removed plates keep the layer numbers of the others, folds in the end zone,
+folded ends without bending, no defects for wound cells
+"""
+
+import numpy as np
+import pytest
+
+from batteryct import DEFAULT_PARAMS, PLATE_TYPES, ZONE_TURN
+from batteryct.export import MeshModeling
+from batteryct.winding import WoundModeling
+from measure import label_plates
+
+
+def planned(defects, seed=2, bending=True):
+    modeler = MeshModeling()
+    modeler.update_parameters_from_ui(dict(DEFAULT_PARAMS, num_anodes=4, seed=seed, defects=defects, bending=bending))
+    modeler.reset_data()
+    modeler.plan_cell(modeler.cell_rng(0))
+    return modeler
+
+
+def test_missing_electrode_keeps_layers():
+    modeler = planned({"missing_electrode": {"probability": 1.0}})
+    defect = modeler.data["defects"][0]
+    layers = modeler.data[defect["plate"]][f"{defect['plate']}_layer"]
+    amount = getattr(modeler, defect["plate"])["amount"]
+    assert layers == [layer for layer in range(amount) if layer != defect["layer"]]
+    plates = label_plates(modeler.data)
+    assert len(plates["layer"]) == len(plates["kind"]) == 4 + 3 - 1
+
+
+def test_fold_angle_in_end_zone():
+    defect = planned({"folded_electrode": {"probability": 1.0}}).data["defects"][0]
+    assert 160.0 <= abs(defect["fold"]) <= 180.0
+    assert abs(defect["angle"] * ZONE_TURN - defect["fold"]) < 1e-9
+
+
+def test_wound_cells_reject_defects():
+    with pytest.raises(ValueError, match="missing_electrode"):
+        WoundModeling().update_parameters_from_ui(dict(DEFAULT_PARAMS, cell_type="cylindrical",
+                                                       defects={"missing_electrode": {"probability": 0.5}}))
+
+
+
+def test_fold_without_bending():
+    # the other plates stay flat, the folded end is bent anyway
+    modeler = planned({"folded_electrode": {"probability": 1.0}}, seed=5, bending=False)
+    defect = modeler.data["defects"][0]
+    plates = modeler.plates
+    carrier = np.flatnonzero((plates["type"] == PLATE_TYPES.index(defect["plate"])) & (plates["layer"] == defect["layer"]))[0]
+    folded = plates["carrier"] == carrier
+    side = "bend_pos" if defect["side"] == "x+" else "bend_neg"
+    assert np.all(plates[side][folded] == defect["angle"])
+    assert not np.any(plates["bend_pos"][~folded]) and not np.any(plates["bend_neg"][~folded])
+
+    meshes = {}
+    modeler.export_part = lambda j, name, vertices, faces: meshes.__setitem__(name, vertices)
+    modeler.build_cell(0)
+    plate = plates[carrier]
+    vertices = meshes[defect["plate"]]
+    # vertices in the height of the folded plate: its end is turned out of the plane, so it ends before the flat end
+    own = vertices[np.abs(vertices[:, 2] - plate["z"]) <= plate["height"] / 2.0 + 1e-9]
+    end = own[:, 0].max() - plate["x"] if defect["side"] == "x+" else plate["x"] - own[:, 0].min()
+    assert end < plate["length"] / 2.0 - 0.001
@@ -0,0 +1,51 @@
+"""
+File: test_fbp.py
+Description: Filtered back projection of fbp.py against skimage.transform.iradon, ROI crops and the table cache
+"""
+
+import numpy as np
+import pytest
+
+import fbp
+from fbp import FILTERS, clear_table_cache, geometry_table
+
+skimage_transform = pytest.importorskip("skimage.transform")
+
+
+def phantom_sinogram(angles=90):
+    from skimage.data import shepp_logan_phantom
+    image = skimage_transform.rescale(shepp_logan_phantom(), 0.25)
+    degrees = np.linspace(0.0, 180.0, angles, endpoint=False)
+    return skimage_transform.radon(image, degrees, circle=False), degrees
+
+
+@pytest.mark.parametrize("filter_name", FILTERS)
+def test_matches_iradon(filter_name):
+    sinogram, degrees = phantom_sinogram()
+    cols = sinogram.shape[0]
+    expected = skimage_transform.iradon(sinogram, degrees, filter_name=filter_name, circle=False, output_size=cols)
+    result = fbp.fbp(sinogram.T[:, None, :], np.deg2rad(degrees), filter_name=filter_name)[0]
+    assert np.abs(result - expected).max() < 2e-3 * np.abs(expected).max()
+
+
+def test_region_is_crop():
+    sinogram, degrees = phantom_sinogram()
+    projections = sinogram.T[:, None, :]
+    full = fbp.fbp(projections, np.deg2rad(degrees))
+    crop = fbp.fbp(projections, np.deg2rad(degrees), region=(30, 40, 50, 20))
+    np.testing.assert_allclose(crop, full[:, 30:80, 40:60], atol=1e-5)
+
+
+def test_table_cache_limit(monkeypatch):
+    clear_table_cache()
+    theta = np.linspace(0.0, np.pi, 20, endpoint=False)
+    table = geometry_table(theta, 64, 64, 32)
+    assert geometry_table(theta, 64, 64, 32) is table
+    # room for one table: the next geometry replaces it, a table above the limit is not cached
+    monkeypatch.setattr(fbp, "TABLE_CACHE_BYTES", int(1.5 * fbp.table_bytes(table)))
+    geometry_table(theta + 0.01, 64, 64, 32)
+    assert len(fbp.table_cache) == 1 and geometry_table(theta, 64, 64, 32) is not table
+    monkeypatch.setattr(fbp, "TABLE_CACHE_BYTES", 0)
+    clear_table_cache()
+    geometry_table(theta, 64, 64, 32)
+    assert len(fbp.table_cache) == 0
@@ -0,0 +1,29 @@
+"""
+File: test_profiling.py
+Description: Profiling trace of a parallel run: events of every worker on its own track, on one time axis
+"""
+
+import json
+import os
+import time
+
+from batteryct import DEFAULT_PARAMS
+from batteryct.export import generate_parallel
+
+
+def test_parallel_trace(tmp_path):
+    params = dict(DEFAULT_PARAMS, num_anodes=2, num_export=4, seed=3, profile=True, profile_format="chrome", path=str(tmp_path))
+    begin = time.time()
+    modeler = generate_parallel(params, workers=2, current_datetime="20260101_000000", export_path=str(tmp_path / "run"))
+    seconds = time.time() - begin
+    with open(os.path.join(modeler.export_path, "20260101_000000_profile.json"), 'r') as file:
+        events = json.load(file)["traceEvents"]
+
+    cells = [event for event in events if event["name"] == "cell"]
+    assert sorted(event["args"]["cell"] for event in cells) == [0, 1, 2, 3]
+    assert all(event["pid"] == event["tid"] != os.getpid() for event in cells)
+    # on the time axis of the run, the cells of one worker one after the other
+    assert all(0 <= event["ts"] and event["ts"] + event["dur"] <= seconds * 1e6 for event in events)
+    for pid in {event["pid"] for event in cells}:
+        track = sorted((event["ts"], event["ts"] + event["dur"]) for event in cells if event["pid"] == pid)
+        assert all(end <= start for (_, end), (start, _) in zip(track, track[1:]))
@@ -0,0 +1,44 @@
+"""
+File: test_pyramid.py
+Description: Pyramid levels of a reconstruction are the mean over 2 x 2 x 2 voxels of the saved slices, --view-level
+only with a written level
+"""
+
+import numpy as np
+import pytest
+
+from pyramid import read_block, read_level
+from reconstructions import main
+
+tiff = pytest.importorskip("tifffile")
+
+
+# Mean over factor^3 voxels, bins at the edges over the voxels they cover
+def mean_bin(volume, factor):
+    pad = [(0, -n % factor) for n in volume.shape]
+    padded = np.pad(volume.astype(np.float64), pad, constant_values=np.nan)
+    z, y, x = (n // factor for n in padded.shape)
+    return np.nanmean(padded.reshape(z, factor, y, factor, x, factor), axis=(1, 3, 5))
+
+
+@pytest.mark.parametrize("precision", ["float32", "reduced"])
+def test_level_is_binned_slices(tmp_path, precision):
+    scan = tmp_path / "scan"
+    scan.mkdir()
+    # 7 detector rows in slabs of 3: bins across slab boundaries and a partial bin at the end
+    images = np.random.default_rng(0).integers(20000, 60000, size=(24, 7, 21), dtype=np.uint16)
+    for k, image in enumerate(images):
+        tiff.imwrite(str(scan / f"scan_{k:04d}.tif"), image)
+    out = str(tmp_path / "out")
+    main(["--input", str(scan), "--output", out, "--algorithm", "fbp", "--precision", precision,
+          "--slab", "3", "--pyramid", "2"])
+    saved = read_block(out, 0, 7, 0, 21, 0, 21)
+    np.testing.assert_allclose(read_level(out, 2), mean_bin(saved, 2), rtol=1e-5, atol=1e-6 * np.abs(saved).max())
+
+
+@pytest.mark.parametrize("pyramid", [[], ["2"]])
+def test_view_level_must_be_written(tmp_path, pyramid):
+    # rejected before anything is read or reconstructed
+    with pytest.raises(SystemExit):
+        main(["--input", str(tmp_path / "missing"), "--output", str(tmp_path / "out"), "--pyramid", *pyramid, "--view-level", "4"])
+    assert not (tmp_path / "out").exists()
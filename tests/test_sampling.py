@@ -0,0 +1,70 @@
+"""
+File: test_sampling.py
+Description: Seeded deviations: same seed and cell give the same plate table, independent of the worker count
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+
+from batteryct import DEFAULT_PARAMS, generate_parallel
+from batteryct.export import MeshModeling
+
+PARAMS = dict(DEFAULT_PARAMS, num_anodes=3, seed=1234, cache=False)
+
+
+def planned_plates(params, j, attempt=0):
+    modeler = MeshModeling()
+    modeler.update_parameters_from_ui(params)
+    modeler.reset_data()
+    modeler.plan_cell(modeler.cell_rng(j, attempt))
+    return modeler.plates
+
+
+def test_same_seed_same_cell():
+    np.testing.assert_array_equal(planned_plates(PARAMS, 3), planned_plates(PARAMS, 3))
+
+
+def test_cells_and_seeds_differ():
+    assert not np.array_equal(planned_plates(PARAMS, 0)["x"], planned_plates(PARAMS, 1)["x"])
+    assert not np.array_equal(planned_plates(PARAMS, 0)["x"], planned_plates(dict(PARAMS, seed=4321), 0)["x"])
+    assert not np.array_equal(planned_plates(PARAMS, 0)["x"], planned_plates(PARAMS, 0, attempt=1)["x"])
+
+
+def test_global_state_unused():
+    np.random.seed(0)
+    first = planned_plates(PARAMS, 2)
+    np.random.seed(1)
+    np.testing.assert_array_equal(first, planned_plates(PARAMS, 2))
+
+
+def test_batch_draw_matches_shape():
+    modeler = MeshModeling()
+    modeler.update_parameters_from_ui(PARAMS)
+    deviations = modeler.generate_deviations(modeler.cell_rng(0), num_cells=5)
+    assert deviations["anode"]["x_position"].shape == (5, 3)
+    assert deviations["anode"]["overhang"].shape == (5, 3)
+    assert modeler.plan_stack(deviations).shape == (5, 3 * 6 - 3)
+
+
+def labels(folder):
+    result = {}
+    for file_path in glob.glob(os.path.join(folder, "*", "*_labeling.json")):
+        with open(file_path, 'r') as file:
+            data = json.load(file)
+        result[data["random"]["spawn_key"][0]] = data
+    return result
+
+
+def test_worker_count_does_not_change_cells(tmp_path):
+    params = dict(PARAMS, num_export=3)
+    generate_parallel(dict(params, path=str(tmp_path / "one")), workers=1)
+    generate_parallel(dict(params, path=str(tmp_path / "two")), workers=2)
+    one, two = labels(str(tmp_path / "one")), labels(str(tmp_path / "two"))
+    assert sorted(one) == [0, 1, 2]
+    for j in one:
+        assert one[j]["random"] == {"seed": 1234, "spawn_key": [j]}
+        assert one[j]["anode"] == two[j]["anode"]
+        assert one[j]["cathode"] == two[j]["cathode"]
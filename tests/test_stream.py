@@ -0,0 +1,49 @@
+"""
+File: test_stream.py
+Description: Streaming back projection: same volume as fbp for batches in any order, unreadable files, no pyramid
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from fbp import fbp
+from pyramid import PYRAMID_DIR
+from stream import StreamingFBP, stream_reconstruction, watch_folder
+
+tiff = pytest.importorskip("tifffile")
+
+
+def projections(angles=24, rows=5, cols=32, seed=0):
+    return np.random.default_rng(seed).random((angles, rows, cols)).astype(np.float32)
+
+
+def test_batches_match_fbp():
+    data = projections()
+    stream = StreamingFBP(len(data), data.shape[1], data.shape[2], slice_block=2)
+    order = np.random.default_rng(1).permutation(len(data))
+    for batch in np.array_split(order, 5):
+        stream.add(batch, data[batch])
+    assert stream.complete()
+    np.testing.assert_allclose(stream.result(), fbp(data), atol=1e-4)
+    with pytest.raises(ValueError):
+        stream.add(order[:1], data[order[:1]])
+
+
+def test_unreadable_file(tmp_path):
+    (tmp_path / "scan_0000.tif").write_bytes(b"not a tiff")
+    with pytest.raises(IOError, match="3 attempts"):
+        for _ in watch_folder(str(tmp_path), set(), poll=0.0, timeout=5.0, read_attempts=3):
+            pass
+
+
+def test_without_pyramid(tmp_path):
+    data = projections(angles=8) + 1.0
+    folder = tmp_path / "scan"
+    folder.mkdir()
+    for k, image in enumerate(data):
+        tiff.imwrite(str(folder / f"scan_{k + 5:04d}.tif"), image)
+    reconstruction, _ = stream_reconstruction(str(folder), str(tmp_path / "out"), len(data), poll=0.0, timeout=5.0, pyramid=[])
+    np.testing.assert_allclose(reconstruction, fbp(data), atol=1e-4)
+    assert not os.path.exists(tmp_path / "out" / PYRAMID_DIR)
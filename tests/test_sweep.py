@@ -0,0 +1,38 @@
+"""
+File: test_sweep.py
+Description: Sweep designs: points with the same cells and run settings once, min > max skipped, all cells generated
+"""
+
+from batteryct import DEFAULT_PARAMS
+from batteryct import sweep
+from batteryct.manifest import read_manifest
+
+BASE = dict(DEFAULT_PARAMS, num_anodes=2, num_export=1, seed=5)
+
+
+def test_run_settings_are_not_collapsed():
+    points, duplicates, skipped = sweep.expand_sweep(BASE, {"num_export": [1, 2, 2]})
+    assert [values["num_export"] for values, _ in points] == [1, 2]
+    assert (duplicates, skipped) == (1, 0)
+
+
+def test_rounded_levels_are_deduplicated():
+    points, duplicates, _ = sweep.expand_sweep(BASE, {"num_anodes": {"min": 3, "max": 3.4, "num": 3}})
+    assert len(points) == 1 and duplicates == 2
+
+
+def test_min_above_max_is_skipped():
+    points, duplicates, skipped = sweep.expand_sweep(dict(BASE, max_angle=15.0), {"min_angle": [0.0, 20.0]})
+    assert [values["min_angle"] for values, _ in points] == [0.0]
+    assert (duplicates, skipped) == (0, 1)
+
+
+def test_all_cells_with_few_pending(tmp_path, monkeypatch):
+    monkeypatch.setattr(sweep, "PENDING_PER_WORKER", 1)
+    plan = sweep.plan_sweep({"base": dict(num_anodes=2, num_export=3, seed=5, path=str(tmp_path)),
+                             "parameters": {"num_anodes": [2, 3]}})
+    sweep.write_sweep(plan)
+    modelers = sweep.run_sweep(plan, workers=2)
+    for modeler in modelers:
+        _, cells = read_manifest(modeler.manifest.file_path)
+        assert sorted(cells) == [0, 1, 2]
@@ -0,0 +1,70 @@
+"""
+File: test_validation.py
+Description: Validation of the plate table: valid cells pass, crossings at edges, bent ends and the housing are found
+"""
+
+import numpy as np
+
+from batteryct import DEFAULT_PARAMS, PARTICLE_TYPE, PLATE_DTYPE
+from batteryct.export import MeshModeling
+from batteryct.validation import sample_points, validate_plates
+
+
+def planned(**overrides):
+    params = dict(DEFAULT_PARAMS, num_anodes=3, seed=1, dev_x=0.0, dev_y=0.0)
+    params.update(overrides)
+    modeler = MeshModeling()
+    modeler.update_parameters_from_ui(params)
+    modeler.reset_data()
+    modeler.plan_cell(modeler.cell_rng(0))
+    return modeler
+
+
+def names(issues):
+    return [[tuple(plate) for plate in issue["plates"]] for issue in issues if issue["type"] == "overlap"]
+
+
+def test_valid_cell_passes():
+    for seed in range(3):
+        modeler = planned(seed=seed)
+        assert validate_plates(modeler.plates, modeler.housing_geometry, True) == []
+
+
+def with_particle(plates, x, y, z, size):
+    particle = np.zeros(1, dtype=PLATE_DTYPE)
+    particle["type"] = PARTICLE_TYPE
+    particle["carrier"] = len(plates)
+    particle["visible"] = True
+    particle["x"], particle["y"], particle["z"] = x, y, z
+    particle["length"], particle["width"], particle["height"] = size
+    return np.concatenate([plates, particle])
+
+
+def test_particle_across_edge():
+    # thicker than the anode and off its mid-plane, away from the plate ends: no corner of one lies in the other
+    modeler = planned(min_angle=0.0, max_angle=0.0)
+    anode = modeler.plates[1]
+    plates = with_particle(modeler.plates, anode["x"] + 0.02, anode["y"] + anode["width"] / 2.0, anode["z"] + anode["height"],
+                           (0.0008, 0.0008, 3 * anode["height"]))
+    assert [("anode", 1), ("particle", 0)] in names(validate_plates(plates, modeler.housing_geometry, True))
+
+
+def test_particle_at_bent_end():
+    modeler = planned(min_angle=0.0, max_angle=0.0)
+    plates = modeler.plates.copy()
+    plates["bend_pos"][plates["carrier"] == 1] = 180.0
+    # top of the bent end of the upper anode coating of layer 1, above the plate when it is not bent
+    row = 7
+    points = sample_points(plates[[row]], plates["z"][plates["carrier"][[row]]], True, 0.001, 0.05)[0]
+    x, _, z = points[np.argmax(points[:, 2])]
+    plates = with_particle(plates, x, plates["y"][row], z, (0.0005, 0.0005, 0.0005))
+    assert names(validate_plates(plates, modeler.housing_geometry, True)) == [[("upper_anode_coating", 1), ("particle", 0)]]
+    assert validate_plates(plates, modeler.housing_geometry, False) == []
+
+
+def test_housing_collision():
+    modeler = planned()
+    plates = modeler.plates.copy()
+    plates["y"][0] += modeler.housing_geometry["outer_width"]
+    issues = validate_plates(plates, modeler.housing_geometry, True)
+    assert {"type": "housing_collision", "plate": ["anode", 0]} in issues